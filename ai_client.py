@@ -1,21 +1,34 @@
 """OpenAI-compatible API client wrapper for text and multimodal interactions.
 
-Uses a custom OpenAI-compatible endpoint.
+Uses one or more OpenAI-compatible endpoints (``API_BASE_URL``, or
+``API_ENDPOINTS`` balanced by ``llm_endpoints``).  ``openai``/``httpx`` (several
+hundred ms of imports) are loaded when the first client is built, not when
+this module is imported, so importing the app stays fast and ``gunicorn
+--preload`` never creates a connection pool in the master process.
 """
 
-import json
 import os
 import io
 import base64
 import time
 import logging
-
-from openai import OpenAI
-from openai import RateLimitError, APIStatusError
-from PIL import Image
+import contextvars
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
+
+import llm_cassette
+import llm_endpoints
+import llm_governor
+import llm_output
+import llm_quota
+import llm_slo
+import request_timing
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from PIL import Image
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 # Model cascade — try each in order until one works
 # User preference: **do not use opus**, favor sonnet.
@@ -37,51 +50,117 @@ RETRY_BASE_DELAY = 2  # seconds
 # Base URL for the OpenAI-compatible endpoint (loaded from environment)
 BASE_URL = os.environ.get("API_BASE_URL", "https://api.openai.com/v1")
 
+# Connection pool shared by every request thread / greenlet in this process.
+# Size it to at least the worker's threads (gthread) or connections (gevent).
+MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("LLM_MAX_KEEPALIVE", "16"))
+REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", "90"))
+
+
+def _new_client(url: str, key: str, max_retries: int) -> "OpenAI":
+    """An OpenAI-compatible client with its own httpx connection pool (one per endpoint)."""
+    import httpx
+    from openai import OpenAI
+    return OpenAI(
+        api_key=key,
+        base_url=url,
+        timeout=REQUEST_TIMEOUT,
+        max_retries=max_retries,
+        http_client=httpx.Client(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            timeout=REQUEST_TIMEOUT,
+        ),
+    )
 
-def _extract_json(text: str) -> dict:
-    """Extract JSON from a response that may be wrapped in markdown code fences."""
-    text = text.strip()
 
-    # Try direct parse first
+# Priority lane for calls made in the current thread/context (see llm_governor)
+_lane: contextvars.ContextVar = contextvars.ContextVar("llm_lane", default=None)
+
+
+@contextmanager
+def priority(lane: llm_governor.Lane):
+    """Run LLM calls in this block in *lane* unless a call names its own.
+
+    *lane* may be a callable, re-evaluated while queued, so a background job
+    can be promoted after it started waiting.
+    """
+    token = _lane.set(lane)
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        pass
-
-    # Strip markdown ```json ... ``` fences
-    import re
-    match = re.search(r"```(?:json)?\s*\n?(.*?)\n?\s*```", text, re.DOTALL)
-    if match:
-        try:
-            return json.loads(match.group(1).strip())
-        except json.JSONDecodeError:
-            pass
-
-    # Last resort: find first { ... } block
-    start = text.find("{")
-    end = text.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        try:
-            return json.loads(text[start:end + 1])
-        except json.JSONDecodeError:
-            pass
-
-    raise ValueError(f"Could not extract JSON from response: {text[:200]}")
-
-
-def _get_client() -> OpenAI:
-    """Configure and return the OpenAI-compatible client."""
-    api_key = os.environ.get("API_KEY")
-    if not api_key:
-        raise RuntimeError("API_KEY environment variable is not set")
-    return OpenAI(api_key=api_key, base_url=BASE_URL)
-
-
-def _call_with_retry(client, preferred_model, messages, json_mode=False, temperature=0.9, models_to_try=None):
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def _extract_json(text: str) -> dict:
+    """Extract JSON from a response that may be fenced, wrapped in prose or slightly malformed."""
+    return llm_output.extract_json(text)
+
+
+def _structured_reply(task: str, response, client: "llm_endpoints.Pool", model: str, messages: list,
+                      temperature: float, lane: Optional[llm_governor.Lane],
+                      defaults: Optional[dict] = None) -> dict:
+    """Parse a reply against the task's schema, asking the model again only for missing fields."""
+    content = response.choices[0].message.content
+    result, missing = llm_output.read_reply(task, content, defaults)
+    if not missing:
+        return result
+
+    logger.warning("🩹 %s reply missing %s — asking for just those", task, ", ".join(missing))
+    follow_up = messages + [
+        {"role": "assistant", "content": content},
+        {"role": "user", "content": llm_output.missing_fields_prompt(task, missing)},
+    ]
+    response = _call_with_retry(client, model, follow_up, temperature=temperature, lane=lane)
+    patch, _ = llm_output.read_reply(task, response.choices[0].message.content, defaults)
+    result, missing = llm_output.conform(task, {**patch, **result}, defaults)
+    if missing:
+        raise ValueError(f"{task} reply still missing {', '.join(missing)} after re-ask: {content[:200]}")
+    return result
+
+
+def _get_client() -> "llm_endpoints.Pool":
+    """Return the process-wide endpoint pool (see llm_endpoints), creating it on first use.
+
+    Each endpoint's client (and its httpx connection pool) is thread-safe, so
+    one instance per endpoint serves every request thread instead of opening
+    a new pool per call.  Replaying a cassette needs no client (or API key):
+    returns None.
+    """
+    if llm_cassette.replaying():
+        return None
+    return llm_endpoints.pool(BASE_URL, _new_client)
+
+
+def _retry_delay(pool: "llm_endpoints.Pool", endpoint: "llm_endpoints.Endpoint", attempt: int) -> float:
+    """Back off before retrying the same endpoint; another one can be tried at once."""
+    return 0 if pool.has_alternative(endpoint) else RETRY_BASE_DELAY * (2 ** attempt)
+
+
+def _call_with_retry(client: "llm_endpoints.Pool", preferred_model, messages, json_mode=False, temperature=0.9,
+                     models_to_try=None, lane: Optional[llm_governor.Lane] = None):
     """Call chat completions with retry logic and model cascade fallback.
 
     Tries the preferred_model first, then falls through the full cascade.
+    Each attempt goes to the least-loaded endpoint of the pool *client*; a
+    retry after an endpoint failure goes to another one straight away.
+    The call runs in *lane*, else the lane set by priority(), else on-demand.
+    With an ``llm_cassette`` in replay mode the reply comes from the
+    cassette; in record mode successful replies are written to it.
     """
+    if llm_cassette.replaying():
+        return llm_cassette.replay(preferred_model, messages, temperature)
+    if lane is None:
+        lane = _lane.get()
+    if lane is None:
+        lane = llm_governor.LANE_ON_DEMAND
+    # Over-budget callers get the same fallbacks as when the provider is down
+    llm_quota.check(lane)
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+    started = time.time()
+
     if models_to_try is None:
         models_to_try = [preferred_model]
         for m in MODEL_CASCADE:
@@ -95,28 +174,59 @@ def _call_with_retry(client, preferred_model, messages, json_mode=False, tempera
     # JSON output is enforced via system prompts instead.
 
     last_error = None
+    endpoint = None
     for model_name in models_to_try:
         for attempt in range(MAX_RETRIES):
             try:
                 logger.info("🔄 Calling %s (attempt %d/%d)...", model_name, attempt + 1, MAX_RETRIES)
-                t0 = time.time()
-                response = client.chat.completions.create(
-                    model=model_name,
-                    messages=messages,
-                    **kwargs,
-                )
-                elapsed = time.time() - t0
+                # Queue for an outbound slot shared with every worker rather
+                # than bursting past the provider's limits and eating 429s
+                with llm_governor.slot(model_name, lane) as queued, client.use(exclude=endpoint) as endpoint:
+                    t0 = time.time()
+                    response = client.client(endpoint).chat.completions.create(
+                        model=model_name,
+                        messages=messages,
+                        **kwargs,
+                    )
+                    elapsed = time.time() - t0
+                llm_slo.record(elapsed)
+                request_timing.add("llm_queue", queued)
+                request_timing.add("llm", elapsed)
                 # Validate we got actual content back
                 content = response.choices[0].message.content if response.choices else None
                 if not content or not content.strip():
                     logger.error("❌ Empty response from %s after %.1fs", model_name, elapsed)
                     raise RuntimeError(f"Empty response from {model_name}")
-                logger.info("✅ %s responded in %.1fs (%d chars)", model_name, elapsed, len(content))
+                logger.info("✅ %s responded in %.1fs (%d chars, queued %.1fs)", model_name, elapsed, len(content), queued)
                 logger.info("📝 Response preview: %s", content[:150].replace('\n', ' '))
+                if llm_cassette.recording():
+                    llm_cassette.record(preferred_model, messages, temperature, response, elapsed)
+                llm_governor.record_latency(llm_governor.resolve_lane(lane), time.time() - started)
+                llm_quota.charge(getattr(response, "usage", None))
                 return response
+            except llm_governor.LoadShed:
+                # Speculative work yields to players who are waiting — don't cascade
+                raise
+            except llm_governor.GovernorTimeout as e:
+                # This model's queue is saturated — fall through to the next one
+                last_error = e
+                logger.warning("🚦 %s", e)
+                break
+            except APITimeoutError:
+                # Not retried (as before), but the SLO has to see the slowest calls of all
+                llm_slo.record(time.time() - t0, failed=True)
+                raise
+            except APIConnectionError as e:
+                # Unreachable: another endpoint if there is one, else give up as before
+                if not client.has_alternative(endpoint):
+                    raise
+                last_error = e
+                llm_slo.record(time.time() - t0, failed=True)
+                logger.warning("🔀 %s unreachable (%s), trying another endpoint", endpoint.name, e)
             except RateLimitError as e:
                 last_error = e
-                delay = RETRY_BASE_DELAY * (2 ** attempt)
+                llm_slo.record(time.time() - t0, failed=True)
+                delay = _retry_delay(client, endpoint, attempt)
                 logger.warning(
                     "Rate limited on %s attempt %d. Retrying in %ds...",
                     model_name, attempt + 1, delay
@@ -125,7 +235,8 @@ def _call_with_retry(client, preferred_model, messages, json_mode=False, tempera
             except APIStatusError as e:
                 if e.status_code in (503, 502, 500):
                     last_error = e
-                    delay = RETRY_BASE_DELAY * (2 ** attempt)
+                    llm_slo.record(time.time() - t0, failed=True)
+                    delay = _retry_delay(client, endpoint, attempt)
                     logger.warning(
                         "Model %s attempt %d failed (%d): %s. Retrying in %ds...",
                         model_name, attempt + 1, e.status_code, str(e)[:100], delay
@@ -139,29 +250,38 @@ def _call_with_retry(client, preferred_model, messages, json_mode=False, tempera
     raise RuntimeError(f"All models exhausted. Last error: {last_error}")
 
 
-def generate_json(system_prompt: str, user_prompt: str, temperature: float = 0.9) -> dict:
-    """Generate structured JSON."""
+def generate_json(system_prompt: str, user_prompt: str, temperature: float = 0.9,
+                  lane: Optional[llm_governor.Lane] = None, task: Optional[str] = None,
+                  defaults: Optional[dict] = None) -> dict:
+    """Generate structured JSON.
+
+    With *task* (a key of ``llm_output.SCHEMAS``) the reply is conformed to
+    that schema; *defaults* fill optional fields the model left out.
+    """
     client = _get_client()
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
-    response = _call_with_retry(client, MODEL_CASCADE[0], messages, temperature=temperature)
+    response = _call_with_retry(client, MODEL_CASCADE[0], messages, temperature=temperature, lane=lane)
+    if task:
+        return _structured_reply(task, response, client, MODEL_CASCADE[0], messages, temperature, lane, defaults)
     return _extract_json(response.choices[0].message.content)
 
 
-def generate_text(system_prompt: str, user_prompt: str, temperature: float = 0.9) -> str:
+def generate_text(system_prompt: str, user_prompt: str, temperature: float = 0.9,
+                  lane: Optional[llm_governor.Lane] = None) -> str:
     """Generate plain text."""
     client = _get_client()
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
-    response = _call_with_retry(client, MODEL_CASCADE[0], messages, temperature=temperature)
+    response = _call_with_retry(client, MODEL_CASCADE[0], messages, temperature=temperature, lane=lane)
     return response.choices[0].message.content
 
 
-def analyze_image(system_prompt: str, user_prompt: str, image: Image.Image, temperature: float = 0.7) -> dict:
+def analyze_image(system_prompt: str, user_prompt: str, image: "Image.Image", temperature: float = 0.7) -> dict:
     """Analyze an image with a vision model and return structured JSON."""
     client = _get_client()
 
@@ -192,7 +312,7 @@ def analyze_image(system_prompt: str, user_prompt: str, image: Image.Image, temp
         temperature=temperature,
         models_to_try=[VISION_MODEL],
     )
-    return _extract_json(response.choices[0].message.content)
+    return _structured_reply("vision", response, client, VISION_MODEL, messages, temperature, None)
 
 
 def validate_answer(system_prompt: str, user_prompt: str) -> dict:
@@ -202,9 +322,29 @@ def validate_answer(system_prompt: str, user_prompt: str) -> dict:
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
+    # A player is waiting on the verdict — always the interactive lane
     response = _call_with_retry(
         client, FAST_MODEL, messages,
         temperature=0.2,
         models_to_try=[FAST_MODEL, MODEL_CASCADE[0]],
+        lane=llm_governor.LANE_INTERACTIVE,
     )
-    return _extract_json(response.choices[0].message.content)
+    return _structured_reply("validation", response, client, FAST_MODEL, messages, 0.2,
+                             llm_governor.LANE_INTERACTIVE)
+
+
+def validate_answers(system_prompt: str, user_prompt: str) -> dict:
+    """Validate several players' answers in one call (see validation_batcher)."""
+    client = _get_client()
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    response = _call_with_retry(
+        client, FAST_MODEL, messages,
+        temperature=0.2,
+        models_to_try=[FAST_MODEL, MODEL_CASCADE[0]],
+        lane=llm_governor.LANE_INTERACTIVE,
+    )
+    return _structured_reply("validations", response, client, FAST_MODEL, messages, 0.2,
+                             llm_governor.LANE_INTERACTIVE)
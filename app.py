@@ -3,11 +3,17 @@
 import os
 import io
 import json
+import logging
 import re
 import secrets
+import threading
+import time
 
 from typing import Optional
 
+# Startup clock for the import-time and time-to-first-request logs
+_import_started = time.perf_counter()
+
 from flask import (
     Flask,
     render_template,
@@ -17,28 +23,58 @@ from flask import (
     session,
     url_for,
 )
-from flask_wtf.csrf import CSRFProtect
+from flask_wtf.csrf import CSRFProtect, generate_csrf
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from PIL import Image
 from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-from game_engine import GameEngine, GameState, PuzzleState, TOTAL_PUZZLES, ROOM_TIME_SECONDS
+from game_engine import GameEngine, GameState, TOTAL_PUZZLES, ROOM_TIME_SECONDS
 from prompts import THEME_DESCRIPTIONS
+import assets
+import daily
+import event_log
+import idempotency
+import leaderboard
+import llm_endpoints
+import llm_governor
+import llm_quota
+import llm_slo
+import party
 import puzzle_cache
+import request_timing
 
 load_dotenv()
 
+# The app is the entry point, so it owns logging setup (library modules only
+# create loggers)
+logging.basicConfig(level=logging.INFO)
+
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", secrets.token_hex(32))
 
+# Behind N reverse proxies, take the client address from X-Forwarded-For so
+# per-IP rate limits and LLM quotas see players rather than the proxy.  Only
+# set it when the proxies overwrite the header: a client could forge it.
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", "0"))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
+# Server-Timing phases, structured request logs, slow-request profiles
+request_timing.init_app(app)
+
 # --- Fix #6: Limit upload size to 10 MB ---
 app.config["MAX_CONTENT_LENGTH"] = 10 * 1024 * 1024  # 10 MB
 
 # --- Fix #3: CSRF protection on all POST endpoints ---
 csrf = CSRFProtect(app)
+# Readable by game.js on pages rendered without a per-session <meta> token
+CSRF_COOKIE = "csrf_token"
 
 # --- Fix #4: Rate limiting ---
+# RATELIMIT_ENABLED=0 turns it off for load tests, where every simulated
+# player shares one IP.
+app.config["RATELIMIT_ENABLED"] = os.environ.get("RATELIMIT_ENABLED", "1") != "0"
 limiter = Limiter(
     get_remote_address,
     app=app,
@@ -48,40 +84,8 @@ limiter = Limiter(
 
 engine = GameEngine()
 
-
-def _session_id() -> str:
-    """Get or create a stable session ID for puzzle caching."""
-    sid = session.get("_cache_id")
-    if not sid:
-        sid = secrets.token_hex(8)
-        session["_cache_id"] = sid
-    return sid
-
-
-def _apply_cached_puzzle(state: GameState, cached: dict) -> GameState:
-    """Apply a pre-generated cached puzzle to the game state."""
-    puzzle = PuzzleState(**cached["puzzle"])
-    state.current_puzzle = puzzle
-    state.puzzles.append(cached["puzzle"])
-    if cached.get("narrative_text"):
-        state.narrative_log.append(cached["narrative_text"])
-    return state
-
-
-def _get_next_puzzle(state: GameState) -> GameState:
-    """Get the next puzzle from cache or generate on-demand."""
-    sid = _session_id()
-    puzzle_idx = state.current_puzzle_index
-
-    # Try cache first
-    cached = puzzle_cache.get_cached_puzzle(sid, puzzle_idx)
-    if cached:
-        app.logger.info("⚡ Using cached puzzle %d", puzzle_idx + 1)
-        return _apply_cached_puzzle(state, cached)
-
-    # Fall back to on-demand generation
-    app.logger.info("🔄 Cache miss for puzzle %d, generating on-demand...", puzzle_idx + 1)
-    return engine.generate_puzzle(state)
+# Templates link static files through the fingerprinted build (see assets.py)
+app.jinja_env.globals["asset_url"] = assets.asset_url
 
 
 # ---------------------------------------------------------------------------
@@ -111,33 +115,120 @@ def _session_id() -> str:
     if not sid:
         sid = secrets.token_hex(8)
         session["_cache_id"] = sid
+        llm_quota.bind(sid, get_remote_address())
     return sid
 
 
+@app.before_request
+def _bind_llm_payer():
+    """Charge this request's LLM calls to its session and IP (see llm_quota.py)."""
+    llm_quota.bind(session.get("_cache_id"), get_remote_address())
+
+
+def _event(event: str, state: GameState, **fields) -> None:
+    """Record a gameplay event for offline analysis (queued, see event_log.py)."""
+    mode = "daily" if state.daily else "party" if state.party_code else "custom" if state.theme == "custom" else "solo"
+    event_log.emit(event, **{
+        "sid": _session_id(), "g": round(state.start_time, 3), "th": state.theme,
+        "i": state.current_puzzle_index, "d": state.difficulty_level, "mode": mode, **fields,
+    })
+
+
+def _llm_ms() -> float:
+    """LLM time (queue, call and waiting on a validation batch) spent so far in this request."""
+    phases = request_timing.current()
+    return round(sum(phases.get(name, 0) for name in ("llm_queue", "llm", "llm_batch")), 1)
+
+
 def _apply_cached_puzzle(state: GameState, cached: dict) -> GameState:
     """Apply a pre-generated cached puzzle to the game state."""
-    puzzle = PuzzleState(**cached["puzzle"])
-    state.current_puzzle = puzzle
-    state.puzzles.append(cached["puzzle"])
+    # The clock starts when the player sees it, not when it was prefetched
+    state.puzzles.append({**cached["puzzle"], "started_at": time.time()})
     if cached.get("narrative_text"):
         state.narrative_log.append(cached["narrative_text"])
     return state
 
 
+def _narrative_since() -> Optional[int]:
+    """How many narrative entries the client already has (``narrative_since`` in the JSON body).
+
+    None for clients that don't send it, which get the whole log.
+    """
+    data = request.get_json(silent=True) or {}
+    since = data.get("narrative_since")
+    if isinstance(since, bool) or not isinstance(since, int) or since < 0:
+        return None
+    return since
+
+
+def _puzzle_payload(state: GameState) -> dict:
+    """The new puzzle and narrative for /answer, /skip and /next-puzzle.
+
+    Only narrative entries after ``narrative_since`` are sent
+    (``narrative_delta``); ``narrative_index`` is the log length after them,
+    so the client's copy is ``log[:narrative_index - len(delta)] + delta``.
+    The puzzle leaves out the answer and unrevealed hints.
+    """
+    puzzle = state.current_puzzle
+    log = state.narrative_log
+    payload = {
+        "puzzle": puzzle.to_public_dict() if puzzle else None,
+        "puzzle_number": state.current_puzzle_index + 1,
+        "remaining_seconds": state.remaining_seconds,
+        "narrative_index": len(log),
+    }
+    since = _narrative_since()
+    if since is None:
+        payload["narrative_log"] = log
+    else:
+        # A client ahead of the server (stale tab from an older game) starts over
+        payload["narrative_delta"] = log[since:] if since <= len(log) else log
+    return payload
+
+
 def _get_next_puzzle(state: GameState) -> GameState:
     """Get the next puzzle from cache or generate on-demand."""
-    sid = _session_id()
     puzzle_idx = state.current_puzzle_index
+    started = time.perf_counter()
+
+    if state.daily:
+        # Fast path: the prebuilt set, no generation and no prefetch
+        challenge = daily.load(state.theme, state.daily)
+        if challenge is None:
+            raise RuntimeError(f"Daily challenge {state.daily}/{state.theme} is gone")
+        state = _apply_cached_puzzle(state, daily.puzzle(challenge, puzzle_idx))
+        _event("puzzle", state, src="daily", ms=round((time.perf_counter() - started) * 1000, 1))
+        return state
+
+    if state.party_code:
+        # The party's shared sequence: generated once for the whole group
+        with request_timing.phase("party"):
+            shared = party.puzzle(state.party_code, puzzle_idx)
+        app.logger.info("🎉 Using party %s puzzle %d", state.party_code, puzzle_idx + 1)
+        state = _apply_cached_puzzle(state, shared)
+        _event("puzzle", state, src="party", ms=round((time.perf_counter() - started) * 1000, 1))
+        return state
 
-    # Try cache first
-    cached = puzzle_cache.get_cached_puzzle(sid, puzzle_idx)
+    sid = _session_id()
+
+    # Try cache first (the branch prefetched at the player's adjusted
+    # difficulty) — waits for the background thread if it is already
+    # generating it rather than paying for a duplicate LLM call
+    with request_timing.phase("cache"):
+        cached = puzzle_cache.wait_for_puzzle(sid, state)
     if cached:
-        app.logger.info("⚡ Using cached puzzle %d", puzzle_idx + 1)
-        return _apply_cached_puzzle(state, cached)
+        app.logger.info("⚡ Using cached puzzle %d (difficulty %d)", puzzle_idx + 1, state.difficulty_level)
+        state = _apply_cached_puzzle(state, cached)
+    else:
+        # Fall back to on-demand generation
+        app.logger.info("🔄 Cache miss for puzzle %d, generating on-demand...", puzzle_idx + 1)
+        state = engine.generate_puzzle(state)
+    _event("puzzle", state, src="cache" if cached else "generated",
+           ms=round((time.perf_counter() - started) * 1000, 1))
 
-    # Fall back to on-demand generation
-    app.logger.info("🔄 Cache miss for puzzle %d, generating on-demand...", puzzle_idx + 1)
-    return engine.generate_puzzle(state)
+    # Slide the prefetch window to the puzzle now being played
+    puzzle_cache.advance(sid, state)
+    return state
 
 
 # ---------------------------------------------------------------------------
@@ -147,13 +238,31 @@ def get_game_state() -> Optional[GameState]:
     """Load game state from Flask session."""
     data = session.get("game_state")
     if data:
-        return GameState.from_dict(data)
+        with request_timing.phase("state"):
+            return GameState.from_dict(data)
     return None
 
 
 def save_game_state(state: GameState):
     """Save game state to Flask session."""
-    session["game_state"] = state.to_dict()
+    with request_timing.phase("state"):
+        session["game_state"] = state.to_dict()
+    if state.status in ("victory", "defeat") and session.get("leaderboard_game") != state.start_time:
+        # Once per game; queued for the batched writer, not written here
+        session["leaderboard_game"] = state.start_time
+        sid = _session_id()
+        breakdown = engine.get_score_breakdown(state)
+        session["leaderboard_recorded_at"] = leaderboard.record(
+            sid, session.get("player_name") or f"Player {sid[:4]}", breakdown)
+        _event("victory" if state.status == "victory" else "time_up", state, score=state.score,
+               solved=state.solved_count, secs=round(breakdown["total_time"], 1))
+    if state.party_code:
+        # Share progress with the party (no write when nothing changed)
+        try:
+            with request_timing.phase("party"):
+                party.report(state)
+        except Exception as e:
+            app.logger.warning("🎉 Could not report party progress: %s", e)
 
 
 # ---------------------------------------------------------------------------
@@ -168,7 +277,29 @@ def lobby():
         puzzle_cache.invalidate_session(sid)
     # Clear any existing game
     session.pop("game_state", None)
-    return render_template("lobby.html", themes=THEME_DESCRIPTIONS)
+    # The page is the same for everyone, so it is rendered once and revalidated
+    # by ETag; the per-session CSRF token travels in a cookie instead
+    response = _lobby_page().response(request)
+    response.set_cookie(CSRF_COOKIE, generate_csrf(), samesite="Lax", secure=request.is_secure)
+    return response
+
+
+_lobby: Optional[assets.StaticPage] = None
+
+
+def _lobby_page() -> assets.StaticPage:
+    """The lobby HTML, rendered once per process (theme data never changes at runtime)."""
+    global _lobby
+    if _lobby is None:
+        _lobby = assets.StaticPage(render_template("lobby.html", themes=THEME_DESCRIPTIONS, csrf_from_cookie=True))
+    return _lobby
+
+
+@app.route("/assets/<path:filename>", endpoint="assets")
+@limiter.exempt
+def assets_file(filename: str):
+    """Fingerprinted, precompressed static files from ``build_assets.py``."""
+    return assets.send_asset(request, filename)
 
 
 @app.route("/room")
@@ -187,13 +318,17 @@ def room():
         "room.html",
         theme=state.theme,
         theme_data=theme_data,
-        puzzle=puzzle.to_dict() if puzzle else None,
+        puzzle=puzzle.to_public_dict() if puzzle else None,
+        narrative_text=puzzle.narrative_text if puzzle else "",
         puzzle_number=state.current_puzzle_index + 1,
         total_puzzles=TOTAL_PUZZLES,
         score=state.score,
         remaining_seconds=state.remaining_seconds,
         room_time=ROOM_TIME_SECONDS,
-        narrative_log=state.narrative_log,
+        # The page shows only the latest entry; game.js asks for entries after this index
+        narrative_index=len(state.narrative_log),
+        party_code=state.party_code,
+        party_member=state.party_member,
     )
 
 
@@ -206,12 +341,29 @@ def result():
 
     breakdown = engine.get_score_breakdown(state)
     theme_data = THEME_DESCRIPTIONS.get(state.theme, {})
+    today = leaderboard.today()
+    theme_name = theme_data.get("name", state.theme)
+    # The game was queued moments ago and may not be on the boards yet
+    recorded_at = session.get("leaderboard_recorded_at")
+    own_game = (_session_id(), recorded_at) if recorded_at is not None else None
+    ranks = [
+        {"label": label, **leaderboard.rank(key, breakdown["total_score"], own_game)}
+        for label, key in (
+            (f"Today · {theme_name}", leaderboard.board_key(state.theme, today)),
+            ("Today · all rooms", leaderboard.board_key(day=today)),
+            (f"All-time · {theme_name}", leaderboard.board_key(state.theme)),
+        )
+    ]
 
     return render_template(
         "result.html",
         breakdown=breakdown,
+        ranks=ranks,
+        top_today=leaderboard.top(leaderboard.board_key(state.theme, today), limit=5),
         theme=state.theme,
         theme_data=theme_data,
+        party_code=state.party_code,
+        party_member=state.party_member,
     )
 
 
@@ -220,6 +372,7 @@ def result():
 # ---------------------------------------------------------------------------
 @app.route("/start", methods=["POST"])
 @limiter.limit("10 per minute")
+@idempotency.idempotent(_session_id)
 def start_game():
     """Start a new game with the selected theme."""
     data = request.get_json()
@@ -233,6 +386,7 @@ def start_game():
         state = engine.start_game(theme, difficulty=difficulty)
         state = engine.generate_puzzle(state)
         save_game_state(state)
+        _event("start", state)
 
         # Start background pre-generation of puzzles 2-5
         sid = _session_id()
@@ -247,8 +401,109 @@ def start_game():
     })
 
 
+@app.route("/daily/start", methods=["POST"])
+@limiter.limit("10 per minute")
+@idempotency.idempotent(_session_id)
+def start_daily():
+    """Start today's challenge for a theme: the same prebuilt puzzles for everyone, no AI wait."""
+    data = request.get_json() or {}
+    theme = data.get("theme", "theoffice")
+    challenge = daily.load(theme) if theme in THEME_DESCRIPTIONS else None
+    if challenge is None:
+        return jsonify({"error": "Today's challenge for that theme isn't ready yet — try another theme."}), 404
+
+    state = engine.start_game(theme, difficulty=challenge["difficulty"])
+    state.daily = challenge["date"]
+    state.easter_egg_puzzle = challenge["easter_egg_puzzle"]
+    state = _apply_cached_puzzle(state, daily.puzzle(challenge, 0))
+    save_game_state(state)
+    _event("start", state)
+
+    return jsonify({"success": True, "redirect": url_for("room")})
+
+
+def _start_party_game(code: str, name: str) -> GameState:
+    """Join party *code* and start this player's game on the party's first puzzle."""
+    info = party.get(code)
+    if info is None:
+        raise party.PartyError("No party with that code — it may have expired.")
+    state = engine.start_game(info["theme"], difficulty=info["difficulty"])
+    state.easter_egg_puzzle = info["easter_egg_puzzle"]
+    state.party_code = info["code"]
+    state.party_member = party.join(info["code"], name)
+    state = _apply_cached_puzzle(state, party.puzzle(info["code"], 0))
+    save_game_state(state)
+    _event("start", state)
+    return state
+
+
+@app.route("/party/create", methods=["POST"])
+@limiter.limit("10 per minute")
+@idempotency.idempotent(_session_id)
+def create_party():
+    """Start a party game: friends join with the returned code and share its puzzles."""
+    data = request.get_json() or {}
+    theme = data.get("theme", "theoffice")
+    difficulty = int(data.get("difficulty", 2))
+
+    if theme not in THEME_DESCRIPTIONS:
+        return jsonify({"error": "Invalid theme"}), 400
+
+    name = _sanitize_input(data.get("name", ""), max_length=24)
+    if name:
+        session["player_name"] = name
+    try:
+        seed = engine.start_game(theme, difficulty=difficulty)
+        code = party.create(theme, seed.difficulty_level, seed.easter_egg_puzzle)
+        _start_party_game(code, name)
+        party.start_prefetch(code)
+    except Exception as e:
+        app.logger.error("Failed to start party: %s", e)
+        return jsonify({"error": f"AI is busy — please try again in a moment. ({type(e).__name__})"}), 503
+
+    return jsonify({"success": True, "code": code, "redirect": url_for("room")})
+
+
+@app.route("/party/join", methods=["POST"])
+@limiter.limit("10 per minute")
+@idempotency.idempotent(_session_id)
+def join_party():
+    """Join a friend's party by code."""
+    data = request.get_json() or {}
+    name = _sanitize_input(data.get("name", ""), max_length=24)
+    if name:
+        session["player_name"] = name
+    try:
+        state = _start_party_game(data.get("code", ""), name)
+    except party.PartyError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        app.logger.error("Failed to join party: %s", e)
+        return jsonify({"error": f"AI is busy — please try again in a moment. ({type(e).__name__})"}), 503
+
+    return jsonify({"success": True, "code": state.party_code, "redirect": url_for("room")})
+
+
+@app.route("/party/<code>/progress", methods=["GET"])
+@limiter.exempt
+def party_progress(code: str):
+    """Party standings for polling members; 304 while the party's version is unchanged."""
+    snapshot = party.progress(code)
+    if snapshot is None:
+        return jsonify({"error": "No such party"}), 404
+    etag = f"party-{snapshot['code']}-{snapshot['version']}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(snapshot)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @app.route("/answer", methods=["POST"])
 @limiter.limit("30 per minute")
+@idempotency.idempotent(_session_id)
 def submit_answer():
     """Submit an answer for the current puzzle."""
     state = get_game_state()
@@ -272,11 +527,15 @@ def submit_answer():
     if not player_answer:
         return jsonify({"error": "Please enter an answer"}), 400
 
+    idx, level = state.current_puzzle_index, state.difficulty_level
     try:
         state, result = engine.check_answer(state, player_answer)
     except Exception as e:
         app.logger.error("Answer validation failed: %s", e)
         return jsonify({"correct": False, "feedback": "AI is momentarily busy. Try submitting again."})
+    if not result.get("time_up"):
+        _event("answer", state, i=idx, d=level, ok=bool(result.get("correct")),
+               n=state.puzzles[idx].get("attempts", 0), pts=result.get("score", 0), llm_ms=_llm_ms())
 
     if result.get("game_complete"):
         save_game_state(state)
@@ -287,34 +546,16 @@ def submit_answer():
 
     if result.get("next_puzzle"):
         # Try cache first, fall back to on-demand generation
-        sid = _session_id()
-        next_idx = state.current_puzzle_index
-        cached = puzzle_cache.get_cached_puzzle(sid, next_idx)
-
-        if cached:
-            app.logger.info("⚡ [Answer] Using cached puzzle %d", next_idx + 1)
-            state.puzzles.append(cached["puzzle"])
-            if cached.get("narrative_text"):
-                state.narrative_log.append(cached["narrative_text"])
-        else:
-            app.logger.info("🐢 [Answer] Cache miss for puzzle %d, generating on-demand", next_idx + 1)
-            try:
-                state = engine.generate_puzzle(state)
-            except Exception as e:
-                app.logger.error("Puzzle generation failed: %s", e)
-                # Save state so /next-puzzle can retry
-                save_game_state(state)
-                return jsonify({**result, "needs_retry": True})
+        try:
+            state = _get_next_puzzle(state)
+        except Exception as e:
+            app.logger.error("Puzzle generation failed: %s", e)
+            # Save state so /next-puzzle can retry
+            save_game_state(state)
+            return jsonify({**result, "needs_retry": True})
 
         save_game_state(state)
-        puzzle = state.current_puzzle
-        return jsonify({
-            **result,
-            "puzzle": puzzle.to_dict() if puzzle else None,
-            "puzzle_number": state.current_puzzle_index + 1,
-            "remaining_seconds": state.remaining_seconds,
-            "narrative_log": state.narrative_log,
-        })
+        return jsonify({**result, **_puzzle_payload(state)})
 
     if result.get("time_up"):
         save_game_state(state)
@@ -326,6 +567,7 @@ def submit_answer():
 
 @app.route("/hint", methods=["POST"])
 @limiter.limit("20 per minute")
+@idempotency.idempotent(_session_id)
 def get_hint():
     """Request a hint for the current puzzle."""
     state = get_game_state()
@@ -339,6 +581,7 @@ def get_hint():
 
     state, result = engine.get_hint(state)
     save_game_state(state)
+    _event("hint", state, n=result.get("hints_used", 0), pen=result.get("time_penalty", 0), llm_ms=_llm_ms())
 
     return jsonify({
         **result,
@@ -348,6 +591,7 @@ def get_hint():
 
 @app.route("/start-custom", methods=["POST"])
 @limiter.limit("5 per minute")
+@idempotency.idempotent(_session_id)
 def start_custom_game():
     """Start a custom game from an uploaded image."""
     if "image" not in request.files:
@@ -358,10 +602,14 @@ def start_custom_game():
         return jsonify({"error": "No file selected"}), 400
 
     try:
+        # PIL is only needed here; importing it lazily keeps it off cold start
+        from PIL import Image
+
         image = Image.open(io.BytesIO(file.read()))
         state = engine.start_game("custom")
         state = engine.generate_image_puzzle(state, image)
         save_game_state(state)
+        _event("start", state)
 
         return jsonify({
             "success": True,
@@ -373,6 +621,7 @@ def start_custom_game():
 
 
 @app.route("/reveal", methods=["POST"])
+@idempotency.idempotent(_session_id)
 def reveal_answer():
     """Reveal the answer for the current puzzle without skipping or scoring."""
     state = get_game_state()
@@ -390,11 +639,13 @@ def reveal_answer():
 
     # --- Fix #2: Mark this puzzle as revealed so /answer rejects submissions ---
     session["revealed_puzzle"] = state.current_puzzle_index
+    _event("reveal", state)
 
     return jsonify({"answer": puzzle.answer})
 
 
 @app.route("/skip", methods=["POST"])
+@idempotency.idempotent(_session_id)
 def skip_puzzle():
     """Skip the current puzzle (0 points, answer revealed)."""
     state = get_game_state()
@@ -406,7 +657,10 @@ def skip_puzzle():
         save_game_state(state)
         return jsonify({"time_up": True, "redirect": url_for("result")})
 
+    idx, level = state.current_puzzle_index, state.difficulty_level
     state, result = engine.skip_puzzle(state)
+    if result.get("skipped"):
+        _event("skip", state, i=idx, d=level)
 
     if result.get("game_complete"):
         save_game_state(state)
@@ -414,39 +668,22 @@ def skip_puzzle():
 
     if result.get("next_puzzle"):
         # Try cache first
-        sid = _session_id()
-        next_idx = state.current_puzzle_index
-        cached = puzzle_cache.get_cached_puzzle(sid, next_idx)
-
-        if cached:
-            app.logger.info("⚡ [Skip] Using cached puzzle %d", next_idx + 1)
-            state.puzzles.append(cached["puzzle"])
-            if cached.get("narrative_text"):
-                state.narrative_log.append(cached["narrative_text"])
-        else:
-            app.logger.info("🐢 [Skip] Cache miss for puzzle %d, generating on-demand", next_idx + 1)
-            try:
-                state = engine.generate_puzzle(state)
-            except Exception as e:
-                app.logger.error("Puzzle generation after skip failed: %s", e)
-                save_game_state(state)
-                return jsonify({**result, "error_generating": True})
+        try:
+            state = _get_next_puzzle(state)
+        except Exception as e:
+            app.logger.error("Puzzle generation after skip failed: %s", e)
+            save_game_state(state)
+            return jsonify({**result, "error_generating": True})
 
         save_game_state(state)
-        puzzle = state.current_puzzle
-        return jsonify({
-            **result,
-            "puzzle": puzzle.to_dict() if puzzle else None,
-            "puzzle_number": state.current_puzzle_index + 1,
-            "remaining_seconds": state.remaining_seconds,
-            "narrative_log": state.narrative_log,
-        })
+        return jsonify({**result, **_puzzle_payload(state)})
 
     save_game_state(state)
     return jsonify(result)
 
 
 @app.route("/next-puzzle", methods=["POST"])
+@idempotency.idempotent(_session_id)
 def next_puzzle():
     """Retry generating the next puzzle (called when initial generation failed)."""
     state = get_game_state()
@@ -459,30 +696,33 @@ def next_puzzle():
         return jsonify({"time_up": True, "redirect": url_for("result")})
 
     # Try cache first
-    sid = _session_id()
-    cached = puzzle_cache.get_cached_puzzle(sid, state.current_puzzle_index)
-    if cached:
-        app.logger.info("⚡ [Cache HIT] Using cached puzzle %d", state.current_puzzle_index + 1)
-        state.puzzles.append(cached["puzzle"])
-        if cached.get("narrative_text"):
-            state.narrative_log.append(cached["narrative_text"])
-    else:
-        app.logger.info("🐢 [Cache MISS] Generating puzzle %d on-demand", state.current_puzzle_index + 1)
-        try:
-            state = engine.generate_puzzle(state)
-        except Exception as e:
-            app.logger.error("Retry puzzle generation failed: %s", e)
-            return jsonify({"needs_retry": True})
+    try:
+        state = _get_next_puzzle(state)
+    except Exception as e:
+        app.logger.error("Retry puzzle generation failed: %s", e)
+        return jsonify({"needs_retry": True})
 
     save_game_state(state)
-    puzzle = state.current_puzzle
-    return jsonify({
-        "success": True,
-        "puzzle": puzzle.to_dict() if puzzle else None,
-        "puzzle_number": state.current_puzzle_index + 1,
-        "remaining_seconds": state.remaining_seconds,
-        "narrative_log": state.narrative_log,
-    })
+    return jsonify({"success": True, **_puzzle_payload(state)})
+
+
+@app.route("/leaderboard", methods=["GET"])
+def leaderboard_top():
+    """Top scores: ?theme= (default all rooms), ?day=today|YYYY-MM-DD (default all-time), ?limit=."""
+    theme = request.args.get("theme") or None
+    day = request.args.get("day") or None
+    if theme is not None and theme not in THEME_DESCRIPTIONS:
+        return jsonify({"error": "Invalid theme"}), 400
+    if day == "today":
+        day = leaderboard.today()
+    elif day is not None and not re.fullmatch(r"\d{4}-\d{2}-\d{2}", day):
+        return jsonify({"error": "day must be 'today' or YYYY-MM-DD"}), 400
+    limit = request.args.get("limit", 10, type=int)
+    key = leaderboard.board_key(theme, day)
+    response = jsonify({"board": key, "entries": leaderboard.top(key, limit=limit)})
+    # Served from the in-memory view, which is itself this fresh
+    response.headers["Cache-Control"] = f"public, max-age={int(leaderboard.CACHE_SECONDS)}"
+    return response
 
 
 @app.route("/cache-status", methods=["GET"])
@@ -497,6 +737,15 @@ def cache_status():
     return jsonify(status)
 
 
+@app.route("/llm-status", methods=["GET"])
+def llm_status():
+    """Debug endpoint: outbound LLM governor queues, endpoint health, quotas and the latency SLO."""
+    if not app.debug:
+        return jsonify({"error": "Not available"}), 404
+    return jsonify({**llm_governor.get_stats(), "endpoints": llm_endpoints.get_stats(),
+                    "quota": llm_quota.get_stats(), "slo": llm_slo.get_stats()})
+
+
 @app.route("/time-check", methods=["POST"])
 def time_check():
     """Check if time is still remaining (called periodically by JS)."""
@@ -519,6 +768,59 @@ def time_check():
     })
 
 
+# ---------------------------------------------------------------------------
+# Startup: preload warm-up and time to first request
+# ---------------------------------------------------------------------------
+# Measured from the start of this import, or from the fork for a worker that
+# inherited an already-imported app (gunicorn --preload)
+_startup = {"since": _import_started, "origin": "import", "pending": True}
+_startup_lock = threading.Lock()
+
+
+def warm_up() -> None:
+    """Load shared read-only data once, before gunicorn forks its workers.
+
+    Called from ``gunicorn.conf.py`` when ``preload_app`` is on: compiled
+    templates, the asset manifest and the rendered lobby (and the theme data
+    and prompt tables already loaded by the import) are then shared copy-on-write by every worker instead of being
+    built per process.  Per-process resources — the LLM client, puzzle
+    cache threads, SQLite connections — are still created lazily after fork.
+    """
+    t0 = time.perf_counter()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    assets.manifest()
+    with app.test_request_context("/"):
+        _lobby_page()
+    app.logger.info("🔥 Warmed %d templates in %.0fms", len(app.jinja_env.list_templates()),
+                    (time.perf_counter() - t0) * 1000)
+
+
+def _reset_startup_after_fork() -> None:
+    global _startup_lock
+    _startup_lock = threading.Lock()
+    _startup.update(since=time.perf_counter(), origin="fork", pending=True)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_startup_after_fork)
+
+
+@app.after_request
+def _log_first_request(response):
+    if _startup["pending"]:
+        with _startup_lock:
+            first = _startup["pending"]
+            _startup["pending"] = False
+        if first:
+            app.logger.info("🚀 First request served %.0fms after %s (pid %d)",
+                            (time.perf_counter() - _startup["since"]) * 1000, _startup["origin"], os.getpid())
+    return response
+
+
+app.logger.info("📦 App imported in %.0fms", (time.perf_counter() - _import_started) * 1000)
+
+
 # ---------------------------------------------------------------------------
 # Run
 # ---------------------------------------------------------------------------
@@ -0,0 +1,170 @@
+"""Fingerprinted, precompressed static assets and rendered-once pages.
+
+``build_assets.py`` copies every file under ``static/css`` and ``static/js``
+to ``static/dist`` with a content hash in its name (``js/game.3f9c1a2b7d.js``),
+writes ``.gz`` and — when the optional ``brotli`` package is installed —
+``.br`` variants next to it, and records the mapping in
+``static/dist/manifest.json``.
+
+At runtime templates call ``asset_url("js/game.js")``.  With a manifest it
+returns the fingerprinted URL, served by ``send_asset`` with a year-long
+``immutable`` cache lifetime and the best precompressed variant the client
+accepts.  A new build changes the name, so a deploy never serves stale
+files.  Without a manifest (a dev checkout that never ran the build) it
+falls back to the plain ``/static/`` URL.
+
+``StaticPage`` holds an HTML page that is identical for every visitor. It is
+rendered once, compressed once, and served with an ETag so repeat views
+are answered with ``304 Not Modified``.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import threading
+from typing import Optional
+
+from flask import Request, Response, abort, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+# Source directories (under static/) that get fingerprinted
+ASSET_DIRS = ("css", "js")
+
+# Fingerprinted names never change content, so browsers may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Text files smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 256
+
+_manifest: Optional[dict] = None
+_manifest_lock = threading.Lock()
+
+
+def _compress(data: bytes) -> dict[str, bytes]:
+    """Precompressed variants of *data* that are actually smaller, keyed by encoding."""
+    if len(data) < MIN_COMPRESS_BYTES:
+        return {}
+    variants = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return {enc: body for enc, body in variants.items() if len(body) < len(data)}
+
+
+def build(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> dict:
+    """Fingerprint and precompress assets into *dist_dir*; returns the manifest."""
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    assets = {}
+    for sub in ASSET_DIRS:
+        root = os.path.join(static_dir, sub)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                source = os.path.join(dirpath, filename)
+                logical = os.path.relpath(source, static_dir).replace(os.sep, "/")
+                with open(source, "rb") as f:
+                    data = f.read()
+                stem, ext = os.path.splitext(logical)
+                hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+                target = os.path.join(dist_dir, hashed)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as f:
+                    f.write(data)
+                sizes = {"identity": len(data)}
+                for encoding, body in _compress(data).items():
+                    with open(target + dict(ENCODINGS)[encoding], "wb") as f:
+                        f.write(body)
+                    sizes[encoding] = len(body)
+                assets[logical] = {"path": hashed, "sizes": sizes}
+    manifest = {"assets": assets}
+    os.makedirs(dist_dir, exist_ok=True)
+    with open(os.path.join(dist_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def manifest() -> dict:
+    """The build manifest (``{"assets": {}}`` if the build has not run), loaded once per process."""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                try:
+                    with open(MANIFEST_PATH) as f:
+                        loaded = json.load(f)
+                except (OSError, ValueError):
+                    logger.info("📦 No asset manifest at %s — serving unfingerprinted static files", MANIFEST_PATH)
+                    loaded = {"assets": {}}
+                loaded["by_path"] = {entry["path"]: entry for entry in loaded["assets"].values()}
+                _manifest = loaded
+    return _manifest
+
+
+def asset_url(filename: str) -> str:
+    """URL for a static asset: fingerprinted when built, plain ``/static/`` otherwise."""
+    entry = manifest()["assets"].get(filename)
+    if entry is None:
+        return url_for("static", filename=filename)
+    return url_for("assets", filename=entry["path"])
+
+
+def negotiate(request: Request, available) -> Optional[str]:
+    """The preferred encoding in *available* that the client accepts, or None."""
+    for encoding, _ in ENCODINGS:
+        if encoding in available and request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def send_asset(request: Request, filename: str) -> Response:
+    """Serve a fingerprinted asset from the manifest (404 for anything else)."""
+    entry = manifest()["by_path"].get(filename)
+    if entry is None:
+        abort(404)
+    encoding = negotiate(request, entry["sizes"])
+    path = os.path.join(DIST_DIR, entry["path"]) + (dict(ENCODINGS)[encoding] if encoding else "")
+    mimetype = mimetypes.guess_type(entry["path"])[0] or "application/octet-stream"
+    response = send_file(path, mimetype=mimetype, etag=f"{entry['path']}-{encoding or 'identity'}",
+                         conditional=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+class StaticPage:
+    """An HTML page that is identical for every visitor, rendered and compressed once."""
+
+    def __init__(self, html: str):
+        self.body = html.encode("utf-8")
+        self.variants = {None: self.body, **_compress(self.body)}
+        self.etag = hashlib.sha256(self.body).hexdigest()[:16]
+
+    def response(self, request: Request) -> Response:
+        """The page in the best encoding the client accepts, or a 304 if it is unchanged."""
+        encoding = negotiate(request, self.variants)
+        response = Response(self.variants[encoding], mimetype="text/html")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.set_etag(f"{self.etag}-{encoding or 'identity'}")
+        # Revalidate every view (the route still runs) but send no body when unchanged
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.vary.add("Accept-Encoding")
+        return response.make_conditional(request)
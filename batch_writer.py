@@ -0,0 +1,161 @@
+"""Batched background writes off the request path.
+
+Request threads ``submit`` items to an in-memory queue and return at once.
+One daemon thread per writer (per process) hands them to ``flush_fn`` in
+batches of up to ``max_batch``, at least every ``interval`` seconds, so many
+small writes become one transaction.
+
+- Bounded: past ``max_pending`` queued items new ones are dropped and
+  counted rather than growing memory without limit while storage is down.
+- A failed batch goes back to the front of the queue and is retried; after
+  ``MAX_FAILURES`` failures in a row it is dropped (and logged) so one bad
+  item can't wedge the writer.
+- ``flush()`` writes everything queued so far on the caller's thread (for
+  shutdown, benchmarks and tools); writers are flushed at exit.
+- Fork-safe: a forked child (gunicorn ``--preload``) starts with an empty
+  queue and its own thread.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_FAILURES = 3
+
+_writers: "weakref.WeakSet[BatchWriter]" = weakref.WeakSet()
+
+
+class BatchWriter:
+    """Queue items from any thread; write them in batches on one background thread."""
+
+    def __init__(self, name: str, flush_fn: Callable[[list], None], max_batch: int = 500,
+                 interval: float = 0.5, max_pending: int = 100_000):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self._init_state()
+        _writers.add(self)
+
+    def _init_state(self) -> None:
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()   # one flush_fn call at a time
+        self._queue: deque = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._failures = 0
+        self._stats = {"submitted": 0, "written": 0, "batches": 0, "failed_batches": 0, "dropped": 0}
+
+    def submit(self, item) -> bool:
+        """Queue *item* for writing.  False if it was dropped because the queue is full."""
+        with self._lock:
+            if len(self._queue) >= self.max_pending:
+                self._stats["dropped"] += 1
+                if self._stats["dropped"] % 1000 == 1:
+                    logger.warning("🪣 [%s] Write queue full (%d) — dropping items", self.name, self.max_pending)
+                return False
+            self._queue.append(item)
+            self._stats["submitted"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"batch-writer-{self.name}", daemon=True)
+                self._thread.start()
+            if len(self._queue) >= self.max_batch:
+                self._wake.notify()
+        return True
+
+    def _take(self) -> list:
+        """Pop the next batch.  Caller holds _lock."""
+        n = min(len(self._queue), self.max_batch)
+        return [self._queue.popleft() for _ in range(n)]
+
+    def _write(self, batch: list) -> None:
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            with self._lock:
+                self._failures += 1
+                self._stats["failed_batches"] += 1
+                if self._failures >= MAX_FAILURES:
+                    self._stats["dropped"] += len(batch)
+                    self._failures = 0
+                    logger.error("❌ [%s] Dropped a batch of %d after %d failures: %s",
+                                 self.name, len(batch), MAX_FAILURES, e)
+                else:
+                    self._queue.extendleft(reversed(batch))
+                    logger.warning("⚠️ [%s] Batch of %d failed, will retry: %s", self.name, len(batch), e)
+            return
+        with self._lock:
+            self._failures = 0
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if len(self._queue) < self.max_batch and not self._closed:
+                    self._wake.wait(self.interval)
+                batch = self._take()
+                if not batch and self._closed:
+                    return
+            if batch:
+                with self._write_lock:
+                    self._write(batch)
+                if self._failures:
+                    time.sleep(self.interval)
+
+    def flush(self) -> None:
+        """Write everything queued so far, on this thread."""
+        while True:
+            with self._write_lock:
+                with self._lock:
+                    batch = self._take()
+                if not batch:
+                    return
+                self._write(batch)
+                with self._lock:
+                    if self._failures:
+                        return  # storage is down; the background thread keeps retrying
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "pending": len(self._queue)}
+
+
+def _close_all() -> None:
+    for writer in list(_writers):
+        try:
+            writer.close()
+        except Exception as e:
+            logger.error("❌ [%s] Could not flush at exit: %s", writer.name, e)
+
+
+atexit.register(_close_all)
+
+
+def _reset_after_fork() -> None:
+    # The parent's queue is the parent's to write; its thread doesn't exist here
+    for writer in list(_writers):
+        writer._init_state()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
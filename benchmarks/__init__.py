@@ -0,0 +1,5 @@
+"""Offline benchmarks and load tools.
+
+Everything in here runs against a local OpenAI-compatible stand-in server
+(see ``mock_llm``) so no API key or network access is needed.
+"""
@@ -0,0 +1,207 @@
+"""Benchmark the session cache core at high session counts.
+
+Replays a mixed workload — mostly lookups of live sessions, some new games
+(inserts) and branch writes that grow an entry — from several threads
+against two implementations:
+
+- ``legacy``: the original design, one dict behind one global lock, with a
+  full scan for expired sessions and a sort by ``created_at`` on every insert
+  once the session cap is reached;
+- ``sharded``: ``cache_core.ShardedCache`` with O(1) LRU, a TTL heap, a byte
+  budget and per-shard locks.
+
+Entries are shaped like real ``puzzle_cache`` sessions (state snapshot plus
+cached puzzle branches) so byte accounting reflects production sizes.  Both
+caches are capped at the same number of sessions' worth of memory.
+
+    python -m benchmarks.bench_cache --sessions 10000,50000 --threads 8 --output cache.json
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.report import compare, make_result, summarize, write_result
+from cache_core import ShardedCache, deep_sizeof
+from game_engine import GameState, PuzzleState
+
+TTL = 30 * 60
+
+
+def _make_entry(rng: random.Random) -> dict:
+    """A session entry the size of a mid-game puzzle_cache entry."""
+    puzzle = PuzzleState(
+        question="Which Dunder Mifflin employee " + "x" * rng.randint(40, 160) + "?",
+        puzzle_type="trivia", answer="dwight schrute",
+        hints=["h" * 40, "h" * 50, "h" * 60], narrative_text="n" * rng.randint(40, 120),
+    ).to_dict()
+    state = GameState(theme="theoffice", status="playing", puzzles=[puzzle, dict(puzzle)]).to_dict()
+    return {"state": state, "puzzles": {2: {1: {"puzzle": puzzle}, 2: {"puzzle": dict(puzzle)}}},
+            "created_at": time.time()}
+
+
+class LegacyCache:
+    """The pre-sharding design: one lock, count cap, scan + sort eviction on insert."""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict] = {}
+
+    def _evict_expired(self) -> None:
+        now = time.time()
+        expired = [sid for sid, e in self.entries.items() if now - e.get("created_at", 0) > TTL]
+        for sid in expired:
+            self.entries.pop(sid, None)
+        if len(self.entries) > self.max_sessions:
+            ordered = sorted(self.entries, key=lambda s: self.entries[s].get("created_at", 0))
+            for sid in ordered[:len(self.entries) - self.max_sessions]:
+                self.entries.pop(sid, None)
+
+    def put(self, sid: str, entry: dict, size: int) -> None:
+        with self.lock:
+            self._evict_expired()
+            self.entries[sid] = entry
+
+    def get(self, sid: str):
+        with self.lock:
+            entry = self.entries.get(sid)
+            if entry and time.time() - entry["created_at"] > TTL:
+                self.entries.pop(sid, None)
+                return None
+            return entry
+
+    def grow(self, sid: str, cached: dict, size: int) -> None:
+        with self.lock:
+            entry = self.entries.get(sid)
+            if entry:
+                entry["puzzles"].setdefault(3, {})[2] = cached
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class ShardedAdapter:
+    """Same operations on ``ShardedCache``, including byte accounting on growth."""
+
+    def __init__(self, max_bytes: int, shards: int):
+        self.cache = ShardedCache(max_bytes, TTL, shards)
+
+    def put(self, sid: str, entry: dict, size: int) -> None:
+        self.cache.put(sid, entry, size)
+
+    def get(self, sid: str):
+        return self.cache.get(sid)
+
+    def grow(self, sid: str, cached: dict, size: int) -> None:
+        shard = self.cache.shard(sid)
+        with shard.lock:
+            entry = shard.get(sid)
+            if entry:
+                entry["puzzles"].setdefault(3, {})[2] = cached
+                entry["bytes"] = entry.get("bytes", 0) + size
+                shard.resize(sid, entry["bytes"])
+
+    def __len__(self) -> int:
+        return self.cache.stats()["entries"]
+
+
+def run(cache, sessions: int, threads: int, ops_per_thread: int, entry_size: int,
+        insert_rate: float, grow_rate: float, seed: int) -> dict:
+    """Pre-fill *sessions* entries, then replay the mixed workload from *threads* threads."""
+    rng = random.Random(seed)
+    template = _make_entry(rng)
+    cached = {"puzzle": template["state"]["puzzles"][0]}
+    fill_t0 = time.perf_counter()
+    for i in range(sessions):
+        entry = {**template, "puzzles": {}, "created_at": time.time(), "bytes": entry_size}
+        cache.put(f"s{i}", entry, entry_size)
+    fill_seconds = time.perf_counter() - fill_t0
+
+    latencies = {"get": [], "put": [], "grow": []}
+    lock = threading.Lock()
+    next_id = [sessions]
+
+    def worker(wseed: int) -> None:
+        wrng = random.Random(wseed)
+        local = {"get": [], "put": [], "grow": []}
+        for _ in range(ops_per_thread):
+            roll = wrng.random()
+            if roll < insert_rate:
+                with lock:
+                    sid = f"s{next_id[0]}"
+                    next_id[0] += 1
+                entry = {**template, "puzzles": {}, "created_at": time.time(), "bytes": entry_size}
+                t0 = time.perf_counter()
+                cache.put(sid, entry, entry_size)
+                local["put"].append(time.perf_counter() - t0)
+            elif roll < insert_rate + grow_rate:
+                sid = f"s{wrng.randrange(next_id[0])}"
+                t0 = time.perf_counter()
+                cache.grow(sid, cached, 600)
+                local["grow"].append(time.perf_counter() - t0)
+            else:
+                sid = f"s{wrng.randrange(next_id[0])}"
+                t0 = time.perf_counter()
+                cache.get(sid)
+                local["get"].append(time.perf_counter() - t0)
+        with lock:
+            for op, values in local.items():
+                latencies[op].extend(values)
+
+    pool = [threading.Thread(target=worker, args=(seed + i,)) for i in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    wall = time.perf_counter() - t0
+    total_ops = threads * ops_per_thread
+    return {
+        "sessions": sessions,
+        "fill_us_per_insert": round(fill_seconds / sessions * 1e6, 2),
+        "ops_per_second": round(total_ops / wall),
+        "resident_sessions": len(cache),
+        **{op: summarize(values) for op, values in latencies.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the legacy and sharded session caches at scale.")
+    parser.add_argument("--sessions", default="10000,50000", help="comma-separated pre-filled session counts")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=5000, help="operations per thread")
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--insert-rate", type=float, default=0.05, help="fraction of ops that start a game")
+    parser.add_argument("--grow-rate", type=float, default=0.15, help="fraction of ops that cache a branch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    args = parser.parse_args()
+
+    entry_size = deep_sizeof(_make_entry(random.Random(args.seed)))
+    runs = {"legacy": [], "sharded": []}
+    for sessions in [int(n) for n in args.sessions.split(",")]:
+        # Cap both at the pre-filled population so inserts have to evict
+        for name, cache in (("legacy", LegacyCache(sessions)),
+                            ("sharded", ShardedAdapter(sessions * entry_size, args.shards))):
+            result = run(cache, sessions, args.threads, args.ops, entry_size,
+                         args.insert_rate, args.grow_rate, args.seed)
+            runs[name].append(result)
+            print(f"{name:<8} {sessions:>7} sessions: {result['ops_per_second']:>9} ops/s  "
+                  f"put p99 {result['put']['p99_ms']:>8.3f}ms  get p99 {result['get']['p99_ms']:>7.3f}ms")
+
+    result = make_result(
+        "bench_cache",
+        {"threads": args.threads, "ops_per_thread": args.ops, "shards": args.shards,
+         "insert_rate": args.insert_rate, "grow_rate": args.grow_rate, "entry_bytes": entry_size},
+        **runs,
+    )
+    write_result(result, args.output)
+    if args.compare:
+        compare(result, args.compare, sections=("legacy", "sharded"))
+
+
+if __name__ == "__main__":
+    main()
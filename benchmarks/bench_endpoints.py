@@ -0,0 +1,138 @@
+"""Benchmark LLM load balancing over several stand-in endpoints.
+
+Starts ``--endpoints`` mock LLM servers, points ``API_ENDPOINTS`` at them and
+has ``--clients`` threads make answer-validation calls through ``ai_client``
+back to back, in three phases of ``--phase-seconds`` each:
+
+- ``healthy`` — every endpoint at ``--latency``;
+- ``slow`` — the last endpoint at ``--slow-latency``: least-outstanding
+  balancing should send it less traffic;
+- ``down`` — the last endpoint answers every call with a 500: it should be
+  ejected after ``LLM_EJECT_FAILURES`` failures and retried calls should
+  fail over instead of backing off.
+
+Reports latency, errors and throughput per phase, each endpoint's share of
+the calls and the pool's ejection counts.  ``--endpoints 1`` is the
+single-gateway baseline (the slow and failing server is then the only one):
+
+    python -m benchmarks.bench_endpoints --endpoints 1 --output one.json
+    python -m benchmarks.bench_endpoints --endpoints 3 --compare one.json
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from benchmarks.mock_llm import MOCK_ANSWERS, Latency, MockLLMServer, add_mock_arguments, config_from_args
+from benchmarks.report import compare, make_result, summarize, write_result
+
+
+def run_phase(ai_client, servers: list[MockLLMServer], clients: int, seconds: float) -> dict:
+    from prompts import ANSWER_VALIDATION_SYSTEM, answer_validation_prompt
+
+    for server in servers:
+        server.reset_stats()
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(n: int) -> None:
+        nonlocal errors
+        i = 0
+        while time.perf_counter() < deadline:
+            correct, near_miss, _ = MOCK_ANSWERS[(n + i) % len(MOCK_ANSWERS)]
+            prompt = answer_validation_prompt(question=f"Mock puzzle {i + 1}", expected_answer=correct,
+                                              player_answer=near_miss)
+            t0 = time.perf_counter()
+            try:
+                ai_client.validate_answer(ANSWER_VALIDATION_SYSTEM, prompt)
+                ok = True
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+            i += 1
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    calls = [server.stats()["calls"] for server in servers]
+    return {
+        **summarize(latencies, errors),
+        "calls_per_s": round(len(latencies) / wall, 2),
+        "share": [round(n / sum(calls), 3) if sum(calls) else 0.0 for n in calls],
+        "upstream_calls": sum(calls),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Balance LLM calls over several mock endpoints.")
+    parser.add_argument("--endpoints", type=int, default=3, help="mock servers to balance over")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent callers")
+    parser.add_argument("--phase-seconds", type=float, default=10, help="length of each phase")
+    parser.add_argument("--slow-latency", type=Latency.parse, default=Latency.parse("fixed:1.5"),
+                        help="latency of the last endpoint in the slow phase (default: %(default)s)")
+    parser.add_argument("--eject-seconds", type=float, default=2,
+                        help="LLM_EJECT_SECONDS for the run (short, so re-ejection shows within a phase)")
+    parser.add_argument("--retry-base-delay", type=float, default=0.5,
+                        help="ai_client.RETRY_BASE_DELAY for the run")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    servers = [MockLLMServer(config_from_args(args)).start() for _ in range(max(1, args.endpoints))]
+    os.environ["API_ENDPOINTS"] = ",".join(f"{s.url};name=mock{n}" for n, s in enumerate(servers))
+    os.environ.setdefault("API_KEY", "mock-key")
+    os.environ["LLM_EJECT_SECONDS"] = str(args.eject_seconds)
+    # The governor isn't what's measured here
+    os.environ["LLM_GOVERNOR"] = "0"
+    os.environ["LLM_LANES"] = "0"
+    os.environ["LLM_SLO"] = "0"
+
+    # Import only after the environment points at the mock servers
+    import ai_client
+    import llm_endpoints
+
+    ai_client.RETRY_BASE_DELAY = args.retry_base_delay
+    last = servers[-1]
+    phases = {}
+    try:
+        phases["healthy"] = run_phase(ai_client, servers, args.clients, args.phase_seconds)
+        normal = last.config.latency
+        last.config.latency = args.slow_latency
+        phases["slow"] = run_phase(ai_client, servers, args.clients, args.phase_seconds)
+        last.config.latency = normal
+        last.config.error_rate = 1.0
+        phases["down"] = run_phase(ai_client, servers, args.clients, args.phase_seconds)
+    finally:
+        for server in servers:
+            server.stop()
+    for name, row in phases.items():
+        print(f"{name:>8}: p95 {row['p95_ms']:.0f} ms, {row['calls_per_s']:.1f} calls/s, "
+              f"{row['errors']} errors, share {row['share']}")
+
+    result = make_result(
+        "bench_endpoints",
+        {"endpoints": len(servers), "clients": args.clients, "phase_seconds": args.phase_seconds,
+         "slow_latency": str(args.slow_latency), "eject_seconds": args.eject_seconds,
+         "retry_base_delay": args.retry_base_delay, "mock": config_from_args(args).to_dict()},
+        **phases,
+        pool=llm_endpoints.get_stats(),
+    )
+    write_result(result, args.output)
+    if args.compare:
+        compare(result, args.compare, sections=tuple(phases))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,492 @@
+"""End-to-end game benchmark against the local mock LLM.
+
+Starts ``MockLLMServer``, points ``API_BASE_URL`` at it, then plays complete
+games through the Flask app in-process: ``/start``, ``/answer`` (correct,
+wrong and near-miss answers that need LLM validation), ``/hint``, ``/skip``,
+``/next-puzzle`` and ``/start-custom``.  Reports per-route p50/p95/p99, the
+mean of each ``Server-Timing`` phase per route, puzzle cache hit rates and
+LLM calls per game as JSON.
+
+    python -m benchmarks.bench_games --games 20 --output bench.json
+    python -m benchmarks.bench_games --games 20 --compare bench.json
+
+``--record PATH`` also writes every LLM reply to an ``llm_cassette``;
+``--replay PATH`` plays the games offline from it, without the mock server
+(``--replay-latency 1`` keeps the recorded provider timing):
+
+    python -m benchmarks.bench_games --games 20 --seed 1 --record games.jsonl.gz
+    python -m benchmarks.bench_games --games 20 --seed 1 --replay games.jsonl.gz
+
+``--party-size N`` plays the standard games in party rooms of N players (one
+host, the rest join by code), so LLM calls per game show the shared
+sequence's amortization:
+
+    python -m benchmarks.bench_games --games 20 --party-size 5 --concurrency 5
+
+``--daily`` builds today's daily challenge for every theme first (untimed,
+into a temporary ``DAILY_DIR``), then plays the standard games as daily
+challenges — which should make no LLM calls at all:
+
+    python -m benchmarks.bench_games --games 20 --daily
+
+``--abusers N`` adds N clients, each from its own IP, that keep starting
+games and asking for hints and near-miss validations for as long as the
+real games last.  Their routes are reported apart (``abuse``), with what
+``llm_quota`` charged them; compare a run with ``LLM_QUOTA=0``:
+
+    LLM_QUOTA=0 python -m benchmarks.bench_games --games 12 --concurrency 6 --abusers 4 --output open.json
+    LLM_QUOTA_SESSION_CALLS=20 LLM_QUOTA_SESSION_TOKENS=20000 \
+        python -m benchmarks.bench_games --games 12 --concurrency 6 --abusers 4 --compare open.json
+
+A run lasts seconds, not a quota window, so scale the limits down with it.
+
+``--spike-latency SPEC`` switches the mock to that latency from
+``--spike-at`` seconds into the run for ``--spike-for`` seconds, to watch
+``llm_slo`` degrade and recover (``slo`` in the results); compare a run with
+``LLM_SLO=0``:
+
+    LLM_SLO=0 python -m benchmarks.bench_games --games 150 --concurrency 6 \
+        --spike-latency fixed:4 --spike-for 10 --output slow.json
+    LLM_SLO_P95_MS=3000 LLM_SLO_PROBE_SECONDS=1 python -m benchmarks.bench_games --games 150 --concurrency 6 \
+        --spike-latency fixed:4 --spike-for 10 --compare slow.json
+"""
+
+import argparse
+import io
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+from typing import Optional
+
+import request_timing
+from benchmarks.mock_llm import (
+    MOCK_VISION_ANSWER,
+    Latency,
+    MockLLMServer,
+    add_mock_arguments,
+    answers_for,
+    config_from_args,
+)
+from benchmarks.report import compare, make_result, summarize, write_result
+
+THEMES = ["theoffice", "friends", "got", "parksandrec", "bigbang", "breakingbad", "supernatural"]
+MAX_STEPS_PER_GAME = 40
+
+
+@dataclass
+class PlayerProfile:
+    """How a simulated player behaves on each puzzle."""
+    hint_rate: float = 0.25       # asks for a hint before answering
+    skip_rate: float = 0.1        # gives up and skips
+    wrong_rate: float = 0.2       # submits a clearly wrong answer first
+    near_miss_rate: float = 0.2   # answers with a typo the LLM has to validate
+    duplicate_rate: float = 0.0   # double-fires a start/answer/hint/skip (double-click, client retry)
+    idempotency_keys: bool = True  # sends Idempotency-Key like game.js does
+
+
+class RouteRecorder:
+    """Collects wall-clock latency and Server-Timing phases per route across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: dict[str, list[float]] = {}
+        self._errors: dict[str, int] = {}
+        self._phases: dict[str, dict[str, float]] = {}
+
+    def call(self, fn, route: str, *args, **kwargs):
+        t0 = time.perf_counter()
+        resp = fn(route, *args, **kwargs)
+        elapsed = time.perf_counter() - t0
+        phases = request_timing.parse_server_timing(resp.headers.get("Server-Timing", ""))
+        with self._lock:
+            self._latencies.setdefault(route, []).append(elapsed)
+            if resp.status_code >= 400:
+                self._errors[route] = self._errors.get(route, 0) + 1
+            totals = self._phases.setdefault(route, {})
+            for name, ms in phases.items():
+                totals[name] = totals.get(name, 0.0) + ms
+        return resp
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                route: summarize(values, self._errors.get(route, 0))
+                for route, values in sorted(self._latencies.items())
+            }
+
+    def phases(self) -> dict:
+        """Mean milliseconds per Server-Timing phase per route, slowest phase first."""
+        with self._lock:
+            return {
+                route: {
+                    name: round(total / len(self._latencies[route]), 2)
+                    for name, total in sorted(totals.items(), key=lambda kv: -kv[1])
+                }
+                for route, totals in sorted(self._phases.items()) if totals
+            }
+
+
+@dataclass
+class PartyGroup:
+    """Players sharing one party room: the host publishes the join code, the others wait for it."""
+    ready: threading.Event = field(default_factory=threading.Event)
+    code: Optional[str] = None
+
+
+def _test_image() -> io.BytesIO:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 30, 30)).save(buf, format="JPEG")
+    buf.seek(0)
+    return buf
+
+
+def _mock_answers(text: str, puzzle_number: int) -> tuple:
+    """(correct, near_miss, wrong) for the puzzle on screen.
+
+    A puzzle served from the bank (degraded mode, quota, AI failure) was
+    generated as some other puzzle number: its question says which.
+    """
+    match = re.search(r"Mock puzzle (\d+)", text or "")
+    return answers_for(int(match[1]) if match else puzzle_number)
+
+
+def play_game(flask_app, rec: RouteRecorder, rng: random.Random, profile: PlayerProfile,
+              custom: bool = False, party: Optional[PartyGroup] = None, host: bool = False,
+              daily: bool = False) -> bool:
+    """Play one game to the result page. Returns True if it reached the end."""
+    client = flask_app.test_client()
+    # Every player on its own address, so only the abusers share an IP quota
+    client.environ_base["REMOTE_ADDR"] = f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+    rec.call(client.get, "/")
+
+    def post(route: str, **kwargs):
+        headers = {"Idempotency-Key": uuid.uuid4().hex} if profile.idempotency_keys else {}
+        if rng.random() >= profile.duplicate_rate:
+            return rec.call(client.post, route, headers=headers, **kwargs)
+        # The same action sent twice at once, with the same cookie and key
+        duplicate = threading.Thread(target=rec.call, args=(client.post, route),
+                                     kwargs={"headers": headers, **kwargs})
+        duplicate.start()
+        resp = rec.call(client.post, route, headers=headers, **kwargs)
+        duplicate.join()
+        return resp
+
+    if custom:
+        resp = rec.call(client.post, "/start-custom",
+                        data={"image": (_test_image(), "photo.jpg")},
+                        content_type="multipart/form-data")
+    elif party is not None and not host:
+        if not party.ready.wait(120) or not party.code:
+            return False
+        resp = post("/party/join", json={"code": party.code, "name": f"p{rng.randint(1, 999)}"})
+    else:
+        route = "/daily/start" if daily else ("/party/create" if party else "/start")
+        resp = post(route, json={
+            "theme": rng.choice(THEMES), "difficulty": rng.randint(1, 5),
+        })
+        if party is not None:
+            # Joiners give up on a None code rather than waiting out the timeout
+            party.code = (resp.get_json() or {}).get("code")
+            party.ready.set()
+    if resp.status_code != 200:
+        return False
+    question = rec.call(client.get, "/room").get_data(as_text=True)
+
+    puzzle_number = 1
+    for _ in range(MAX_STEPS_PER_GAME):
+        correct, near_miss, wrong = (
+            MOCK_VISION_ANSWER if custom and puzzle_number == 1 else _mock_answers(question, puzzle_number)
+        )
+        if rng.random() < profile.hint_rate:
+            data = post("/hint").get_json() or {}
+            if data.get("redirect"):
+                break
+
+        if rng.random() < profile.skip_rate:
+            data = post("/skip").get_json() or {}
+        else:
+            if rng.random() < profile.wrong_rate:
+                post("/answer", json={"answer": wrong})
+            answer = near_miss if rng.random() < profile.near_miss_rate else correct
+            data = post("/answer", json={"answer": answer}).get_json() or {}
+            if not data.get("correct") and not data.get("redirect"):
+                continue  # validation said no (or AI busy) — try again next step
+
+        if data.get("redirect"):
+            rec.call(client.get, "/result")
+            return True
+
+        if data.get("needs_retry") or data.get("error_generating"):
+            for _ in range(3):
+                data = post("/next-puzzle").get_json() or {}
+                if data.get("success"):
+                    break
+            else:
+                return False
+        puzzle_number = data.get("puzzle_number", puzzle_number + 1)
+        question = (data.get("puzzle") or {}).get("question", "")
+    return False
+
+
+def abuse(flask_app, rec: RouteRecorder, n: int, stop: threading.Event, sids: dict) -> None:
+    """Burn LLM capacity from one IP: start games and ask for hints and near-miss checks until *stop*.
+
+    The session it plays under goes in *sids[n]*.
+    """
+    client = flask_app.test_client()
+    client.environ_base["REMOTE_ADDR"] = f"10.66.0.{n + 1}"
+    rng = random.Random(n)
+    while not stop.is_set():
+        resp = rec.call(client.post, "/start", json={"theme": rng.choice(THEMES), "difficulty": 3})
+        if resp.status_code != 200:
+            continue
+        with client.session_transaction() as sess:
+            sids[n] = sess.get("_cache_id")
+        for puzzle_number in range(1, 4):
+            _, near_miss, _ = answers_for(puzzle_number)
+            for _ in range(4):
+                rec.call(client.post, "/hint")
+                rec.call(client.post, "/answer", json={"answer": near_miss})
+            if stop.is_set():
+                return
+
+
+def spike(server: MockLLMServer, latency: Latency, at: float, duration: float, stop: threading.Event) -> None:
+    """Slow the mock provider down to *latency* from *at* seconds for *duration* seconds."""
+    if stop.wait(at):
+        return
+    normal = server.config.latency
+    server.config.latency = latency
+    print(f"🐢 Mock latency {latency} for {duration:.0f}s")
+    stop.wait(duration)
+    server.config.latency = normal
+
+
+def _wait_for_background(puzzle_cache, timeout: float = 60) -> None:
+    """Let precaching threads (and party prefetchers) finish so their LLM calls are counted."""
+    deadline = time.time() + timeout
+    while time.time() < deadline and (
+        puzzle_cache.get_stats()["generating"]
+        or any(t.name.startswith("party-prefetch") for t in threading.enumerate())
+    ):
+        time.sleep(0.1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Play complete games against a mock LLM and report latencies.")
+    parser.add_argument("--games", type=int, default=10, help="standard games to play")
+    parser.add_argument("--custom-games", type=int, default=2, help="image-upload games to play")
+    parser.add_argument("--concurrency", type=int, default=1, help="games played in parallel")
+    parser.add_argument("--party-size", type=int, default=1,
+                        help="play standard games in party rooms of this many players (1: solo)")
+    parser.add_argument("--hint-rate", type=float, default=PlayerProfile.hint_rate)
+    parser.add_argument("--skip-rate", type=float, default=PlayerProfile.skip_rate)
+    parser.add_argument("--wrong-rate", type=float, default=PlayerProfile.wrong_rate)
+    parser.add_argument("--near-miss-rate", type=float, default=PlayerProfile.near_miss_rate)
+    parser.add_argument("--duplicate-rate", type=float, default=PlayerProfile.duplicate_rate,
+                        help="fraction of actions sent twice concurrently (double-click / client retry)")
+    parser.add_argument("--no-idempotency-keys", action="store_true",
+                        help="don't send Idempotency-Key headers (the pre-key baseline)")
+    parser.add_argument("--retry-base-delay", type=float, default=None,
+                        help="override ai_client.RETRY_BASE_DELAY (seconds) to shorten fault-injection runs")
+    parser.add_argument("--daily", action="store_true",
+                        help="build today's daily challenges, then play the standard games as daily challenges")
+    parser.add_argument("--abusers", type=int, default=0,
+                        help="clients that burn LLM capacity while the games play (see llm_quota)")
+    parser.add_argument("--spike-latency", type=Latency.parse, default=None,
+                        help="switch the mock to this latency mid-run (see llm_slo)")
+    parser.add_argument("--spike-at", type=float, default=5, help="seconds into the run the spike starts")
+    parser.add_argument("--spike-for", type=float, default=20, help="seconds the spike lasts")
+    parser.add_argument("--record", metavar="CASSETTE", help="record every LLM reply to this cassette")
+    parser.add_argument("--replay", metavar="CASSETTE", help="serve LLM replies from this cassette (no mock server)")
+    parser.add_argument("--replay-latency", type=float, default=0.0,
+                        help="replay recorded provider latency scaled by this factor (default: full speed)")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    if args.spike_latency and args.replay:
+        parser.error("--spike-latency needs the mock server, not --replay")
+    if args.daily and args.party_size > 1:
+        parser.error("--daily and --party-size are mutually exclusive")
+    if args.daily:
+        os.environ["DAILY_DIR"] = tempfile.mkdtemp(prefix="bench-daily-")
+    # Simulated games shouldn't land on the real leaderboards or event log
+    os.environ.setdefault("LEADERBOARD_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-leaderboard-"),
+                                                              "leaderboard.sqlite3"))
+    os.environ.setdefault("EVENT_LOG_DIR", tempfile.mkdtemp(prefix="bench-events-"))
+    os.environ.setdefault("LLM_QUOTA_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-quota-"),
+                                                            "llm_quota.sqlite3"))
+
+    mock_config = config_from_args(args)
+    server = None
+    if not args.replay:
+        server = MockLLMServer(mock_config).start()
+        os.environ["API_BASE_URL"] = server.url
+        os.environ.setdefault("API_KEY", "mock-key")
+
+    # Import only after the environment points at the mock server
+    import ai_client
+    import event_log
+    import idempotency
+    import llm_cassette
+    import llm_governor
+    import llm_quota
+    import llm_slo
+    import party
+    import puzzle_cache
+    from app import app as flask_app, limiter
+
+    if args.record:
+        llm_cassette.configure("record", args.record)
+    elif args.replay:
+        llm_cassette.configure("replay", args.replay, args.replay_latency)
+
+    if args.daily:
+        import daily
+        from app import engine
+        from prompts import ANSWER_ALIASES_SYSTEM, answer_aliases_prompt
+
+        def ask_aliases(question: str, answer: str) -> list:
+            return ai_client.generate_json(ANSWER_ALIASES_SYSTEM, answer_aliases_prompt(question, answer),
+                                           task="aliases")["aliases"]
+
+        for theme in THEMES:
+            daily.write(daily.build_challenge(engine, theme, daily.today(), 3, ask_aliases))
+
+    flask_app.config["WTF_CSRF_ENABLED"] = False
+    limiter.enabled = False
+    if args.retry_base_delay is not None:
+        ai_client.RETRY_BASE_DELAY = args.retry_base_delay
+
+    profile = PlayerProfile(args.hint_rate, args.skip_rate, args.wrong_rate, args.near_miss_rate,
+                            args.duplicate_rate, not args.no_idempotency_keys)
+    rec = RouteRecorder()
+    seed_rng = random.Random(args.seed)
+    if args.seed is not None:
+        # The engine draws the easter-egg puzzle from the global RNG; seed it
+        # so a replayed run asks the same questions as the recorded one
+        random.seed(args.seed)
+    # (custom, party, host) per game; a party's host is queued before its members
+    size = max(1, args.party_size)
+    parties = [PartyGroup() for _ in range(0, args.games, size)] if size > 1 else []
+    jobs = [(False, parties[i // size] if parties else None, i % size == 0) for i in range(args.games)]
+    jobs += [(True, None, False)] * args.custom_games
+    seeds = [seed_rng.random() for _ in jobs]
+
+    puzzle_cache.reset_stats()
+    party.reset_stats()
+    if server:
+        server.reset_stats()
+    abuse_rec = RouteRecorder()
+    finished = threading.Event()
+    abuser_sids: dict[int, str] = {}
+    abusers = [threading.Thread(target=abuse, args=(flask_app, abuse_rec, n, finished, abuser_sids))
+               for n in range(args.abusers)]
+    for thread in abusers:
+        thread.start()
+    if args.spike_latency:
+        threading.Thread(target=spike, args=(server, args.spike_latency, args.spike_at, args.spike_for, finished),
+                         daemon=True).start()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        completed = sum(pool.map(
+            lambda job: play_game(flask_app, rec, random.Random(job[1]), profile,
+                                  custom=job[0][0], party=job[0][1], host=job[0][2],
+                                  daily=args.daily and not job[0][0]),
+            zip(jobs, seeds),
+        ))
+    wall = time.perf_counter() - t0
+    finished.set()
+    for thread in abusers:
+        thread.join()
+    _wait_for_background(puzzle_cache)
+    if server:
+        server.stop()
+    llm_cassette.close()
+    event_log.flush()
+    events = event_log.summarize(event_log.read(event_log.DIR, since=time.time() - wall - 1))
+
+    cache = puzzle_cache.get_stats()
+    lookups = cache["hits"] + cache["waits"] + cache["pooled"] + cache["misses"]
+    cassette = llm_cassette.get_stats()
+    played = len(jobs)
+    if server:
+        llm = server.stats()
+        llm_section = {
+            "calls": llm["calls"],
+            "calls_per_game": round(llm["calls"] / played, 2) if played else 0.0,
+            "by_kind": llm["by_kind"],
+            "injected_errors": llm["errors"],
+            "injected_rate_limits": llm["rate_limited"],
+            "injected_malformed": llm["malformed"],
+            "tokens_per_game": round((llm["prompt_tokens"] + llm["completion_tokens"]) / played, 1) if played else 0.0,
+        }
+    else:
+        llm_section = {
+            "calls": cassette["replayed"],
+            "calls_per_game": round(cassette["replayed"] / played, 2) if played else 0.0,
+            "replayed_loose": cassette["loose"],
+            "replay_misses": cassette["misses"],
+        }
+    result = make_result(
+        "bench_games",
+        {
+            "games": args.games,
+            "custom_games": args.custom_games,
+            "concurrency": args.concurrency,
+            "party_size": size,
+            "daily": args.daily,
+            "profile": asdict(profile),
+            "mock": mock_config.to_dict() if server else None,
+            "retry_base_delay": ai_client.RETRY_BASE_DELAY,
+            "cassette": {k: cassette[k] for k in ("mode", "path")} if cassette["mode"] != "off" else None,
+        },
+        routes=rec.summary(),
+        phases=rec.phases(),
+        cache={
+            "hits": cache["hits"],
+            "waits": cache["waits"],
+            "pooled": cache["pooled"],
+            "misses": cache["misses"],
+            "recycled": cache["recycled"],
+            "reused": cache["reused"],
+            "hit_rate": round((cache["hits"] + cache["pooled"]) / lookups, 4) if lookups else 0.0,
+            "hit_or_wait_rate": round((cache["hits"] + cache["pooled"] + cache["waits"]) / lookups, 4) if lookups else 0.0,
+        },
+        llm=llm_section,
+        games={"played": played, "completed": completed, "wall_seconds": round(wall, 2)},
+        party={"size": size, **party.get_stats()} if parties else None,
+        events={
+            "counts": events["events"],
+            "cache_hit_rate": events["puzzles"]["cache_hit_rate"],
+            "answers_validated_by_llm": events["answers_validated_by_llm"],
+            "dropped": event_log.get_stats()["writer"]["dropped"],
+        },
+        abuse={
+            "abusers": args.abusers,
+            "routes": abuse_rec.summary(),
+            "charged": {ident: {"tokens": round(tokens), "calls": round(calls, 1)} for ident, (tokens, calls)
+                        in llm_quota.usage(f"s:{sid}" for sid in abuser_sids.values() if sid).items()},
+        } if args.abusers else None,
+        quota=llm_quota.get_stats(),
+        slo=llm_slo.get_stats(),
+        idempotency=idempotency.get_stats(),
+        governor=llm_governor.get_stats(),
+    )
+    write_result(result, args.output)
+    if args.compare:
+        compare(result, args.compare, sections=("routes", "phases", "cache", "llm", "games"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Benchmark LLM reply parsing on a corpus of raw model responses.
+
+Compares the old extractor (``json.loads``, then a fenced-block regex, then
+the outermost ``{...}`` slice) with ``llm_output``'s single-pass tolerant
+parser plus schema repair, reporting per corpus entry whether the reply was
+usable as-is, usable after local repair, would need a re-ask for missing
+fields, or was lost — and how long parsing takes.
+
+The corpus is JSONL with ``task`` (a key of ``llm_output.SCHEMAS``),
+``raw`` (the reply text exactly as the model returned it) and an optional
+``note``; add captured replies to it as new failure modes show up:
+
+    python -m benchmarks.bench_json
+    python -m benchmarks.bench_json --corpus my_replies.jsonl --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+
+import llm_output
+from benchmarks.report import compare, make_result, write_result
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "corpus", "llm_replies.jsonl")
+
+
+def legacy_extract(text: str) -> dict:
+    """The extractor ``ai_client`` used before ``llm_output`` (kept for comparison)."""
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    match = re.search(r"```(?:json)?\s*\n?(.*?)\n?\s*```", text, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(1).strip())
+        except json.JSONDecodeError:
+            pass
+    start = text.find("{")
+    end = text.rfind("}")
+    if start != -1 and end != -1 and end > start:
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            pass
+    raise ValueError("Could not extract JSON")
+
+
+def legacy_outcome(task: str, raw: str) -> str:
+    """'ok' if the old path produced every required field with a usable value, else 'lost'."""
+    try:
+        data = legacy_extract(raw)
+    except ValueError:
+        return "lost"
+    _, missing = llm_output.conform(task, data)
+    return "lost" if missing else "ok"
+
+
+def new_outcome(task: str, raw: str) -> tuple[str, list[str], list[str]]:
+    """('ok' | 'repaired' | 'reask' | 'lost', repairs, missing fields)."""
+    try:
+        data, repairs = llm_output.parse_json(raw)
+    except ValueError:
+        return "lost", ["no json"], [n for n, f in llm_output.SCHEMAS[task].items() if f.required]
+    _, missing = llm_output.conform(task, data)
+    if missing:
+        return "reask", repairs, missing
+    return ("repaired" if repairs else "ok"), repairs, missing
+
+
+def _strict_json(raw: str) -> bool:
+    """Whether the whole reply is valid JSON (the common, fast case)."""
+    try:
+        json.loads(raw)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def time_per_call(fn, corpus: list[dict], iterations: int) -> float:
+    """Mean microseconds per reply for *fn(task, raw)* over *corpus*."""
+    if not corpus:
+        return 0.0
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        for row in corpus:
+            try:
+                fn(row["task"], row["raw"])
+            except ValueError:
+                pass
+    return (time.perf_counter() - t0) / (iterations * len(corpus)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare LLM reply extractors on a corpus of raw replies.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSONL corpus (default: %(default)s)")
+    parser.add_argument("--iterations", type=int, default=200, help="timing passes over the corpus")
+    parser.add_argument("--verbose", action="store_true", help="print every entry's outcome")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    legacy, new = Counter(), Counter()
+    repairs, reasked = Counter(), Counter()
+    for row in corpus:
+        before = legacy_outcome(row["task"], row["raw"])
+        after, fixes, missing = new_outcome(row["task"], row["raw"])
+        legacy[before] += 1
+        new[after] += 1
+        repairs.update(fixes)
+        reasked.update(missing)
+        if args.verbose:
+            print(f"{row['task']:<10} {before:<5} → {after:<8} {row.get('note', '')}"
+                  f"{'  [' + ', '.join(fixes + missing) + ']' if fixes or missing else ''}")
+
+    total = len(corpus)
+    clean = [row for row in corpus if _strict_json(row["raw"])]
+    legacy_fn = lambda task, raw: legacy_extract(raw)  # noqa: E731
+    result = make_result(
+        "bench_json",
+        {"corpus": os.path.relpath(args.corpus), "entries": total, "iterations": args.iterations},
+        legacy={
+            "usable": legacy["ok"],
+            "lost": legacy["lost"],
+            "usable_rate": round(legacy["ok"] / total, 4),
+            "us_per_reply": round(time_per_call(legacy_fn, corpus, args.iterations), 2),
+            "us_per_clean_reply": round(time_per_call(legacy_fn, clean, args.iterations), 2),
+        },
+        tolerant={
+            "usable": new["ok"] + new["repaired"],
+            "repaired": new["repaired"],
+            "reask": new["reask"],
+            "lost": new["lost"],
+            "usable_rate": round((new["ok"] + new["repaired"]) / total, 4),
+            "usable_after_reask_rate": round((total - new["lost"]) / total, 4),
+            "us_per_reply": round(time_per_call(llm_output.read_reply, corpus, args.iterations), 2),
+            "us_per_clean_reply": round(time_per_call(llm_output.read_reply, clean, args.iterations), 2),
+        },
+        repairs=dict(repairs.most_common()),
+        reasked_fields=dict(reasked.most_common()),
+    )
+    write_result(result, args.output)
+    if args.compare:
+        compare(result, args.compare, sections=("legacy", "tolerant"))
+
+
+if __name__ == "__main__":
+    main()
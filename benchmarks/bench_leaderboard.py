@@ -0,0 +1,161 @@
+"""Benchmark leaderboard writes and reads against a large table of games.
+
+Fills a throwaway database with synthetic finished games through the same
+batched write path the app uses (``leaderboard._write``), then measures:
+
+- insert throughput in batches vs one transaction per game;
+- top-10 and rank latency from the per-process views (``leaderboard.top`` /
+  ``leaderboard.rank``) vs the equivalent SQL run for every request
+  (``ORDER BY score DESC LIMIT`` on the board's index, and
+  ``COUNT(*) WHERE score > ?``);
+- the cost of building a board view cold, and of folding newly written
+  games into warm views.
+
+    python -m benchmarks.bench_leaderboard
+    python -m benchmarks.bench_leaderboard --games 1000000 --output after.json --compare before.json
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import leaderboard
+from benchmarks.report import compare, make_result, summarize, write_result
+from prompts import THEME_DESCRIPTIONS
+
+THEMES = [theme for theme in THEME_DESCRIPTIONS if theme != "custom"]
+
+
+def fake_games(rng: random.Random, n: int, days: list[str]) -> list[dict]:
+    games = []
+    for _ in range(n):
+        victory = rng.random() < 0.4
+        solved = 5 if victory else rng.randint(0, 4)
+        score = max(0, int(rng.gauss(1200 * solved + (2500 if victory else 0), 600)))
+        games.append({
+            "player": f"{rng.getrandbits(64):016x}",
+            "name": f"Player {rng.randint(0, 9999):04d}",
+            "theme": rng.choice(THEMES),
+            "day": rng.choice(days),
+            "score": score,
+            "solved": solved,
+            "total_time": round(rng.uniform(120, 1800), 2),
+            "victory": int(victory),
+            "recorded_at": time.time(),
+        })
+    return games
+
+
+def timed_ops(fn, args_list: list) -> list[float]:
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def sql_top(key: str, limit: int) -> list:
+    where, params = leaderboard._board_filter(key)
+    return leaderboard._connect().execute(
+        f"SELECT {leaderboard._COLUMNS} FROM games WHERE {where} "
+        "ORDER BY score DESC, total_time, id LIMIT ?", params + [limit],
+    ).fetchall()
+
+
+def sql_rank(key: str, score: int) -> dict:
+    where, params = leaderboard._board_filter(key)
+    conn = leaderboard._connect()
+    higher = conn.execute(f"SELECT COUNT(*) FROM games WHERE {where} AND score > ?", params + [score]).fetchone()[0]
+    total = conn.execute(f"SELECT COUNT(*) FROM games WHERE {where}", params).fetchone()[0]
+    return {"rank": higher + 1, "total": total}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark leaderboard inserts, top-K and rank queries.")
+    parser.add_argument("--games", type=int, default=200_000, help="games in the table before reads are timed")
+    parser.add_argument("--batch", type=int, default=1000, help="games per write transaction")
+    parser.add_argument("--days", type=int, default=7, help="distinct days the games are spread over")
+    parser.add_argument("--queries", type=int, default=2000, help="timed reads per kind")
+    parser.add_argument("--fold", type=int, default=1000, help="new games folded into warm views")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tmp = tempfile.mkdtemp(prefix="bench-leaderboard-")
+    leaderboard.DB_PATH = os.path.join(tmp, "leaderboard.sqlite3")
+    days = [time.strftime("%Y-%m-%d", time.gmtime(time.time() - 86400 * d)) for d in range(args.days)]
+    try:
+        # Writes: batched transactions vs one per game
+        games = fake_games(rng, args.games, days)
+        t0 = time.perf_counter()
+        for i in range(0, len(games), args.batch):
+            leaderboard._write(games[i:i + args.batch])
+        batched_s = time.perf_counter() - t0
+        singles = fake_games(rng, min(2000, args.games), days)
+        t0 = time.perf_counter()
+        for game in singles:
+            leaderboard._write([game])
+        single_s = time.perf_counter() - t0
+        print(f"📝 {args.games} games written in {batched_s:.1f}s")
+
+        keys = ["all"] + [leaderboard.board_key(t) for t in THEMES] + \
+               [leaderboard.board_key(day=d) for d in days] + \
+               [leaderboard.board_key(t, d) for t in THEMES for d in days]
+        top_args = [(rng.choice(keys), 10) for _ in range(args.queries)]
+        rank_args = [(rng.choice(keys), rng.randint(0, 9000)) for _ in range(args.queries)]
+
+        # Cold view builds, then warm reads (refreshes suppressed: nothing new is written)
+        leaderboard.CACHE_SECONDS = 3600
+        cold = timed_ops(leaderboard.top, [(key, 10) for key in keys])
+        view_top = timed_ops(leaderboard.top, top_args)
+        view_rank = timed_ops(leaderboard.rank, rank_args)
+        raw_top = timed_ops(sql_top, top_args)
+        raw_rank = timed_ops(sql_rank, rank_args[:max(1, args.queries // 10)])
+
+        # Agreement check: the views must match what SQL says
+        mismatches = sum(
+            leaderboard.rank(key, score) != sql_rank(key, score) for key, score in rank_args[:200]
+        ) + sum(
+            [e["id"] for e in leaderboard.top(key, 10)] != [r["id"] for r in sql_top(key, 10)]
+            for key, _ in top_args[:200]
+        )
+
+        # Fold new games into every warm view on the next read
+        leaderboard._write(fake_games(rng, args.fold, days))
+        t0 = time.perf_counter()
+        leaderboard.top("all", 10)
+        fold_s = time.perf_counter() - t0
+        mismatches += leaderboard.rank("all", 5000) != sql_rank("all", 5000)
+
+        result = make_result(
+            "bench_leaderboard",
+            {"games": args.games, "batch": args.batch, "days": args.days, "boards": len(keys),
+             "queries": args.queries, "seed": args.seed},
+            writes={
+                "batched_games_per_s": round(args.games / batched_s),
+                "single_games_per_s": round(len(singles) / single_s),
+            },
+            view={"cold_load": summarize(cold), "top10": summarize(view_top), "rank": summarize(view_rank),
+                  "fold_ms": round(fold_s * 1000, 2), "fold_games": args.fold},
+            sql={"top10": summarize(raw_top), "rank": summarize(raw_rank)},
+            mismatches=mismatches,
+            stats=leaderboard.get_stats(),
+        )
+        write_result(result, args.output)
+        if args.compare:
+            compare(result, args.compare, sections=("writes", "view", "sql"))
+        if mismatches:
+            print(f"❌ {mismatches} view/SQL mismatches")
+            raise SystemExit(1)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Benchmark lobby and static-asset cost per page view.
+
+Drives the Flask app in-process with its test client and compares:
+
+- ``legacy``: the lobby rendered from ``lobby.html`` on every hit (as the
+  route used to do) and ``/static/`` assets served uncompressed with
+  revalidation on every view;
+- ``current``: the rendered-once lobby with ETag/304 and the fingerprinted,
+  precompressed assets from ``build_assets.py`` (run it first — without a
+  manifest the current page still links plain ``/static/`` files).
+
+For each it reports CPU time per lobby request and the bytes a browser
+downloads for a first visit and for a repeat visit (warm HTTP cache).
+
+    python -m benchmarks.bench_pages --requests 2000 --output pages.json
+"""
+
+import argparse
+import re
+import time
+
+from flask import render_template, session, url_for
+
+import app as app_module
+import assets
+from benchmarks.report import compare, make_result, write_result
+from prompts import THEME_DESCRIPTIONS
+
+ASSET_LINK = re.compile(r'(?:href|src)="(/(?:static|assets)/[^"]+\.(?:css|js))"')
+ACCEPT = {"Accept-Encoding": "gzip, br"}
+
+
+def legacy_lobby():
+    """The lobby route before it was rendered once."""
+    session.pop("game_state", None)
+    return render_template("lobby.html", themes=THEME_DESCRIPTIONS)
+
+
+def _asset_links(client, route: str) -> list[str]:
+    resp = client.get(route)
+    html = resp.get_data(as_text=True)
+    return ASSET_LINK.findall(html)
+
+
+def visit_bytes(client, route: str, links: list[str], immutable: bool) -> dict:
+    """Body bytes for a first visit and a repeat visit with a warm browser cache."""
+    first = client.get(route, headers=ACCEPT)
+    total_first = len(first.data)
+    validators = []
+    for link in links:
+        resp = client.get(link, headers=ACCEPT)
+        total_first += len(resp.data)
+        validators.append((link, resp.headers.get("ETag")))
+
+    # Repeat view: the page is revalidated; immutable assets are not requested at all
+    etag = first.headers.get("ETag")
+    repeat = client.get(route, headers={**ACCEPT, **({"If-None-Match": etag} if etag else {})})
+    total_repeat = len(repeat.data)
+    if not immutable:
+        for link, asset_etag in validators:
+            resp = client.get(link, headers={**ACCEPT, **({"If-None-Match": asset_etag} if asset_etag else {})})
+            total_repeat += len(resp.data)
+    return {
+        "first_visit_bytes": total_first,
+        "repeat_visit_bytes": total_repeat,
+        "repeat_visit_requests": 1 + (0 if immutable else len(links)),
+        "page_status_on_repeat": repeat.status_code,
+    }
+
+
+def cpu_per_request(client, route: str, requests: int, headers: dict) -> float:
+    """Mean process CPU microseconds per request."""
+    client.get(route, headers=headers)
+    t0 = time.process_time()
+    for _ in range(requests):
+        client.get(route, headers=headers)
+    return (time.process_time() - t0) / requests * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare per-view cost of the lobby and static assets.")
+    parser.add_argument("--requests", type=int, default=2000, help="lobby requests timed per variant")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    args = parser.parse_args()
+
+    flask_app = app_module.app
+    app_module.limiter.enabled = False
+    flask_app.add_url_rule("/__legacy_lobby", "legacy_lobby", legacy_lobby)
+
+    built = bool(assets.manifest()["assets"])
+    if not built:
+        print("ℹ️  No asset manifest — run `python build_assets.py` to measure fingerprinted assets")
+
+    client = flask_app.test_client()
+    # The legacy page links plain /static/ URLs
+    with flask_app.test_request_context():
+        legacy_links = [url_for("static", filename=name) for name in ("css/game.css", "js/game.js")]
+    current_links = _asset_links(client, "/")
+
+    legacy = {
+        "cpu_us_per_lobby": round(cpu_per_request(client, "/__legacy_lobby", args.requests, ACCEPT), 1),
+        **visit_bytes(client, "/__legacy_lobby", legacy_links, immutable=False),
+    }
+    current = {
+        "cpu_us_per_lobby": round(cpu_per_request(client, "/", args.requests, ACCEPT), 1),
+        "cpu_us_per_lobby_304": 0.0,
+        **visit_bytes(client, "/", current_links, immutable=built),
+    }
+    etag = client.get("/", headers=ACCEPT).headers["ETag"]
+    current["cpu_us_per_lobby_304"] = round(
+        cpu_per_request(client, "/", args.requests, {**ACCEPT, "If-None-Match": etag}), 1)
+
+    for name, section in (("legacy", legacy), ("current", current)):
+        print(f"{name:<8} lobby {section['cpu_us_per_lobby']:>8.1f}µs CPU  first visit "
+              f"{section['first_visit_bytes']:>7,} B  repeat visit {section['repeat_visit_bytes']:>7,} B")
+
+    result = make_result("bench_pages", {"requests": args.requests, "assets_built": built},
+                         legacy=legacy, current=current)
+    write_result(result, args.output)
+    if args.compare:
+        compare(result, args.compare, sections=("legacy", "current"))
+
+
+if __name__ == "__main__":
+    main()
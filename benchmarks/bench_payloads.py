@@ -0,0 +1,92 @@
+"""Benchmark puzzle-transition payloads: full state vs. the delta protocol.
+
+Builds game states at every puzzle of a run, with narrative entries the size
+the model writes, and compares what ``/answer``, ``/skip`` and ``/next-puzzle``
+return:
+
+- ``legacy``: the full ``narrative_log`` plus every puzzle field (answer and
+  all hints included);
+- ``delta``: ``app._puzzle_payload`` for a client that already has every
+  entry but the newest — only the new narrative entries and the public
+  puzzle fields.
+
+Reports bytes per response and JSON serialization time.
+
+    python -m benchmarks.bench_payloads --narrative-chars 400 --output payloads.json
+"""
+
+import argparse
+import random
+import time
+
+import app as app_module
+from benchmarks.report import compare, make_result, write_result
+from game_engine import TOTAL_PUZZLES, GameState, PuzzleState
+
+
+def make_state(puzzle_idx: int, narrative_chars: int, rng: random.Random) -> GameState:
+    """A game on puzzle *puzzle_idx* with an intro plus one narrative entry per puzzle so far."""
+    def text(n: int) -> str:
+        return " ".join("lorem" for _ in range(n // 6))
+
+    puzzles = [PuzzleState(
+        question=text(rng.randint(120, 260)) + "?", puzzle_type="riddle", answer="the answer",
+        hints=[text(80), text(90), text(100)], narrative_text=text(narrative_chars),
+        difficulty=2, started_at=time.time(),
+    ).to_dict() for _ in range(puzzle_idx + 1)]
+    return GameState(theme="temple", status="playing", start_time=time.time(), puzzles=puzzles,
+                     narrative_log=[text(narrative_chars) for _ in range(puzzle_idx + 2)])
+
+
+def legacy_payload(state: GameState) -> dict:
+    puzzle = state.current_puzzle
+    return {
+        "puzzle": puzzle.to_dict() if puzzle else None,
+        "puzzle_number": state.current_puzzle_index + 1,
+        "remaining_seconds": state.remaining_seconds,
+        "narrative_log": state.narrative_log,
+    }
+
+
+def measure(payload: dict, iterations: int) -> tuple[int, float]:
+    """(bytes, microseconds per serialization) with Flask's JSON provider."""
+    dumps = app_module.app.json.dumps
+    body = dumps(payload)
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        dumps(payload)
+    return len(body.encode("utf-8")), (time.perf_counter() - t0) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare full-state and delta puzzle-transition payloads.")
+    parser.add_argument("--narrative-chars", type=int, default=400, help="characters per narrative entry")
+    parser.add_argument("--iterations", type=int, default=5000, help="serializations timed per payload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = {"legacy": [], "delta": []}
+    for idx in range(1, TOTAL_PUZZLES):
+        state = make_state(idx, args.narrative_chars, rng)
+        since = len(state.narrative_log) - 1
+        with app_module.app.test_request_context(json={"narrative_since": since}):
+            delta = app_module._puzzle_payload(state)
+        for name, payload in (("legacy", legacy_payload(state)), ("delta", delta)):
+            size, us = measure(payload, args.iterations)
+            rows[name].append({"puzzle": idx + 1, "bytes": size, "serialize_us": round(us, 2)})
+        print(f"puzzle {idx + 1}: legacy {rows['legacy'][-1]['bytes']:>6,} B "
+              f"{rows['legacy'][-1]['serialize_us']:>6.1f}µs   delta {rows['delta'][-1]['bytes']:>6,} B "
+              f"{rows['delta'][-1]['serialize_us']:>6.1f}µs")
+
+    result = make_result("bench_payloads", {"narrative_chars": args.narrative_chars,
+                                            "iterations": args.iterations}, **rows)
+    write_result(result, args.output)
+    if args.compare:
+        compare(result, args.compare, sections=("legacy", "delta"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Benchmark cold start: import time of the app and time to first request.
+
+Two measurements, each in fresh processes so nothing is warm:
+
+- **import**: ``import app`` in a new interpreter, repeated ``--runs`` times,
+  plus the slowest modules from ``python -X importtime`` and whether the
+  heavy optional stacks (``openai``, ``httpx``, ``PIL``) were loaded;
+- **first request**: gunicorn started with ``gunicorn.conf.py``, with and
+  without ``preload_app``, timed from spawn until every worker has answered
+  a lobby request.
+
+    python -m benchmarks.bench_startup --runs 5 --workers 4 --output startup.json
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from benchmarks.load_test import REPO_ROOT, _free_port
+from benchmarks.report import compare, make_result, summarize, write_result
+
+HEAVY_MODULES = ("openai", "httpx", "PIL", "flask_limiter")
+
+_IMPORT_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import app
+print(time.perf_counter() - t0)
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def _env(**extra) -> dict:
+    return {
+        **os.environ,
+        "API_KEY": os.environ.get("API_KEY", "mock-key"),
+        "FLASK_SECRET_KEY": "bench-startup-secret",
+        "RATELIMIT_ENABLED": "0",
+        **extra,
+    }
+
+
+def measure_import(runs: int) -> dict:
+    """Seconds to ``import app`` in *runs* fresh interpreters."""
+    seconds, loaded = [], ""
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE.format(heavy=HEAVY_MODULES)],
+                             cwd=REPO_ROOT, env=_env(), capture_output=True, text=True, check=True)
+        lines = out.stdout.strip().splitlines()
+        seconds.append(float(lines[-2]))
+        loaded = lines[-1] if len(lines) > 1 else ""
+    return {**summarize(seconds), "heavy_modules_loaded": [m for m in loaded.split(",") if m]}
+
+
+def top_imports(limit: int) -> list[dict]:
+    """The *limit* modules with the largest cumulative import time (``-X importtime``)."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"],
+                         cwd=REPO_ROOT, env=_env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match and len(match.group(3)) <= 3:  # direct imports of app and their children
+            rows.append({"module": match.group(4), "cumulative_ms": round(int(match.group(2)) / 1000, 1)})
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def _collect_first_requests(stream, pids: set) -> None:
+    """Record worker pids as they log their first request (runs on a reader thread)."""
+    for line in stream:
+        match = re.search(r"First request served .*\(pid (\d+)\)", line)
+        if match:
+            pids.add(match.group(1))
+
+
+def first_request(preload: bool, workers: int, timeout: float = 60) -> dict:
+    """Seconds from spawning gunicorn to its first response, and until every worker has served one."""
+    port = _free_port()
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+           "-w", str(workers), "-b", f"127.0.0.1:{port}", "app:app"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=_env(GUNICORN_PRELOAD="1" if preload else "0"),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    served: set[str] = set()
+    threading.Thread(target=_collect_first_requests, args=(proc.stderr, served), daemon=True).start()
+    url = f"http://127.0.0.1:{port}/"
+    first = all_ready = None
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with code {proc.returncode}")
+            try:
+                # A new connection per request so they spread over the workers
+                requests.get(url, timeout=2, headers={"Connection": "close"}).raise_for_status()
+            except requests.RequestException:
+                time.sleep(0.02)
+                continue
+            if first is None:
+                first = time.perf_counter() - t0
+            if len(served) >= workers:
+                all_ready = time.perf_counter() - t0
+                break
+        if first is None:
+            raise RuntimeError(f"gunicorn did not answer within {timeout}s")
+        return {"first_response_s": first, "all_workers_s": all_ready}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure app import time and gunicorn time to first request.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters / gunicorn starts per measurement")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    args = parser.parse_args()
+
+    imports = measure_import(args.runs)
+    print(f"import app: p50 {imports['p50_ms']:.0f}ms  heavy modules loaded: "
+          f"{', '.join(imports['heavy_modules_loaded']) or 'none'}")
+    startup = {}
+    for preload in (False, True):
+        runs = [first_request(preload, args.workers) for _ in range(args.runs)]
+        name = "preload" if preload else "no_preload"
+        startup[name] = {
+            "first_response": summarize([r["first_response_s"] for r in runs]),
+            "all_workers": summarize([r["all_workers_s"] for r in runs if r["all_workers_s"]]),
+        }
+        print(f"{name:<10} first response p50 {startup[name]['first_response']['p50_ms']:.0f}ms  "
+              f"all {args.workers} workers p50 {startup[name]['all_workers']['p50_ms']:.0f}ms")
+
+    result = make_result(
+        "bench_startup",
+        {"runs": args.runs, "workers": args.workers},
+        imports=imports,
+        top_imports=top_imports(args.top),
+        **startup,
+    )
+    write_result(result, args.output)
+    if args.compare:
+        compare(result, args.compare, sections=("imports", "no_preload", "preload"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Benchmark micro-batched answer validation against one call per answer.
+
+Starts the mock LLM, then has N simulated players submit ambiguous answers
+(near misses the local matcher can't decide) concurrently, with a random
+think time between answers.  Each player count is run twice through
+``validation_batcher.validate``: with batching off (one chat completion per
+answer, the old path) and on.  Reports answer latency p50/p95/p99,
+throughput, LLM calls and prompt tokens per answer, and the mean batch size.
+
+The mock's batched replies take longer in proportion to the number of
+answers (``mock_llm.BATCH_ITEM_COST``), and calls go through the governor at
+``--llm-rps`` like in production, so batching has to win on queueing rather
+than on a free lunch:
+
+    python -m benchmarks.bench_validation
+    python -m benchmarks.bench_validation --players 1,16,64 --llm-rps 10 --output after.json
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.mock_llm import MOCK_ANSWERS, MockLLMServer, add_mock_arguments, config_from_args
+from benchmarks.report import compare, make_result, summarize, write_result
+
+
+def run(validation_batcher, server: MockLLMServer, players: int, answers: int, think: float,
+        batched: bool, seed: int) -> dict:
+    validation_batcher.ENABLED = batched
+    validation_batcher.reset_stats()
+    server.reset_stats()
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def player(n: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed * 1000 + n)
+        for i in range(answers):
+            time.sleep(rng.expovariate(1 / think) if think > 0 else 0)
+            correct, near_miss, _ = MOCK_ANSWERS[(n + i) % len(MOCK_ANSWERS)]
+            t0 = time.perf_counter()
+            try:
+                verdict = validation_batcher.validate(f"Mock puzzle {i + 1}", correct, near_miss)
+                ok = verdict["correct"] is True
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=player, args=(n,)) for n in range(players)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    llm = server.stats()
+    batcher = validation_batcher.get_stats()
+    total = len(latencies)
+    return {
+        "players": players,
+        **summarize(latencies, errors),
+        "answers_per_s": round(total / wall, 2),
+        "llm_calls": llm["calls"],
+        "calls_per_answer": round(llm["calls"] / total, 3) if total else 0.0,
+        "prompt_tokens_per_answer": round(llm["prompt_tokens"] / total, 1) if total else 0.0,
+        "mean_batch": batcher["mean_batch"] if batched else 1.0,
+        "fallbacks": batcher["fallbacks"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare batched and unbatched LLM answer validation.")
+    parser.add_argument("--players", default="1,8,32", help="comma-separated concurrent player counts")
+    parser.add_argument("--answers", type=int, default=15, help="ambiguous answers per player")
+    parser.add_argument("--think", type=float, default=0.3, help="mean seconds between a player's answers")
+    parser.add_argument("--window-ms", type=float, default=None, help="batch window (default: VALIDATION_BATCH_WINDOW_MS)")
+    parser.add_argument("--max-batch", type=int, default=None, help="batch size cap (default: VALIDATION_BATCH_MAX)")
+    parser.add_argument("--llm-rps", type=float, default=20, help="governor rate limit for the run")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock_config = config_from_args(args)
+    server = MockLLMServer(mock_config).start()
+    os.environ["API_BASE_URL"] = server.url
+    os.environ.setdefault("API_KEY", "mock-key")
+    os.environ["LLM_GOVERNOR"] = "1"
+    os.environ["LLM_RPS"] = str(args.llm_rps)
+    os.environ["LLM_GOVERNOR_DIR"] = tempfile.mkdtemp(prefix="bench-governor-")
+
+    # Import only after the environment points at the mock server
+    import validation_batcher
+
+    if args.window_ms is not None:
+        validation_batcher.WINDOW_SECONDS = args.window_ms / 1000
+    if args.max_batch is not None:
+        validation_batcher.MAX_ITEMS = args.max_batch
+
+    levels = [int(p) for p in args.players.split(",") if p]
+    unbatched, batched = [], []
+    try:
+        for players in levels:
+            for mode, rows in ((False, unbatched), (True, batched)):
+                row = run(validation_batcher, server, players, args.answers, args.think, mode, args.seed or 0)
+                rows.append(row)
+                print(f"{'batched  ' if mode else 'unbatched'} {players:>4} players: "
+                      f"p95 {row['p95_ms']:.0f} ms, {row['answers_per_s']:.1f} answers/s, "
+                      f"{row['calls_per_answer']:.2f} calls/answer")
+    finally:
+        server.stop()
+
+    result = make_result(
+        "bench_validation",
+        {"players": levels, "answers": args.answers, "think": args.think, "llm_rps": args.llm_rps,
+         "window_ms": validation_batcher.WINDOW_SECONDS * 1000, "max_batch": validation_batcher.MAX_ITEMS,
+         "mock": mock_config.to_dict()},
+        unbatched=unbatched,
+        batched=batched,
+    )
+    write_result(result, args.output)
+    if args.compare:
+        compare(result, args.compare, sections=("unbatched", "batched"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""Concurrent-player load generator and capacity report.
+
+Launches the app under gunicorn with the chosen worker model (``sync``,
+``gthread`` or ``gevent``) against the local mock LLM, then steps through
+increasing numbers of concurrent simulated players.  Each player plays real
+games over HTTP — lobby, ``/start``, think time, hints, skips, wrong answers
+and ``/time-check`` polling — and the report gives players vs. latency,
+throughput and error rate so worker and thread counts can be picked from
+evidence.
+
+    python -m benchmarks.load_test --worker-class gthread --workers 2 --threads 8 \\
+        --players 1,5,10,25,50 --duration 60 --output capacity.json
+
+Use ``--url`` to point at an already-running server instead of spawning one.
+"""
+
+import argparse
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import requests
+
+from benchmarks.bench_games import THEMES, PlayerProfile
+from benchmarks.mock_llm import MockLLMServer, add_mock_arguments, answers_for, config_from_args
+from benchmarks.report import compare, make_result, summarize, write_result
+
+CSRF_META = re.compile(r'name="csrf-token" content="([^"]+)"')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class Pacing:
+    """Real-time behaviour of a player, scaled by ``time_scale``."""
+    think_median: float = 20.0    # seconds spent reading/thinking per attempt
+    think_sigma: float = 0.6      # lognormal spread of think time
+    time_check_interval: float = 30.0  # game.js polls /time-check every 30s
+    time_scale: float = 0.05      # 0.05 → a 20s think becomes 1s
+
+    def think(self, rng: random.Random) -> float:
+        return rng.lognormvariate(0, self.think_sigma) * self.think_median * self.time_scale
+
+
+class StepRecorder:
+    """Latencies and failures for one load step."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.games_started = 0
+        self.games_finished = 0
+
+    def record(self, route: str, elapsed: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies.setdefault(route, []).append(elapsed)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def count_game(self, finished: bool) -> None:
+        with self._lock:
+            if finished:
+                self.games_finished += 1
+            else:
+                self.games_started += 1
+
+
+class Player(threading.Thread):
+    """One simulated browser playing games back to back until told to stop."""
+
+    def __init__(self, base_url: str, rec: StepRecorder, stop: threading.Event,
+                 profile: PlayerProfile, pacing: Pacing, seed: float):
+        super().__init__(daemon=True)
+        self.base_url = base_url.rstrip("/")
+        self.rec = rec
+        self.stop_event = stop
+        self.profile = profile
+        self.pacing = pacing
+        self.rng = random.Random(seed)
+        self.http = requests.Session()
+        self.csrf = ""
+        self.next_time_check = 0.0
+
+    def _request(self, method: str, route: str, **kwargs) -> Optional[dict]:
+        headers = kwargs.pop("headers", {})
+        if method == "POST":
+            headers["X-CSRFToken"] = self.csrf
+        t0 = time.perf_counter()
+        try:
+            resp = self.http.request(method, self.base_url + route, headers=headers, timeout=180, **kwargs)
+        except requests.RequestException:
+            self.rec.record(route, time.perf_counter() - t0, ok=False)
+            return None
+        self.rec.record(route, time.perf_counter() - t0, ok=resp.status_code < 400)
+        if route == "/":
+            # The lobby is rendered once for everyone; its token comes in a cookie
+            match = CSRF_META.search(resp.text)
+            self.csrf = match.group(1) if match else resp.cookies.get("csrf_token", self.csrf)
+            return {}
+        if "application/json" in resp.headers.get("Content-Type", ""):
+            return resp.json()
+        return {}
+
+    def _idle(self, seconds: float) -> bool:
+        """Think for *seconds*, polling /time-check like game.js. Returns False if stopped."""
+        deadline = time.monotonic() + seconds
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if now >= deadline:
+                return True
+            if now >= self.next_time_check:
+                self._request("POST", "/time-check")
+                self.next_time_check = now + self.pacing.time_check_interval * self.pacing.time_scale
+            self.stop_event.wait(min(deadline, self.next_time_check) - now)
+        return False
+
+    def play_game(self) -> None:
+        self._request("GET", "/")
+        self.rec.count_game(finished=False)
+        data = self._request("POST", "/start", json={"theme": self.rng.choice(THEMES),
+                                                     "difficulty": self.rng.randint(1, 5)})
+        if not data or not data.get("success"):
+            return
+        self._request("GET", "/room")
+        self.next_time_check = time.monotonic() + self.pacing.time_check_interval * self.pacing.time_scale
+
+        puzzle_number = 1
+        while self._idle(self.pacing.think(self.rng)):
+            correct, near_miss, wrong = answers_for(puzzle_number)
+            if self.rng.random() < self.profile.hint_rate:
+                self._request("POST", "/hint")
+                if not self._idle(self.pacing.think(self.rng) / 2):
+                    return
+
+            if self.rng.random() < self.profile.skip_rate:
+                data = self._request("POST", "/skip")
+            elif self.rng.random() < self.profile.wrong_rate:
+                self._request("POST", "/answer", json={"answer": wrong})
+                continue
+            else:
+                answer = near_miss if self.rng.random() < self.profile.near_miss_rate else correct
+                data = self._request("POST", "/answer", json={"answer": answer})
+            if data is None:
+                continue
+            if data.get("redirect"):
+                self._request("GET", "/result")
+                self.rec.count_game(finished=True)
+                return
+            if data.get("needs_retry") or data.get("error_generating"):
+                data = self._request("POST", "/next-puzzle") or {}
+            if data.get("puzzle_number"):
+                puzzle_number = data["puzzle_number"]
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            self.play_game()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(args, llm_url: str) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    cmd = [
+        sys.executable, "-m", "gunicorn",
+        "-w", str(args.workers),
+        "-k", args.worker_class,
+        "-b", f"127.0.0.1:{port}",
+        "--timeout", "120",
+        "app:app",
+    ]
+    if args.worker_class == "gthread":
+        cmd[cmd.index("app:app"):cmd.index("app:app")] = ["--threads", str(args.threads)]
+    if args.worker_class == "gevent":
+        cmd[cmd.index("app:app"):cmd.index("app:app")] = ["--worker-connections", str(args.worker_connections)]
+
+    env = {
+        **os.environ,
+        "API_BASE_URL": llm_url,
+        "API_KEY": os.environ.get("API_KEY", "mock-key"),
+        # Workers must share a key or sessions break when requests hop between them
+        "FLASK_SECRET_KEY": "load-test-secret",
+        "RATELIMIT_ENABLED": "0",
+    }
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {proc.returncode}: {' '.join(cmd)}")
+        try:
+            requests.get(base_url + "/", timeout=2)
+            return proc, base_url
+        except requests.RequestException:
+            time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not become ready within 30s")
+
+
+def run_step(base_url: str, players: int, duration: float, profile: PlayerProfile,
+             pacing: Pacing, seed_rng: random.Random) -> dict:
+    rec = StepRecorder()
+    stop = threading.Event()
+    threads = [Player(base_url, rec, stop, profile, pacing, seed_rng.random()) for _ in range(players)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=200)
+    wall = time.perf_counter() - t0
+
+    all_latencies = [v for values in rec.latencies.values() for v in values]
+    total_errors = sum(rec.errors.values())
+    overall = summarize(all_latencies, total_errors)
+    return {
+        "players": players,
+        "requests": len(all_latencies),
+        "throughput_rps": round(len(all_latencies) / wall, 2),
+        "error_rate": round(total_errors / len(all_latencies), 4) if all_latencies else 0.0,
+        "games_started": rec.games_started,
+        "games_finished": rec.games_finished,
+        "overall": overall,
+        "routes": {route: summarize(values, rec.errors.get(route, 0))
+                   for route, values in sorted(rec.latencies.items())},
+    }
+
+
+def print_curve(steps: list[dict]) -> None:
+    print(f"\n{'players':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8} {'games':>6}")
+    for s in steps:
+        o = s["overall"]
+        print(f"{s['players']:>8} {s['throughput_rps']:>8.1f} {o['p50_ms']:>9.1f} {o['p95_ms']:>9.1f} "
+              f"{o['p99_ms']:>9.1f} {s['error_rate'] * 100:>7.1f}% {s['games_finished']:>6}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulate concurrent players and report a capacity curve.")
+    parser.add_argument("--players", default="1,5,10,25", help="comma-separated concurrent player counts")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per step")
+    parser.add_argument("--url", help="target an already-running server instead of spawning gunicorn")
+    parser.add_argument("--worker-class", choices=("sync", "gthread", "gevent"), default="sync")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker (gthread)")
+    parser.add_argument("--worker-connections", type=int, default=100, help="greenlets per worker (gevent)")
+    parser.add_argument("--time-scale", type=float, default=Pacing.time_scale,
+                        help="multiplier on real think/poll times (1.0 = real time)")
+    parser.add_argument("--think-median", type=float, default=Pacing.think_median)
+    parser.add_argument("--hint-rate", type=float, default=PlayerProfile.hint_rate)
+    parser.add_argument("--skip-rate", type=float, default=PlayerProfile.skip_rate)
+    parser.add_argument("--wrong-rate", type=float, default=PlayerProfile.wrong_rate)
+    parser.add_argument("--near-miss-rate", type=float, default=PlayerProfile.near_miss_rate)
+    parser.add_argument("--verbose", action="store_true", help="show gunicorn logs")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="print deltas against a previous result file")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock_config = config_from_args(args)
+    profile = PlayerProfile(args.hint_rate, args.skip_rate, args.wrong_rate, args.near_miss_rate)
+    pacing = Pacing(think_median=args.think_median, time_scale=args.time_scale)
+    player_counts = [int(p) for p in args.players.split(",") if p.strip()]
+
+    server = MockLLMServer(mock_config, port=0).start()
+    proc = None
+    try:
+        if args.url:
+            base_url = args.url
+        else:
+            proc, base_url = start_gunicorn(args, server.url)
+
+        seed_rng = random.Random(args.seed)
+        steps = []
+        for players in player_counts:
+            print(f"▶ {players} players for {args.duration:.0f}s ...", flush=True)
+            server.reset_stats()
+            step = run_step(base_url, players, args.duration, profile, pacing, seed_rng)
+            step["llm_calls"] = server.stats()["calls"]
+            steps.append(step)
+        print_curve(steps)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=30)
+        server.stop()
+
+    result = make_result(
+        "load_test",
+        {
+            "worker_class": None if args.url else args.worker_class,
+            "workers": None if args.url else args.workers,
+            "threads": args.threads if args.worker_class == "gthread" and not args.url else None,
+            "url": args.url,
+            "duration": args.duration,
+            "profile": asdict(profile),
+            "pacing": asdict(pacing),
+            "mock": mock_config.to_dict(),
+        },
+        capacity=steps,
+    )
+    write_result(result, args.output)
+    if args.compare:
+        compare(result, args.compare, sections=("capacity",))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""Local OpenAI-compatible stand-in server for offline benchmarks.
+
+Serves ``POST /v1/chat/completions`` with canned puzzle, validation, hint and
+vision responses.  Latency, 5xx errors, 429s and malformed JSON bodies are
+injected at configurable rates so the retry/cascade paths in ``ai_client``
+get exercised too.
+
+Puzzle answers are deterministic per puzzle number (see ``MOCK_ANSWERS``) so a
+benchmark driver can play a game without peeking at the session.
+
+Run standalone:
+
+    python -m benchmarks.mock_llm --port 8900 --latency lognormal:-0.7,0.5
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+# (correct answer, near miss that needs LLM validation, clearly wrong answer)
+MOCK_ANSWERS = [
+    ("silver lantern", "silver lamp", "qqq"),
+    ("copper kettle", "copper pot", "zzz"),
+    ("beet farm", "beets farmer", "xxx"),
+    ("central perk", "centrel park", "vvv"),
+    ("dundie award", "dundee awards", "www"),
+]
+MOCK_VISION_ANSWER = ("red umbrella", "red parasol", "kkk")
+# Extra latency per additional answer in a batched validation call, as a
+# fraction of the sampled call latency
+BATCH_ITEM_COST = 0.1
+
+
+def answers_for(puzzle_number: int) -> tuple:
+    """Return (correct, near_miss, wrong) for a 1-based puzzle number."""
+    return MOCK_ANSWERS[(puzzle_number - 1) % len(MOCK_ANSWERS)]
+
+
+@dataclass
+class Latency:
+    """Latency distribution spec: ``fixed:S``, ``uniform:LO,HI`` or ``lognormal:MU,SIGMA`` (seconds)."""
+    kind: str = "fixed"
+    params: tuple = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, _, raw = spec.partition(":")
+        params = tuple(float(p) for p in raw.split(",") if p) or (0.0,)
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.params[0], self.params[1])
+        if self.kind == "lognormal":
+            return rng.lognormvariate(self.params[0], self.params[1])
+        return self.params[0]
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{','.join(str(p) for p in self.params)}"
+
+
+@dataclass
+class MockConfig:
+    """Fault and latency injection settings."""
+    latency: Latency = field(default_factory=Latency)
+    error_rate: float = 0.0        # fraction of calls answered with a 500
+    rate_limit_rate: float = 0.0   # fraction of calls answered with a 429
+    malformed_rate: float = 0.0    # fraction of 200s whose content is not valid JSON
+    seed: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "latency": str(self.latency),
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+            "malformed_rate": self.malformed_rate,
+            "seed": self.seed,
+        }
+
+
+def _classify(messages: list) -> str:
+    """Work out which task a request is for from its prompts."""
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content") for m in messages if m.get("role") == "user"), "")
+    if isinstance(user, list):
+        return "vision"
+    if "several players' answers" in system:
+        return "validation_batch"
+    if "answer validator" in system:
+        return "validation"
+    if "stuck on a puzzle" in system:
+        return "hint"
+    if "answer key" in system:
+        return "aliases"
+    return "puzzle"
+
+
+def _user_text(messages: list) -> str:
+    for m in messages:
+        if m.get("role") == "user":
+            content = m.get("content")
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+            return content or ""
+    return ""
+
+
+def _puzzle_content(prompt: str) -> dict:
+    number = int((re.search(r"Generate puzzle (\d+) of", prompt) or [None, 1])[1])
+    difficulty = int((re.search(r"Target difficulty: (\d)/5", prompt) or [None, 2])[1])
+    required = re.search(r"REQUIRED puzzle type for this one: ([a-z]+)", prompt)
+    preferred = re.search(r"pick from unused types\): ([a-z, ]+)", prompt)
+    if required:
+        # Bank-building prompts: every answer must be distinct to survive dedup
+        puzzle_type = required.group(1)
+        answer = f"{puzzle_type} {uuid.uuid4().hex[:6]}"
+    else:
+        puzzle_type = preferred.group(1).split(",")[0].strip() if preferred else "riddle"
+        answer = answers_for(number)[0]
+    return {
+        "question": f"Mock puzzle {number}: what opens the next door?",
+        "type": puzzle_type,
+        "answer": answer,
+        "hints": [f"It starts with '{answer[0]}'", f"It has {len(answer)} letters", f"It's '{answer[:3]}...'"],
+        "narrative_text": f"The lock on door {number} clicks as you approach.",
+        "difficulty": difficulty,
+    }
+
+
+def _verdict(player: str) -> dict:
+    near_misses = {a[1] for a in MOCK_ANSWERS} | {MOCK_VISION_ANSWER[1]}
+    correct = player in near_misses
+    return {"correct": correct, "feedback": "Close enough!" if correct else "Not quite — think again."}
+
+
+def _validation_content(prompt: str) -> dict:
+    # The last delimited block: the prompt's instructions mention the delimiter too
+    parts = prompt.split("===PLAYER_INPUT===")
+    player = parts[-2].strip() if len(parts) >= 3 else ""
+    return _verdict(player)
+
+
+def _batch_validation_content(prompt: str) -> dict:
+    inputs = re.findall(r"(===PLAYER_INPUT_(\d+)_\w+===)\n(.*?)\n\1", prompt, re.S)
+    return {"verdicts": [{"id": int(number), **_verdict(player.strip())} for _, number, player in inputs]}
+
+
+def batch_size(prompt: str) -> int:
+    """Answers in a batched validation prompt (1 for anything else)."""
+    return max(1, len(re.findall(r"^\[Answer \d+\]$", prompt, re.M)))
+
+
+def _aliases_content(prompt: str) -> dict:
+    answer = (re.search(r"^Answer: (.+)$", prompt, re.M) or [None, ""])[1].strip()
+    # The near miss the validator would accept becomes a precomputed alias
+    return {"aliases": [near for correct, near, _ in MOCK_ANSWERS + [MOCK_VISION_ANSWER] if correct == answer]}
+
+
+def _content_for(kind: str, prompt: str) -> dict:
+    if kind == "validation":
+        return _validation_content(prompt)
+    if kind == "validation_batch":
+        return _batch_validation_content(prompt)
+    if kind == "aliases":
+        return _aliases_content(prompt)
+    if kind == "hint":
+        return {"hint": "Look closer at the room around you.", "encouragement": "Almost there!"}
+    if kind == "vision":
+        answer = MOCK_VISION_ANSWER[0]
+        return {
+            "question": "What is the bright object in the corner of your photo?",
+            "type": "visual",
+            "answer": answer,
+            "hints": ["It keeps you dry", "It's red", "Open it when it rains"],
+            "narrative_text": "Your photo flickers onto the wall of the room.",
+            "difficulty": 2,
+            "image_description": "A test pattern.",
+        }
+    return _puzzle_content(prompt)
+
+
+class MockLLMServer:
+    """Threaded HTTP server speaking just enough of the OpenAI chat API."""
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._stats = self._empty_stats()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _empty_stats() -> dict:
+        return {"calls": 0, "by_kind": {}, "errors": 0, "rate_limited": 0, "malformed": 0,
+                "prompt_tokens": 0, "completion_tokens": 0}
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = self._empty_stats()
+
+    def _plan(self, kind: str) -> tuple[float, str]:
+        """Decide latency and outcome for one call (under lock — the RNG is shared)."""
+        with self._lock:
+            delay = self.config.latency.sample(self._rng)
+            roll = self._rng.random()
+            self._stats["calls"] += 1
+            self._stats["by_kind"][kind] = self._stats["by_kind"].get(kind, 0) + 1
+            if roll < self.config.rate_limit_rate:
+                self._stats["rate_limited"] += 1
+                return delay, "rate_limited"
+            roll -= self.config.rate_limit_rate
+            if roll < self.config.error_rate:
+                self._stats["errors"] += 1
+                return delay, "error"
+            roll -= self.config.error_rate
+            if roll < self.config.malformed_rate:
+                self._stats["malformed"] += 1
+                return delay, "malformed"
+            return delay, "ok"
+
+    def _count_tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self._stats["prompt_tokens"] += prompt_tokens
+            self._stats["completion_tokens"] += completion_tokens
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # noqa: A002 — keep benchmark output clean
+                pass
+
+            def _send(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send(400, {"error": {"message": "bad json"}})
+                    return
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+
+                messages = body.get("messages", [])
+                kind = _classify(messages)
+                delay, outcome = server._plan(kind)
+                if kind == "validation_batch":
+                    # A longer reply takes longer to generate
+                    delay *= 1 + BATCH_ITEM_COST * (batch_size(_user_text(messages)) - 1)
+                time.sleep(delay)
+
+                if outcome == "rate_limited":
+                    self._send(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}})
+                    return
+                if outcome == "error":
+                    self._send(500, {"error": {"message": "Injected upstream failure", "type": "server_error"}})
+                    return
+
+                prompt = _user_text(messages)
+                content = json.dumps(_content_for(kind, prompt))
+                if outcome == "malformed":
+                    content = "Sure! Here is your puzzle: " + content[: len(content) // 2]
+
+                prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+                completion_tokens = len(content) // 4
+                server._count_tokens(prompt_tokens, completion_tokens)
+                self._send(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                })
+
+        return Handler
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    """Register the fault-injection flags shared by every benchmark CLI."""
+    parser.add_argument("--latency", default="lognormal:-1.2,0.5",
+                        help="LLM latency: fixed:S | uniform:LO,HI | lognormal:MU,SIGMA (default: %(default)s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls returning 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls returning 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of replies with broken JSON")
+    parser.add_argument("--seed", type=int, default=None, help="RNG seed for reproducible runs")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency=Latency.parse(args.latency),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockLLMServer(config_from_args(args), host=args.host, port=args.port).start()
+    print(f"Mock LLM listening on {server.url}  (export API_BASE_URL={server.url})")
+    try:
+        while True:
+            time.sleep(60)
+            print(json.dumps(server.stats()))
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Shared helpers for benchmark result files.
+
+Every benchmark writes one JSON document with a ``schema`` version, the run
+configuration and its measurements, so two runs can be diffed with
+``compare`` regardless of which tool produced them.
+"""
+
+import json
+import math
+import platform
+import subprocess
+import time
+from typing import Iterable, Optional
+
+SCHEMA_VERSION = 1
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of *values* (0 if empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values: list[float], errors: int = 0) -> dict:
+    """Latency summary in milliseconds."""
+    return {
+        "count": len(values),
+        "errors": errors,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2) if values else 0.0,
+    }
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def make_result(benchmark: str, config: dict, **measurements) -> dict:
+    return {
+        "schema": SCHEMA_VERSION,
+        "benchmark": benchmark,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "config": config,
+        **measurements,
+    }
+
+
+def write_result(result: dict, path: Optional[str]) -> None:
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+        print(f"📄 Results written to {path}")
+    else:
+        print(text)
+
+
+def _flatten(data, prefix: str = "") -> Iterable[tuple[str, float]]:
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _flatten(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(data, list):
+        for i, item in enumerate(data):
+            label = item.get("players", item.get("sessions", i)) if isinstance(item, dict) else i
+            yield from _flatten(item, f"{prefix}[{label}]")
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        yield prefix, float(data)
+
+
+def compare(current: dict, baseline_path: str, sections: tuple = ()) -> None:
+    """Print numeric deltas between *current* and a previous result file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("benchmark") != current.get("benchmark"):
+        print(f"⚠️  Comparing different benchmarks: {baseline.get('benchmark')} vs {current.get('benchmark')}")
+
+    sections = sections or tuple(k for k in current if k not in ("config", "schema", "timestamp"))
+    old = dict(_flatten({k: baseline.get(k) for k in sections}))
+    new = dict(_flatten({k: current.get(k) for k in sections}))
+    print(f"\n{'metric':<48} {'baseline':>12} {'current':>12} {'delta':>9}")
+    for key in sorted(set(old) | set(new)):
+        a, b = old.get(key), new.get(key)
+        if a is None or b is None:
+            print(f"{key:<48} {a if a is not None else '-':>12} {b if b is not None else '-':>12}")
+            continue
+        delta = f"{(b - a) / a * 100:+.1f}%" if a else ("" if a == b else "new")
+        print(f"{key:<48} {a:>12.2f} {b:>12.2f} {delta:>9}")
@@ -0,0 +1,205 @@
+"""Stress test for ``puzzle_cache`` thread safety.
+
+Hammers the cache from many threads on a small set of shared session ids —
+starting games, invalidating them, sliding the difficulty-branch window,
+waiting on in-flight puzzles and reading status — with a tiny thread switch
+interval to force interleavings.  The LLM
+is replaced by a fake engine that tags every puzzle with the game it was
+generated for, so stale writes from superseded background threads are
+detectable.  After quiescing, the cache's internal maps are checked for
+consistency.
+
+Exits non-zero if any invariant is violated:
+
+    python -m benchmarks.stress_cache --threads 32 --seconds 10
+    python -m benchmarks.stress_cache --max-bytes 20000   # with budget evictions
+"""
+
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import puzzle_cache
+from cache_core import ShardedCache
+from game_engine import GameEngine, GameState, PuzzleState
+
+
+class TaggingEngine(GameEngine):
+    """Generates instantly-ish, stamping each puzzle with its game token (state.theme), index and level."""
+
+    def __init__(self, max_delay: float):
+        self.max_delay = max_delay
+
+    def generate_puzzle(self, state: GameState) -> GameState:
+        time.sleep(random.random() * self.max_delay)
+        if random.random() < 0.05:
+            raise RuntimeError("injected generation failure")
+        tag = f"{state.theme}:{state.current_puzzle_index}:{state.difficulty_level}"
+        state.puzzles.append(PuzzleState(question=tag, answer=tag).to_dict())
+        return state
+
+
+class Checker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.violations: list[str] = []
+        self.ops = Counter()
+        # session id -> tokens of every game ever started on it, newest last
+        self.games: dict[str, list[str]] = {}
+        self.lookups = 0
+
+    def fail(self, msg: str) -> None:
+        with self.lock:
+            if len(self.violations) < 50:
+                self.violations.append(msg)
+
+
+def worker(sids: list[str], check: Checker, stop: threading.Event, seed: int, wait_timeout: float) -> None:
+    rng = random.Random(seed)
+    while not stop.is_set():
+        sid = rng.choice(sids)
+        op = rng.random()
+        with check.lock:
+            known = list(check.games.get(sid, []))
+        # Any game's state may show up, as with a stale request racing a new game
+        theme = rng.choice(known) if known else "none"
+        if op < 0.15:
+            token = f"g{seed}-{rng.getrandbits(32):08x}"
+            state = GameState(theme=token, status="playing", difficulty_level=rng.randint(1, 5))
+            # Record and start together so "newest game" matches the cache's order
+            with check.lock:
+                check.games.setdefault(sid, []).append(token)
+                puzzle_cache.start_precaching(sid, state)
+            check.ops["start"] += 1
+        elif op < 0.25:
+            puzzle_cache.invalidate_session(sid)
+            check.ops["invalidate"] += 1
+        elif op < 0.40:
+            state = GameState(theme=theme, current_puzzle_index=rng.randint(0, 3),
+                              difficulty_level=rng.randint(1, 5))
+            puzzle_cache.advance(sid, state)
+            check.ops["advance"] += 1
+        elif op < 0.85:
+            idx, level = rng.randint(1, 4), rng.randint(1, 5)
+            state = GameState(theme=theme, current_puzzle_index=idx, difficulty_level=level)
+            result = puzzle_cache.wait_for_puzzle(sid, state, timeout=wait_timeout)
+            with check.lock:
+                check.lookups += 1
+                known = check.games.get(sid, [])
+            check.ops["wait"] += 1
+            if result:
+                # Pooled branches may come from another index of the same theme
+                token, got_idx, got_level = result["puzzle"]["question"].split(":")
+                if token not in known:
+                    check.fail(f"{sid}: served puzzle from unknown game {token}")
+                if token != theme:
+                    check.fail(f"{sid}: asked for a {theme} puzzle, got one from {token}")
+                if int(got_level) != level or result["difficulty"] != level:
+                    check.fail(f"{sid}: asked for difficulty {level}, got {got_level}")
+                if not 1 <= int(got_idx) <= 4:
+                    check.fail(f"{sid}: served puzzle index {got_idx}")
+        else:
+            status = puzzle_cache.get_cache_status(sid)
+            if status["count"] != sum(len(b) for b in status["cached_puzzles"].values()):
+                check.fail(f"{sid}: status count mismatch {status}")
+            check.ops["status"] += 1
+
+
+def check_quiescent(check: Checker, sids: list[str]) -> None:
+    """Invariants over the cache's internals once nothing is running."""
+    lookups = dict.fromkeys(puzzle_cache._STAT_KEYS, 0)
+    futures = []
+    for shard in puzzle_cache._sessions.shards:
+        with shard.lock:
+            for key, value in puzzle_cache._stats[shard.index].items():
+                lookups[key] += value
+            for entry in shard.values():
+                sid = next(s for s in sids if shard.get(s, touch=False) is entry)
+                latest = check.games.get(sid, [None])[-1]
+                if not entry["alive"]:
+                    check.fail(f"{sid}: dead entry still cached")
+                for idx, branches in entry["puzzles"].items():
+                    for level, cached in branches.items():
+                        token = cached["puzzle"]["question"].partition(":")[0]
+                        if token != latest:
+                            check.fail(f"{sid}: puzzle {idx} from stale game {token}, current is {latest}")
+                        if cached["difficulty"] != level:
+                            check.fail(f"{sid}: puzzle {idx} filed under d{level}, generated at d{cached['difficulty']}")
+                        if (idx, level) in entry["pending"]:
+                            check.fail(f"{sid}: puzzle {idx} (d{level}) both cached and pending")
+                if entry["generating"]:
+                    check.fail(f"{sid}: still generating after quiesce")
+                if entry["queue"]:
+                    check.fail(f"{sid}: branches {sorted(entry['queue'])} queued with no generator")
+                if not entry["promoted"] <= set(entry["pending"]):
+                    check.fail(f"{sid}: promoted branches with no pending future")
+                if set(entry["branch_bytes"]) != {(i, d) for i, b in entry["puzzles"].items() for d in b}:
+                    check.fail(f"{sid}: byte accounting out of sync with cached branches")
+                futures.extend(entry["pending"].items())
+            accounted = sum(puzzle_cache._entry_size(e) for e in shard.values())
+            if accounted != shard.bytes:
+                check.fail(f"shard {shard.index}: {shard.bytes} bytes accounted, entries add up to {accounted}")
+    if sum(lookups[k] for k in ("hits", "waits", "pooled", "misses")) != check.lookups:
+        check.fail(f"lookup counters {lookups} don't add up to {check.lookups} lookups")
+
+    # Every future must be released once sessions are dropped
+    for sid in sids:
+        puzzle_cache.invalidate_session(sid)
+    for branch, future in futures:
+        if not future.done():
+            check.fail(f"{branch}: future still unresolved after invalidate")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stress puzzle_cache from many threads and verify invariants.")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--sessions", type=int, default=8, help="shared session ids (fewer = more contention)")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--max-gen-delay", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-bytes", type=int, default=None,
+                        help="shrink the cache's byte budget to force LRU evictions mid-game")
+    args = parser.parse_args()
+
+    sys.setswitchinterval(1e-6)
+    logging.getLogger("puzzle_cache").setLevel(logging.CRITICAL)
+    puzzle_cache.engine = TaggingEngine(args.max_gen_delay)
+    if args.max_bytes is not None:
+        puzzle_cache._sessions = ShardedCache(args.max_bytes, puzzle_cache.CACHE_TTL_SECONDS,
+                                              puzzle_cache.CACHE_SHARDS, on_evict=puzzle_cache._release)
+    puzzle_cache.reset_stats()
+    check = Checker()
+    sids = [f"s{i}" for i in range(args.sessions)]
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=worker, args=(sids, check, stop, args.seed + i, args.max_gen_delay * 20))
+        for i in range(args.threads)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    # Let background generators finish (or notice they were superseded)
+    deadline = time.time() + 30
+    while time.time() < deadline and puzzle_cache.get_stats()["generating"]:
+        time.sleep(0.05)
+    check_quiescent(check, sids)
+
+    print(f"ops: {dict(check.ops)}  cache stats: {puzzle_cache.get_stats()}")
+    if check.violations:
+        print(f"❌ {len(check.violations)} invariant violation(s):")
+        for v in check.violations:
+            print("   ", v)
+        sys.exit(1)
+    print("✅ no races detected")
+
+
+if __name__ == "__main__":
+    main()
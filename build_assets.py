@@ -0,0 +1,31 @@
+"""Build step for static assets: fingerprint and precompress into ``static/dist``.
+
+    uv run python build_assets.py
+
+Run it whenever ``static/css`` or ``static/js`` changes (the Docker image
+runs it at build time).  See ``assets.py`` for how the output is served.
+"""
+
+import argparse
+
+import assets
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets.")
+    parser.add_argument("--static-dir", default=assets.STATIC_DIR)
+    parser.add_argument("--dist-dir", default=assets.DIST_DIR)
+    args = parser.parse_args()
+
+    manifest = assets.build(args.static_dir, args.dist_dir)
+    if assets.brotli is None:
+        print("ℹ️  brotli not installed — writing gzip variants only")
+    for logical, entry in sorted(manifest["assets"].items()):
+        sizes = entry["sizes"]
+        compressed = ", ".join(f"{enc} {size:,}" for enc, size in sizes.items() if enc != "identity")
+        print(f"📦 {logical} → {entry['path']}  ({sizes['identity']:,} bytes{'; ' + compressed if compressed else ''})")
+    print(f"✅ {len(manifest['assets'])} assets written to {args.dist_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Scheduled builder for daily challenge artifacts.
+
+Generates each theme's daily puzzle set (see ``daily.py``) for today and the
+days after it, so the next day's set is ready before midnight UTC:
+
+    uv run python build_daily.py --days 2          # e.g. from cron at 23:00 UTC
+    uv run python build_daily.py --date 2026-12-25 --themes got --force
+
+- Idempotent: sets that already exist are skipped unless ``--force``, so the
+  job can run as often as you like.
+- Every call goes through ``llm_governor`` in the prefetch lane, sharing
+  limits with (and yielding to) live workers on the host.
+- Each answer gets an alias list — local spelling variants plus one LLM call
+  for synonyms — so games can check answers without the LLM.
+
+Exits non-zero if any set failed to build.
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import sys
+import time
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build daily challenge artifacts.")
+    parser.add_argument("--date", help="first date to build, YYYY-MM-DD (default: today, UTC)")
+    parser.add_argument("--days", type=int, default=2, help="consecutive days to build (default: %(default)s)")
+    parser.add_argument("--themes", help="comma-separated theme keys (default: all except custom)")
+    parser.add_argument("--difficulty", type=int, default=3, help="difficulty of every set (default: %(default)s)")
+    parser.add_argument("--force", action="store_true", help="rebuild sets that already exist")
+    parser.add_argument("--rps", type=float, help="override LLM_RPS for this run")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    # Governor limits are read at import time.  A bulk run is paced even
+    # where the site itself leaves the governor off
+    os.environ.setdefault("LLM_GOVERNOR", "1")
+    if args.rps is not None:
+        os.environ["LLM_RPS"] = str(args.rps)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    import ai_client
+    import daily
+    import llm_governor
+    from game_engine import GameEngine
+    from prompts import ANSWER_ALIASES_SYSTEM, THEME_DESCRIPTIONS, answer_aliases_prompt
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("build_daily")
+    logger.setLevel(logging.INFO)
+
+    themes = args.themes.split(",") if args.themes else [t for t in THEME_DESCRIPTIONS if t != "custom"]
+    unknown = [t for t in themes if t not in THEME_DESCRIPTIONS or t == "custom"]
+    if unknown:
+        logger.error("Unknown theme(s): %s", ", ".join(unknown))
+        return 2
+
+    first = datetime.date.fromisoformat(args.date or daily.today())
+    dates = [(first + datetime.timedelta(days=n)).isoformat() for n in range(max(1, args.days))]
+
+    def ask_aliases(question: str, answer: str) -> list[str]:
+        try:
+            reply = ai_client.generate_json(ANSWER_ALIASES_SYSTEM, answer_aliases_prompt(question, answer),
+                                            lane=llm_governor.LANE_PREFETCH, task="aliases")
+        except Exception as e:
+            # Local variants still apply; the set is playable without these
+            logger.warning("⚠️ No model aliases for %r: %s", answer, e)
+            return []
+        return [str(a) for a in reply.get("aliases", [])]
+
+    engine = GameEngine()
+    stats = {"built": 0, "skipped": 0, "failed": 0}
+    started = time.time()
+    for date in dates:
+        for theme in themes:
+            if not args.force and os.path.exists(daily.artifact_path(date, theme)):
+                stats["skipped"] += 1
+                continue
+            t0 = time.time()
+            try:
+                with ai_client.priority(llm_governor.LANE_PREFETCH):
+                    challenge = daily.build_challenge(engine, theme, date, args.difficulty, ask_aliases)
+            except Exception as e:
+                stats["failed"] += 1
+                logger.warning("❌ %s/%s: %s", date, theme, e)
+                continue
+            path = daily.write(challenge)
+            stats["built"] += 1
+            logger.info("📅 %s/%s built in %.1fs → %s", date, theme, time.time() - t0, path)
+
+    logger.info("🏁 built %d, skipped %d existing, %d failed in %.0fs",
+                stats["built"], stats["skipped"], stats["failed"], time.time() - started)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
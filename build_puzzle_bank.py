@@ -0,0 +1,174 @@
+"""Offline bulk builder for the persistent puzzle bank.
+
+Pre-fills ``puzzle_bank`` for every theme in ``THEME_DESCRIPTIONS`` across
+difficulties 1–5 and all puzzle types, so capacity is seeded before a launch
+instead of waiting on live traffic.
+
+    uv run python build_puzzle_bank.py --per-cell 3 --parallel 8
+
+- Resumable: each (theme, type, difficulty) cell is only topped up to
+  ``--per-cell``, so re-running after an interruption continues where it
+  stopped.
+- Rate limits: every call goes through ``llm_governor`` in the prefetch lane,
+  sharing limits with (and yielding to) any live workers on the host.
+  ``--rps``/``--concurrency`` override the governor defaults for this run.
+- Dedup: answers are normalized with ``GameEngine._normalize`` and checked
+  against everything already banked for the theme.
+- Results are written in bulk transactions of ``--batch-size`` rows.
+
+The image-based ``custom`` theme is skipped — its puzzles only make sense
+next to the player's uploaded photo.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DIFFICULTIES = range(1, 6)
+RECENT_ANSWERS = 15   # latest answers per theme shown to the model to avoid repeats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-fill the puzzle bank with AI-generated puzzles.")
+    parser.add_argument("--per-cell", type=int, default=3,
+                        help="target puzzles per (theme, type, difficulty) cell (default: %(default)s)")
+    parser.add_argument("--parallel", type=int, default=8, help="concurrent generations (default: %(default)s)")
+    parser.add_argument("--themes", help="comma-separated theme keys (default: all except custom)")
+    parser.add_argument("--batch-size", type=int, default=25, help="rows per bulk transaction")
+    parser.add_argument("--max-attempts", type=int, default=3, help="tries per missing puzzle")
+    parser.add_argument("--rps", type=float, help="override LLM_RPS for this run")
+    parser.add_argument("--concurrency", type=int, help="override LLM_MAX_CONCURRENCY for this run")
+    parser.add_argument("--dry-run", action="store_true", help="only report what is missing")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    # Governor limits are read at import time.  A bulk run is paced even
+    # where the site itself leaves the governor off
+    os.environ.setdefault("LLM_GOVERNOR", "1")
+    if args.rps is not None:
+        os.environ["LLM_RPS"] = str(args.rps)
+    if args.concurrency is not None:
+        os.environ["LLM_MAX_CONCURRENCY"] = str(args.concurrency)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    import llm_governor
+    import puzzle_bank
+    from ai_client import generate_json
+    from game_engine import GameEngine
+    from prompts import PUZZLE_GENERATION_SYSTEM, PUZZLE_TYPES, THEME_DESCRIPTIONS, puzzle_generation_prompt
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger("build_puzzle_bank")
+    logger.setLevel(logging.INFO)
+
+    themes = args.themes.split(",") if args.themes else [t for t in THEME_DESCRIPTIONS if t != "custom"]
+    unknown = [t for t in themes if t not in THEME_DESCRIPTIONS]
+    if unknown:
+        logger.error("Unknown theme(s): %s", ", ".join(unknown))
+        return 2
+
+    counts = {cell: n for cell, n in puzzle_bank.cell_counts().items() if cell[0] in themes}
+    jobs = []
+    for theme in themes:
+        for puzzle_type in PUZZLE_TYPES:
+            for difficulty in DIFFICULTIES:
+                missing = args.per_cell - counts.get((theme, puzzle_type, difficulty), 0)
+                jobs += [(theme, puzzle_type, difficulty)] * max(0, missing)
+    total_cells = len(themes) * len(PUZZLE_TYPES) * len(DIFFICULTIES)
+    logger.info("📦 %d cells, %d puzzles banked, %d to generate", total_cells, sum(counts.values()), len(jobs))
+    if args.dry_run or not jobs:
+        return 0
+
+    seen = {theme: puzzle_bank.answer_keys(theme) for theme in themes}
+    # The set answers "banked already?"; the deque keeps the most recent ones in order
+    latest = {theme: deque(puzzle_bank.recent_answers(theme, RECENT_ANSWERS), maxlen=RECENT_ANSWERS)
+              for theme in themes}
+
+    def generate(theme: str, puzzle_type: str, difficulty: int) -> dict:
+        # Recent answers for the theme steer the model away from duplicates
+        prompt = puzzle_generation_prompt(
+            theme=theme,
+            puzzle_number=2,
+            total_puzzles=5,
+            difficulty=difficulty,
+            puzzle_type=puzzle_type,
+            avoid_answers=list(latest[theme]) or None,
+        )
+        for attempt in range(args.max_attempts):
+            try:
+                return generate_json(PUZZLE_GENERATION_SYSTEM, prompt, lane=llm_governor.LANE_PREFETCH,
+                                     task="puzzle", defaults={"difficulty": difficulty})
+            except llm_governor.LoadShed:
+                time.sleep(2 * (attempt + 1))
+        raise RuntimeError("shed by the governor on every attempt")
+
+    batch: list[tuple[str, dict, str]] = []
+    stats = {"added": 0, "duplicates": 0, "failed": 0}
+
+    def flush() -> None:
+        if batch:
+            stats["added"] += puzzle_bank.add_puzzles(batch)
+            batch.clear()
+
+    started = time.time()
+    pool = ThreadPoolExecutor(max_workers=max(1, args.parallel))
+    futures = {pool.submit(generate, *job): job for job in jobs}
+    try:
+        for done, future in enumerate(as_completed(futures), start=1):
+            theme, puzzle_type, difficulty = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                stats["failed"] += 1
+                logger.warning("❌ %s/%s/d%d: %s", theme, puzzle_type, difficulty, e)
+                continue
+
+            answer = str(result.get("answer", "")).lower().strip()
+            key = GameEngine._normalize(answer)
+            returned_type = result.get("type") or puzzle_type
+            if not key or not result.get("question") or returned_type not in PUZZLE_TYPES:
+                stats["failed"] += 1
+                logger.warning("❌ %s/%s/d%d: unusable reply (no answer, no question or unknown type %r)",
+                               theme, puzzle_type, difficulty, returned_type)
+                continue
+            if key in seen[theme]:
+                stats["duplicates"] += 1
+                continue
+            seen[theme].add(key)
+            latest[theme].append(answer)
+            batch.append((theme, {
+                "question": result["question"],
+                # What the model wrote, even if it strayed from the requested type;
+                # the requested cell is topped up on the next run
+                "puzzle_type": returned_type,
+                "answer": answer,
+                "hints": result.get("hints", []),
+                "narrative_text": result.get("narrative_text", ""),
+                "difficulty": difficulty,
+            }, key))
+            if len(batch) >= args.batch_size:
+                flush()
+            if done % 25 == 0:
+                logger.info("… %d/%d done (%.1f/s)", done, len(jobs), done / (time.time() - started))
+    except KeyboardInterrupt:
+        logger.warning("⏹ Interrupted — saving what we have; re-run to resume")
+        pool.shutdown(wait=False, cancel_futures=True)
+    finally:
+        flush()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    logger.info("🏁 added %d, skipped %d duplicate(s), %d failed in %.0fs — bank now holds %d puzzles",
+                stats["added"], stats["duplicates"], stats["failed"], time.time() - started, puzzle_bank.count())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Sharded LRU/TTL cache core with a byte budget.
+
+Keys are spread over independently locked shards so lookups and inserts for
+different keys rarely contend.  Each shard keeps:
+
+- an ``OrderedDict`` in LRU order — touch and insert are O(1)
+  (``move_to_end``), eviction pops from the cold end;
+- a min-heap of expiry times — expired entries are purged from the top in
+  O(log n) each instead of scanning every entry (stale heap records left by
+  replaced keys are skipped lazily);
+- a running byte total from per-entry sizes the caller reports, so the
+  cache is capped by memory rather than entry count.
+
+Compound operations hold the shard lock themselves::
+
+    shard = cache.shard(key)
+    with shard.lock:
+        value = shard.get(key)
+        ...
+        shard.resize(key, new_size)
+
+Every removal (expiry, budget eviction, replacement, explicit removal)
+calls ``on_evict(key, value, reason)`` while the shard lock is held, so the
+owner can release whatever the value holds before anyone else sees the key
+again.
+"""
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+EvictCallback = Callable[[Hashable, Any, str], None]
+
+
+def deep_sizeof(obj: Any) -> int:
+    """Approximate memory footprint of plain data (dicts, lists, strings, numbers)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_sizeof(key) + deep_sizeof(value)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item)
+    return size
+
+
+class _Item:
+    __slots__ = ("value", "size", "expires_at", "seq")
+
+    def __init__(self, value: Any, size: int, expires_at: float, seq: int):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.seq = seq
+
+
+class CacheShard:
+    """One lock-protected slice of a ``ShardedCache``.  Methods expect ``lock`` to be held."""
+
+    def __init__(self, index: int, max_bytes: int, ttl: float, on_evict: Optional[EvictCallback]):
+        self.index = index
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.evictions = {"expired": 0, "budget": 0, "replaced": 0, "removed": 0}
+        self._items: "OrderedDict[Hashable, _Item]" = OrderedDict()
+        self._expiry: list[tuple[float, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._on_evict = on_evict
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _drop(self, key: Hashable, reason: str) -> Any:
+        item = self._items.pop(key)
+        self.bytes -= item.size
+        self.evictions[reason] += 1
+        if self._on_evict:
+            self._on_evict(key, item.value, reason)
+        return item.value
+
+    def _purge_expired(self, now: float) -> None:
+        heap = self._expiry
+        while heap and heap[0][0] <= now:
+            _, seq, key = heapq.heappop(heap)
+            item = self._items.get(key)
+            if item is not None and item.seq == seq:
+                self._drop(key, "expired")
+
+    def _enforce_budget(self, keep: Hashable) -> None:
+        """Evict least-recently-used entries until under budget (never *keep* itself)."""
+        while self.bytes > self.max_bytes and len(self._items) > 1:
+            oldest = next(iter(self._items))
+            if oldest == keep:
+                self._items.move_to_end(keep)
+                oldest = next(iter(self._items))
+            self._drop(oldest, "budget")
+
+    def get(self, key: Hashable, touch: bool = True) -> Any:
+        """The live value for *key* (marking it recently used), or None."""
+        now = time.time()
+        if self._expiry and self._expiry[0][0] <= now:
+            self._purge_expired(now)
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if touch:
+            self._items.move_to_end(key)
+        return item.value
+
+    def put(self, key: Hashable, value: Any, size: int, ttl: Optional[float] = None) -> None:
+        """Insert or replace *key*, then evict expired and over-budget entries."""
+        now = time.time()
+        if key in self._items:
+            self._drop(key, "replaced")
+        seq = next(self._seq)
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self._items[key] = _Item(value, size, expires_at, seq)
+        self.bytes += size
+        heapq.heappush(self._expiry, (expires_at, seq, key))
+        self._purge_expired(now)
+        self._enforce_budget(keep=key)
+        # Replaced keys leave stale heap records behind; rebuild if they pile up
+        if len(self._expiry) > 2 * len(self._items) + 64:
+            self._expiry = [(i.expires_at, i.seq, k) for k, i in self._items.items()]
+            heapq.heapify(self._expiry)
+
+    def resize(self, key: Hashable, size: int) -> None:
+        """Update *key*'s accounted size (e.g. after its value grew) and re-check the budget."""
+        item = self._items.get(key)
+        if item is None:
+            return
+        self.bytes += size - item.size
+        item.size = size
+        self._enforce_budget(keep=key)
+
+    def remove(self, key: Hashable) -> Any:
+        """Remove *key* (calling ``on_evict``); returns its value or None."""
+        if key not in self._items:
+            return None
+        return self._drop(key, "removed")
+
+    def values(self) -> list:
+        return [item.value for item in self._items.values()]
+
+
+class ShardedCache:
+    """Fixed number of ``CacheShard``s sharing a total byte budget and a default TTL."""
+
+    def __init__(self, max_bytes: int, ttl: float, shards: int = 16,
+                 on_evict: Optional[EvictCallback] = None):
+        shards = max(1, shards)
+        per_shard = max(1, max_bytes // shards)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shards = [CacheShard(i, per_shard, ttl, on_evict) for i in range(shards)]
+
+    def shard(self, key: Hashable) -> CacheShard:
+        return self.shards[hash(key) % len(self.shards)]
+
+    # Convenience wrappers for single operations
+    def get(self, key: Hashable) -> Any:
+        shard = self.shard(key)
+        with shard.lock:
+            return shard.get(key)
+
+    def put(self, key: Hashable, value: Any, size: int, ttl: Optional[float] = None) -> None:
+        shard = self.shard(key)
+        with shard.lock:
+            shard.put(key, value, size, ttl)
+
+    def remove(self, key: Hashable) -> Any:
+        shard = self.shard(key)
+        with shard.lock:
+            return shard.remove(key)
+
+    def stats(self) -> dict:
+        """Entry count, bytes and evictions summed over shards."""
+        totals = {"entries": 0, "bytes": 0, "max_bytes": self.max_bytes, "shards": len(self.shards),
+                  "evictions": {}}
+        for shard in self.shards:
+            with shard.lock:
+                totals["entries"] += len(shard)
+                totals["bytes"] += shard.bytes
+                for reason, count in shard.evictions.items():
+                    totals["evictions"][reason] = totals["evictions"].get(reason, 0) + count
+        return totals
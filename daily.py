@@ -0,0 +1,153 @@
+"""Daily challenges: one prebuilt puzzle set per theme per day, served with no LLM calls.
+
+``build_daily.py`` (run on a schedule) generates each theme's set ahead of
+time and writes it as a ready-to-serve artifact::
+
+    DAILY_DIR/2026-10-19/theoffice.json
+    {"date", "theme", "difficulty", "easter_egg_puzzle", "built_at",
+     "puzzles": [PuzzleState dict + "aliases", ...]}
+
+At play time the fast path never touches ``GameEngine.generate_puzzle`` or
+the prefetch cache: puzzles come straight from the artifact, shaped like a
+``puzzle_cache`` branch, and answers are matched locally against the answer
+plus its precomputed ``aliases``.  Artifacts are read once per process and
+shared read-only by every player; a missing one is re-checked at most every
+``MISSING_RECHECK_SECONDS`` so it shows up once the job has written it.
+
+Dates are UTC.  A game keeps the date it started on, so a challenge that
+runs past midnight finishes on the same set.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DAILY_DIR = os.environ.get(
+    "DAILY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily"),
+)
+MISSING_RECHECK_SECONDS = 60
+
+# (date, theme) -> artifact, or (checked_at,) while it doesn't exist yet
+_artifacts: dict[tuple[str, str], object] = {}
+_lock = threading.Lock()
+
+
+def today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def artifact_path(date: str, theme: str) -> str:
+    return os.path.join(DAILY_DIR, date, f"{theme}.json")
+
+
+def load(theme: str, date: Optional[str] = None) -> Optional[dict]:
+    """The challenge for *theme* on *date* (default today), or None if it hasn't been built."""
+    key = (date or today(), theme)
+    with _lock:
+        cached = _artifacts.get(key)
+    if isinstance(cached, dict):
+        return cached
+    if cached is not None and time.time() - cached[0] < MISSING_RECHECK_SECONDS:
+        return None
+    try:
+        with open(artifact_path(*key)) as f:
+            artifact = json.load(f)
+    except FileNotFoundError:
+        artifact = None
+    except (OSError, ValueError) as e:
+        logger.error("❌ [Daily] Unreadable challenge %s/%s: %s", *key, e)
+        artifact = None
+    with _lock:
+        if len(_artifacts) > 256:
+            # Yesterday's sets are only needed by games still in progress
+            for stale in [k for k in _artifacts if k[0] < key[0]]:
+                del _artifacts[stale]
+        _artifacts[key] = artifact if artifact is not None else (time.time(),)
+    return artifact
+
+
+def puzzle(challenge: dict, idx: int) -> dict:
+    """Puzzle *idx* of a challenge as a cache branch (``{"puzzle", "narrative_text"}``)."""
+    entry = challenge["puzzles"][idx]
+    return {"puzzle": dict(entry), "narrative_text": entry.get("narrative_text", "")}
+
+
+# ---------------------------------------------------------------------------
+# Build (used by build_daily.py)
+# ---------------------------------------------------------------------------
+_NUMBERS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+            "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+            "eighteen", "nineteen", "twenty"]
+
+
+def local_aliases(answer: str) -> list[str]:
+    """Spelling variants a player may type that ``_local_match`` wouldn't already accept."""
+    variants = set()
+    words = answer.split()
+    swapped = [str(_NUMBERS.index(w)) if w in _NUMBERS else
+               (_NUMBERS[int(w)] if w.isdigit() and int(w) < len(_NUMBERS) else w) for w in words]
+    variants.add(" ".join(swapped))
+    variants.add(answer.replace("&", "and"))
+    variants.add(re.sub(r"\band\b", "&", answer))
+    if words and len(words[-1]) > 3 and not words[-1].endswith("ss"):
+        last = words[-1]
+        variants.add(" ".join(words[:-1] + [last[:-1] if last.endswith("s") else last + "s"]))
+    variants.discard(answer)
+    return sorted(v for v in variants if v.strip())
+
+
+def build_challenge(engine, theme: str, date: str, difficulty: int,
+                    ask_aliases=None) -> dict:
+    """Generate a full challenge for *theme* on *date*.
+
+    *engine* is a ``GameEngine``; every puzzle continues the story of the ones
+    before it, like a normal game.  *ask_aliases(question, answer)* returns
+    model-suggested accepted answers (the builder passes an LLM call).
+    """
+    from game_engine import TOTAL_PUZZLES
+
+    # Same date and theme -> same easter-egg slot, whoever builds it
+    rng = random.Random(f"{date}:{theme}")
+    state = engine.start_game(theme, difficulty=difficulty)
+    state.easter_egg_puzzle = rng.randint(1, TOTAL_PUZZLES - 1)
+    puzzles = []
+    for idx in range(TOTAL_PUZZLES):
+        state.current_puzzle_index = idx
+        state = engine.generate_puzzle(state)
+        entry = state.puzzles[-1]
+        aliases = set(local_aliases(entry["answer"]))
+        if ask_aliases is not None:
+            aliases.update(a.lower().strip() for a in ask_aliases(entry["question"], entry["answer"]))
+        aliases.discard(entry["answer"])
+        entry["aliases"] = sorted(a for a in aliases if a)
+        entry["started_at"] = 0.0
+        puzzles.append(entry)
+    return {
+        "date": date,
+        "theme": theme,
+        "difficulty": difficulty,
+        "easter_egg_puzzle": state.easter_egg_puzzle,
+        "built_at": round(time.time(), 3),
+        "puzzles": puzzles,
+    }
+
+
+def write(challenge: dict) -> str:
+    """Write an artifact atomically so players never read a half-written file."""
+    path = artifact_path(challenge["date"], challenge["theme"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(challenge, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+    with _lock:
+        _artifacts[(challenge["date"], challenge["theme"])] = challenge
+    return path
@@ -0,0 +1,296 @@
+"""Append-only log of gameplay events, for tuning difficulty and capacity offline.
+
+Request threads call ``emit`` and return: the event is queued on a
+``BatchWriter`` and encoded and appended by its background thread, so
+logging adds no I/O to the request path.  If the disk can't keep up, the
+bounded queue drops events (counted in ``get_stats``) rather than slowing
+players down.
+
+Encoding is newline-delimited JSON, one compact object per line.  Each
+process appends to its own segment in ``EVENT_LOG_DIR`` (default
+``events/``)::
+
+    events-20261019T031500-4242-0000.ndjson      # the segment being written
+    events-20261019T020000-4242-0003.ndjson.gz   # rotated and compressed
+
+A segment is rotated once it reaches ``EVENT_LOG_MAX_BYTES`` (default
+64 MiB) and gzipped by the writer thread (``EVENT_LOG_COMPRESS=0`` keeps it
+plain).  File names sort by the time the segment was opened.  The first
+line of a segment is a header, ``{"schema": "events", "v": 1, "pid", "opened"}``.
+
+Every gameplay event has:
+
+- ``t`` — unix time in seconds (millisecond precision);
+- ``e`` — the event type;
+- ``sid`` — the player's session id;  ``g`` — the game (its start time,
+  unix seconds, so ``(sid, g)`` identifies one game);
+- ``th`` — theme;  ``i`` — puzzle index (0-based);  ``d`` — difficulty
+  level at the time;  ``mode`` — ``solo``, ``party``, ``daily`` or ``custom``.
+
+Event types and their own fields:
+
+- ``start`` — a game began;
+- ``puzzle`` — a puzzle was served.  ``src`` is ``cache`` (a prefetched
+  puzzle, i.e. a cache hit), ``generated`` (a miss, generated on demand),
+  ``party`` or ``daily``.  ``ms`` is the time the player waited for it;
+- ``answer`` — ``ok`` (correct or not), ``n`` (attempts on this puzzle),
+  ``pts`` (points scored, when correct) and ``llm_ms`` (time spent in LLM
+  validation; 0 when the answer was matched locally);
+- ``hint`` — ``n`` (hints used on this puzzle), ``pen`` (seconds of
+  penalty) and ``llm_ms`` (0 for a pre-generated hint);
+- ``reveal`` and ``skip`` — the answer was shown / the puzzle skipped;
+- ``time_up`` and ``victory`` — the game ended.  ``score``, ``solved``
+  (puzzles solved) and ``secs`` (game time including penalties).
+
+Service events have only ``t`` and ``e`` besides their own fields:
+
+- ``slo`` — the worker switched to ``mode`` ``degraded`` or ``normal``
+  (see llm_slo.py); ``p95_ms`` and ``n``, the latency and number of calls
+  that decided it.
+
+``read`` streams events back from a directory for offline analysis, and the
+module is a small CLI::
+
+    python event_log.py events/ --event answer --since 2026-10-19
+    python event_log.py events/ --summary
+"""
+
+import calendar
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Iterable, Iterator, Optional
+
+from batch_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("EVENT_LOG", "1") != "0"
+DIR = os.environ.get(
+    "EVENT_LOG_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "events"),
+)
+MAX_BYTES = int(os.environ.get("EVENT_LOG_MAX_BYTES", str(64 * 1024 * 1024)))
+COMPRESS = os.environ.get("EVENT_LOG_COMPRESS", "1") != "0"
+MAX_PENDING = int(os.environ.get("EVENT_LOG_MAX_PENDING", "100000"))
+SCHEMA_VERSION = 1
+
+
+def emit(event: str, **fields) -> None:
+    """Queue one event.  Never blocks on I/O and never raises."""
+    if not ENABLED:
+        return
+    writer.submit({"t": round(time.time(), 3), "e": event, **fields})
+
+
+# ---------------------------------------------------------------------------
+# Segments (writer thread only)
+# ---------------------------------------------------------------------------
+class _Segment:
+    """The file this process is appending to."""
+
+    def __init__(self, seq: int):
+        os.makedirs(DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        self.path = os.path.join(DIR, f"events-{stamp}-{os.getpid()}-{seq:04d}.ndjson")
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(_encode({"schema": "events", "v": SCHEMA_VERSION,
+                                 "pid": os.getpid(), "opened": round(time.time(), 3)}))
+        self.size = self.file.tell()
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.segment: Optional[_Segment] = None
+        self.seq = 0
+        self.rotated = 0
+
+
+_state = _State()
+
+
+def _encode(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _compress(path: str) -> None:
+    try:
+        with open(path, "rb") as src, gzip.open(f"{path}.gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(f"{path}.gz.tmp", f"{path}.gz")
+        os.remove(path)
+    except OSError as e:
+        # The plain segment is still there and still readable
+        logger.warning("⚠️ [EventLog] Could not compress %s: %s", path, e)
+
+
+def _rotate() -> None:
+    """Close the current segment and compress it.  Caller holds _state.lock."""
+    segment = _state.segment
+    _state.segment = None
+    _state.rotated += 1
+    segment.file.close()
+    if COMPRESS:
+        _compress(segment.path)
+
+
+def _write(events: list[dict]) -> None:
+    data = "".join(_encode(event) for event in events)
+    with _state.lock:
+        if _state.segment is None:
+            _state.segment = _Segment(_state.seq)
+            _state.seq += 1
+        segment = _state.segment
+        segment.file.write(data)
+        # Hand it to the OS so a crash of this process loses nothing already written
+        segment.file.flush()
+        segment.size += len(data.encode("utf-8"))
+        if segment.size >= MAX_BYTES:
+            _rotate()
+
+
+writer = BatchWriter("events", _write, max_batch=2000, interval=1.0, max_pending=MAX_PENDING)
+
+
+def flush() -> None:
+    """Write queued events now (tools, benchmarks and shutdown)."""
+    writer.flush()
+
+
+def get_stats() -> dict:
+    with _state.lock:
+        segment = _state.segment
+        return {
+            "enabled": ENABLED,
+            "segment": segment.path if segment else None,
+            "segment_bytes": segment.size if segment else 0,
+            "rotated": _state.rotated,
+            "writer": writer.get_stats(),
+        }
+
+
+def _reset_after_fork() -> None:
+    # The parent keeps writing its own segment; the child opens its own
+    global _state
+    _state = _State()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ---------------------------------------------------------------------------
+# Reading (offline)
+# ---------------------------------------------------------------------------
+def segments(path: Optional[str] = None) -> list[str]:
+    """Segment files under *path* (default ``EVENT_LOG_DIR``), oldest first, or *path* itself if it's a file."""
+    path = path or DIR
+    if os.path.isfile(path):
+        return [path]
+    names = [n for n in os.listdir(path) if n.startswith("events-") and n.endswith((".ndjson", ".ndjson.gz"))]
+    return [os.path.join(path, n) for n in sorted(names)]
+
+
+def _parse_time(value) -> Optional[float]:
+    """Unix seconds from a number or a UTC ``YYYY-MM-DD[THH:MM:SS]`` string."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    fmt = "%Y-%m-%dT%H:%M:%S" if "T" in value else "%Y-%m-%d"
+    return calendar.timegm(time.strptime(value, fmt))
+
+
+def read(path: Optional[str] = None, events: Optional[Iterable[str]] = None,
+         since=None, until=None) -> Iterator[dict]:
+    """Stream events from every segment under *path*, optionally filtered by type and time.
+
+    Segments are read one line at a time, so memory stays flat however
+    large the log is.  A torn last line (a process killed mid-write) is
+    skipped.
+    """
+    wanted = set(events) if events else None
+    since, until = _parse_time(since), _parse_time(until)
+    for segment in segments(path):
+        opener = gzip.open if segment.endswith(".gz") else open
+        with opener(segment, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if "e" not in event:
+                    continue  # segment header
+                if wanted is not None and event["e"] not in wanted:
+                    continue
+                if (since is not None and event["t"] < since) or (until is not None and event["t"] >= until):
+                    continue
+                yield event
+
+
+def summarize(events: Iterable[dict]) -> dict:
+    """Headline numbers for tuning: per-difficulty solve rates, hint use, cache hit rate, LLM share."""
+    counts = Counter()
+    by_level = defaultdict(Counter)
+    sources = Counter()
+    waits = defaultdict(list)
+    llm_answers = 0
+    for event in events:
+        kind = event["e"]
+        counts[kind] += 1
+        if kind == "answer":
+            level = by_level[event.get("d", 0)]
+            level["answers"] += 1
+            level["correct"] += bool(event.get("ok"))
+            llm_answers += event.get("llm_ms", 0) > 0
+        elif kind in ("hint", "skip", "reveal"):
+            by_level[event.get("d", 0)][kind + "s"] += 1
+        elif kind == "puzzle":
+            sources[event.get("src")] += 1
+            waits[event.get("src")].append(event.get("ms", 0))
+    served = sources["cache"] + sources["generated"]
+    ended = counts["victory"] + counts["time_up"]
+    return {
+        "events": dict(counts),
+        "difficulty": {
+            level: {**stats, "accuracy": round(stats["correct"] / stats["answers"], 3) if stats["answers"] else None}
+            for level, stats in sorted(by_level.items())
+        },
+        "puzzles": {
+            "by_source": dict(sources),
+            "cache_hit_rate": round(sources["cache"] / served, 3) if served else None,
+            "mean_wait_ms": {src: round(sum(v) / len(v), 1) for src, v in waits.items() if v},
+        },
+        "answers_validated_by_llm": round(llm_answers / counts["answer"], 3) if counts["answer"] else None,
+        "time_up_rate": round(counts["time_up"] / ended, 3) if ended else None,
+    }
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream or summarize the gameplay event log.")
+    parser.add_argument("path", nargs="?", default=None, help="log directory or one segment (default: EVENT_LOG_DIR)")
+    parser.add_argument("--event", action="append", help="only this event type (repeatable)")
+    parser.add_argument("--since", help="UTC YYYY-MM-DD[THH:MM:SS]")
+    parser.add_argument("--until", help="UTC YYYY-MM-DD[THH:MM:SS]")
+    parser.add_argument("--summary", action="store_true", help="print aggregate numbers instead of events")
+    args = parser.parse_args()
+
+    stream = read(args.path, args.event, args.since, args.until)
+    if args.summary:
+        print(json.dumps(summarize(stream), indent=2))
+        return
+    try:
+        for event in stream:
+            print(json.dumps(event, ensure_ascii=False, separators=(",", ":")))
+    except BrokenPipeError:
+        pass  # piped into head
+
+
+if __name__ == "__main__":
+    main()
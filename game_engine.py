@@ -3,27 +3,36 @@
 import re
 import time
 import random
+import logging
 from difflib import SequenceMatcher
 from dataclasses import dataclass, field, asdict
 from typing import Optional, List
 
-from ai_client import generate_json, validate_answer, analyze_image
+from ai_client import generate_json, analyze_image
+from llm_governor import LANE_INTERACTIVE
+import llm_slo
+import puzzle_bank
+import request_timing
+import validation_batcher
 from prompts import (
     PUZZLE_GENERATION_SYSTEM,
-    ANSWER_VALIDATION_SYSTEM,
     IMAGE_ANALYSIS_SYSTEM,
     HINT_SYSTEM,
     THEME_DESCRIPTIONS,
     puzzle_generation_prompt,
-    answer_validation_prompt,
     image_analysis_prompt,
     hint_prompt,
 )
 
+logger = logging.getLogger(__name__)
+
 TOTAL_PUZZLES = 5
 ROOM_TIME_SECONDS = 15 * 60  # 15 minutes
 HINT_PENALTY_SECONDS = 60  # 1 minute per hint
 
+# Puzzle fields sent to the browser while the puzzle is unsolved
+PUBLIC_PUZZLE_FIELDS = ("question", "puzzle_type", "difficulty", "hints_used", "is_easter_egg")
+
 
 @dataclass
 class PuzzleState:
@@ -40,10 +49,17 @@ class PuzzleState:
     solve_time: float = 0.0  # seconds to solve
     started_at: float = 0.0
     is_easter_egg: bool = False
+    aliases: List[str] = field(default_factory=list)  # other accepted answers (daily challenges)
 
     def to_dict(self) -> dict:
         return asdict(self)
 
+    def to_public_dict(self) -> dict:
+        """What the client may see before solving: no answer, only the hints already revealed."""
+        public = {name: getattr(self, name) for name in PUBLIC_PUZZLE_FIELDS}
+        public["hints"] = self.hints[:self.hints_used]
+        return public
+
     @classmethod
     def from_dict(cls, data: dict) -> "PuzzleState":
         # Filter to only known fields (handles old sessions)
@@ -67,6 +83,9 @@ class GameState:
     difficulty_level: int = 2  # adaptive difficulty 1-5
     solved_count: int = 0
     easter_egg_puzzle: int = -1  # index of the easter egg puzzle
+    party_code: str = ""  # party room sharing the puzzle sequence (see party.py)
+    party_member: str = ""  # this player's member id in that party
+    daily: str = ""  # date of the daily challenge being played (see daily.py)
 
     def to_dict(self) -> dict:
         return asdict(self)
@@ -107,6 +126,7 @@ class GameState:
 class GameEngine:
     """Manages the escape room game logic."""
 
+    @request_timing.timed("engine.start_game")
     def start_game(self, theme: str, difficulty: int = 2) -> GameState:
         """Initialize a new game session."""
         state = GameState(
@@ -118,8 +138,29 @@ class GameEngine:
         )
         return state
 
+    @request_timing.timed("engine.generate_puzzle")
     def generate_puzzle(self, state: GameState) -> GameState:
-        """Generate the next puzzle using AI."""
+        """Generate the next puzzle using AI, falling back to the puzzle bank if the AI fails.
+
+        In degraded mode (see llm_slo.py) the bank comes first, and the AI
+        only if the bank has nothing left for this player.
+        """
+        if llm_slo.degraded():
+            banked = self.puzzle_from_bank(state)
+            if banked is not None:
+                return banked
+        try:
+            return self._generate_puzzle_ai(state)
+        except Exception as e:
+            banked = self.puzzle_from_bank(state)
+            if banked is None:
+                raise
+            logger.warning("🏦 AI generation failed (%s) — served puzzle %d from the bank",
+                           e, state.current_puzzle_index + 1)
+            return banked
+
+    def _generate_puzzle_ai(self, state: GameState) -> GameState:
+        """Generate the next puzzle with the LLM and bank it for later reuse."""
         previous_puzzles = []
         for p_dict in state.puzzles:
             p = PuzzleState.from_dict(p_dict)
@@ -142,7 +183,8 @@ class GameEngine:
             is_easter_egg=is_egg,
         )
 
-        result = generate_json(PUZZLE_GENERATION_SYSTEM, prompt)
+        result = generate_json(PUZZLE_GENERATION_SYSTEM, prompt, task="puzzle",
+                               defaults={"difficulty": state.difficulty_level})
 
         puzzle = PuzzleState(
             question=result.get("question", ""),
@@ -154,6 +196,7 @@ class GameEngine:
             started_at=time.time(),
             is_easter_egg=is_egg,
         )
+        self._bank_puzzle(state.theme, puzzle)
 
         state.puzzles.append(puzzle.to_dict())
         if puzzle.narrative_text:
@@ -161,6 +204,42 @@ class GameEngine:
 
         return state
 
+    def _bank_puzzle(self, theme: str, puzzle: PuzzleState) -> None:
+        """Keep a freshly generated puzzle in the persistent bank (best effort)."""
+        if theme not in THEME_DESCRIPTIONS or theme == "custom":
+            return
+        try:
+            puzzle_bank.add_puzzle(theme, puzzle.to_dict(), self._normalize(puzzle.answer))
+        except Exception as e:
+            logger.warning("🏦 Could not bank puzzle: %s", e)
+
+    @request_timing.timed("engine.puzzle_from_bank")
+    def puzzle_from_bank(self, state: GameState) -> Optional[GameState]:
+        """Append a banked puzzle the player hasn't seen (by type or answer), or return None."""
+        seen = [PuzzleState.from_dict(p) for p in state.puzzles]
+        try:
+            banked = puzzle_bank.draw_puzzle(
+                state.theme,
+                state.difficulty_level,
+                exclude_types=[p.puzzle_type for p in seen if p.puzzle_type],
+                exclude_answer_keys=[self._normalize(p.answer) for p in seen if p.answer],
+            )
+        except Exception as e:
+            logger.warning("🏦 Puzzle bank unavailable: %s", e)
+            return None
+        if not banked:
+            return None
+
+        puzzle = PuzzleState(
+            **banked,
+            started_at=time.time(),
+            is_easter_egg=(state.current_puzzle_index == state.easter_egg_puzzle),
+        )
+        state.puzzles.append(puzzle.to_dict())
+        if puzzle.narrative_text:
+            state.narrative_log.append(puzzle.narrative_text)
+        return state
+
     @staticmethod
     def _normalize(text: str) -> str:
         """Normalize text for comparison: lowercase, strip, remove articles and punctuation."""
@@ -170,6 +249,7 @@ class GameEngine:
         return re.sub(r"\s+", " ", t).strip()
 
     @staticmethod
+    @request_timing.timed("match")
     def _local_match(expected: str, player: str) -> Optional[bool]:
         """Try to match locally. Returns True/False if confident, None if unsure."""
         norm_exp = GameEngine._normalize(expected)
@@ -195,6 +275,24 @@ class GameEngine:
         # Ambiguous — let the LLM decide
         return None
 
+    @classmethod
+    def _match_any(cls, accepted: List[str], player: str) -> Optional[bool]:
+        """``_local_match`` against every accepted answer: True if any matches, None if any is unsure."""
+        results = [cls._local_match(answer, player) for answer in accepted if answer]
+        if True in results:
+            return True
+        if None in results:
+            return None
+        return False
+
+    @classmethod
+    def _strict_match(cls, accepted: List[str], player: str) -> bool:
+        """Decide an ambiguous answer without the LLM: close enough to any accepted answer."""
+        norm_player = cls._normalize(player)
+        return any(SequenceMatcher(None, cls._normalize(answer), norm_player).ratio() >= 0.6
+                   for answer in accepted if answer)
+
+    @request_timing.timed("engine.check_answer")
     def check_answer(self, state: GameState, player_answer: str) -> tuple[GameState, dict]:
         """Validate a player's answer. Returns (updated_state, result_dict)."""
         puzzle = state.current_puzzle
@@ -208,7 +306,8 @@ class GameEngine:
         puzzle.attempts += 1
 
         # ---------- Fast local matching first ----------
-        local_result = self._local_match(puzzle.answer, player_answer)
+        accepted = [puzzle.answer, *puzzle.aliases]
+        local_result = self._match_any(accepted, player_answer)
 
         if local_result is True:
             is_correct = True
@@ -216,25 +315,22 @@ class GameEngine:
         elif local_result is False:
             is_correct = False
             feedback = "Not quite. Try again!"
+        elif state.daily or llm_slo.degraded():
+            # Daily challenges are checked locally only: the precomputed
+            # aliases are the whole answer key.  So is everything while the
+            # LLM is missing its latency SLO.
+            is_correct = self._strict_match(accepted, player_answer)
+            feedback = "Correct!" if is_correct else "Not quite. Try again!"
         else:
-            # Ambiguous — use AI for flexible validation
+            # Ambiguous — use AI for flexible validation, batched with
+            # other players' ambiguous answers
             try:
-                prompt = answer_validation_prompt(
-                    question=puzzle.question,
-                    expected_answer=puzzle.answer,
-                    player_answer=player_answer,
-                )
-                validation = validate_answer(ANSWER_VALIDATION_SYSTEM, prompt)
+                validation = validation_batcher.validate(puzzle.question, puzzle.answer, player_answer)
                 is_correct = validation.get("correct", False)
                 feedback = validation.get("feedback", "")
             except Exception:
                 # If AI fails, fall back to stricter local match
-                ratio = SequenceMatcher(
-                    None,
-                    self._normalize(puzzle.answer),
-                    self._normalize(player_answer),
-                ).ratio()
-                is_correct = ratio >= 0.6
+                is_correct = self._strict_match(accepted, player_answer)
                 feedback = "Correct!" if is_correct else "Not quite. Try again!"
 
         if is_correct:
@@ -285,6 +381,7 @@ class GameEngine:
                 "feedback": feedback,
             }
 
+    @request_timing.timed("engine.get_hint")
     def get_hint(self, state: GameState) -> tuple[GameState, dict]:
         """Generate a hint for the current puzzle."""
         puzzle = state.current_puzzle
@@ -295,6 +392,22 @@ class GameEngine:
         if puzzle.hints_used < len(puzzle.hints):
             hint_text = puzzle.hints[puzzle.hints_used]
             encouragement = "You've got this! Keep thinking..."
+        elif state.daily:
+            # Daily challenges never call the LLM, and an empty hint costs no time
+            return state, {
+                "hint": "That's every hint for this puzzle.",
+                "encouragement": "Everyone playing today gets the same clues — you've got this!",
+                "hints_used": puzzle.hints_used,
+                "time_penalty": 0,
+            }
+        elif llm_slo.degraded():
+            # The LLM is slow right now: stored hints only, and running out costs nothing
+            return state, {
+                "hint": "That's every hint for this puzzle for now.",
+                "encouragement": "Try again in a little while — or trust your instincts!",
+                "hints_used": puzzle.hints_used,
+                "time_penalty": 0,
+            }
         else:
             prompt = hint_prompt(
                 question=puzzle.question,
@@ -302,7 +415,12 @@ class GameEngine:
                 hints_used=puzzle.hints_used,
                 theme=state.theme,
             )
-            result = generate_json(HINT_SYSTEM, prompt)
+            try:
+                result = generate_json(HINT_SYSTEM, prompt, lane=LANE_INTERACTIVE, task="hint")
+            except Exception as e:
+                # AI busy (or the player is over its LLM quota): a hint from the answer itself
+                logger.warning("💡 AI hint failed (%s) — giving a local hint", e)
+                result = self._local_hint(puzzle)
             hint_text = result.get("hint", "Think about it from a different angle.")
             encouragement = result.get("encouragement", "Don't give up!")
 
@@ -318,6 +436,21 @@ class GameEngine:
             "time_penalty": HINT_PENALTY_SECONDS,
         }
 
+    @staticmethod
+    def _local_hint(puzzle: PuzzleState) -> dict:
+        """Reveal one more letter of the answer (and its length) per hint beyond the pre-generated ones."""
+        answer = puzzle.answer.strip()
+        words = len(answer.split())
+        size = f"{len(answer)} characters" + (f", {words} words" if words > 1 else "")
+        shown = min(len(answer) - 1, puzzle.hints_used - len(puzzle.hints) + 1)
+        if shown < 1:
+            return {"hint": f"The answer has {size}."}
+        return {
+            "hint": f"The answer starts with \"{answer[:shown].upper()}\" ({size}).",
+            "encouragement": "You're close — think it through!",
+        }
+
+    @request_timing.timed("engine.generate_image_puzzle")
     def generate_image_puzzle(self, state: GameState, image) -> GameState:
         """Generate a puzzle based on an uploaded image."""
         prompt = image_analysis_prompt(
@@ -349,6 +482,7 @@ class GameEngine:
 
         return state
 
+    @request_timing.timed("engine.skip_puzzle")
     def skip_puzzle(self, state: GameState) -> tuple:
         """Skip the current puzzle. Returns (state, result_dict) with the answer revealed."""
         puzzle = state.current_puzzle
@@ -389,6 +523,7 @@ class GameEngine:
             state.difficulty_level = max(1, state.difficulty_level - 1)
         return state
 
+    @request_timing.timed("engine.get_score_breakdown")
     def get_score_breakdown(self, state: GameState) -> dict:
         """Get detailed score breakdown for the result screen."""
         puzzle_details = []
@@ -0,0 +1,57 @@
+"""Gunicorn configuration — the production entry point.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Defaults to the ``gthread`` worker: LLM calls block for seconds at a time, so
+each process serves many players on threads that share one pooled AI client
+and the lock-protected puzzle cache.  Everything is overridable from the
+environment:
+
+    WEB_CONCURRENCY        worker processes                 (default 2)
+    GUNICORN_WORKER_CLASS  sync | gthread | gevent          (default gthread)
+    GUNICORN_THREADS       threads per gthread worker       (default 16)
+    GUNICORN_CONNECTIONS   greenlets per gevent worker      (default 200)
+    GUNICORN_BIND          listen address                   (default 0.0.0.0:80)
+    GUNICORN_TIMEOUT       worker timeout in seconds        (default 120)
+    GUNICORN_PRELOAD       import the app before forking    (default 1)
+
+``gevent`` needs the gevent package installed (``uv add gevent``).  Keep
+``LLM_MAX_CONNECTIONS`` at or above threads/connections per worker so the
+client pool is never the bottleneck.
+
+With ``preload_app`` the master imports the app and warms shared read-only
+data (theme tables, compiled templates) once; workers inherit it
+copy-on-write and boot in milliseconds.  Anything per-process — the LLM
+client and its connection pool, puzzle cache threads, SQLite connections —
+is created lazily after fork (modules reset their state with
+``os.register_at_fork``).  Preloading also gives every worker the same
+generated ``FLASK_SECRET_KEY`` when none is set.  Set ``GUNICORN_PRELOAD=0``
+if you rely on ``kill -HUP`` reloading application code.
+"""
+
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:80")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+worker_connections = int(os.environ.get("GUNICORN_CONNECTIONS", "200"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded, before any worker is forked."""
+    if server.cfg.preload_app:
+        import app as application
+
+        application.warm_up()
+
+
+def post_fork(server, worker):
+    server.log.info("👷 Worker %s forked", worker.pid)
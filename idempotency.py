@@ -0,0 +1,192 @@
+"""Idempotency keys for the state-changing game endpoints.
+
+A double-click or a client retry of ``/answer``, ``/hint``, ``/skip`` or
+``/start`` used to run ``check_answer``, ``get_hint`` or ``generate_puzzle``
+again.  That could mean another LLM call and another last-writer-wins
+``save_game_state``.  ``game.js`` now sends an ``Idempotency-Key`` header,
+one per user action and reused when that action is retried.  Views decorated
+with ``idempotent`` do the work once per key:
+
+- the first request with a key runs the view, and its response is kept for
+  ``IDEMPOTENCY_TTL_SECONDS`` (default 120);
+- a duplicate that arrives after it finished gets the stored response at
+  once, marked with ``Idempotent-Replayed: true``;
+- a duplicate that arrives while it is still running waits for it (up to
+  ``IDEMPOTENCY_WAIT_SECONDS``) instead of repeating the work.
+
+Sessions are signed cookies, so the stored response carries the session
+the first request ended with.  A replay writes that session back only if the
+duplicate's session is still the one the first request started from: a
+client whose first response was lost in transit gets the game state that
+goes with the body it receives.  A late retry from a client that has moved
+on since (another answer, a new game) gets the stored body and keeps its
+session.  Rewriting that session would roll the game back.
+
+Keys are scoped to the player's session and the endpoint.  Requests without
+a key run as before.  A 5xx response isn't stored, so a retry after a
+server error does the work again.  The cache is per process: a duplicate
+routed to another worker runs again, as every request did before.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from flask import Response, current_app, jsonify, request, session
+
+import request_timing
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "120"))
+WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "60"))
+MAX_ENTRIES = int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+MAX_KEY_LENGTH = 128
+
+# Set by the session save on each response; a replay writes its own session instead
+_SKIP_HEADERS = {"set-cookie", "content-length"}
+
+
+class _Entry:
+    __slots__ = ("created", "before", "done", "body", "status", "headers", "session")
+
+    def __init__(self, before: str):
+        self.created = time.monotonic()
+        self.before = before     # fingerprint of the session the first request started from
+        self.done = threading.Event()
+        self.body: Optional[bytes] = None
+        self.status = 0
+        self.headers: list = []
+        self.session: dict = {}
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self.stats = {"first": 0, "replayed": 0, "waited": 0, "timeouts": 0, "not_stored": 0,
+                      "session_kept": 0}
+
+
+_state = _State()
+
+
+def _expire(now: float) -> None:
+    """Drop finished entries past their TTL (or over MAX_ENTRIES), oldest first.  Caller holds _state.lock."""
+    entries = _state.entries
+    doomed = []
+    for key, entry in entries.items():
+        if not entry.done.is_set():
+            continue  # still running; its duplicates are waiting on it
+        if now - entry.created < TTL_SECONDS and len(entries) - len(doomed) <= MAX_ENTRIES:
+            break
+        doomed.append(key)
+    for key in doomed:
+        del entries[key]
+
+
+def _fingerprint() -> str:
+    return hashlib.sha256(json.dumps(dict(session), sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _replay(entry: _Entry, fingerprint: str) -> Response:
+    if fingerprint == entry.before:
+        session.clear()
+        session.update(entry.session)
+    else:
+        # The client has moved on since: the stored session would undo that
+        with _state.lock:
+            _state.stats["session_kept"] += 1
+    response = Response(entry.body, status=entry.status, headers=entry.headers)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(scope: Callable[[], str]) -> Callable:
+    """Run the view once per ``Idempotency-Key``; *scope()* names the client (its session id)."""
+
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER, "")
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return view(*args, **kwargs)
+            cache_key = (scope(), request.endpoint, key)
+            fingerprint = _fingerprint()
+            with _state.lock:
+                _expire(time.monotonic())
+                entry = _state.entries.get(cache_key)
+                first = entry is None
+                if first:
+                    entry = _state.entries[cache_key] = _Entry(fingerprint)
+                    _state.stats["first"] += 1
+                elif entry.done.is_set():
+                    _state.stats["replayed"] += 1
+                else:
+                    _state.stats["waited"] += 1
+
+            if not first:
+                with request_timing.phase("idempotency_wait"):
+                    finished = entry.done.wait(WAIT_SECONDS)
+                if entry.body is not None:
+                    logger.info("🔁 Replaying %s for a duplicate request", request.endpoint)
+                    return _replay(entry, fingerprint)
+                if not finished:
+                    with _state.lock:
+                        _state.stats["timeouts"] += 1
+                    response = jsonify({"error": "This request is still being processed — try again shortly."})
+                    response.status_code = 409
+                    response.headers["Retry-After"] = "1"
+                    return response
+                # The first attempt failed and stored nothing: this one does the work
+                return view(*args, **kwargs)
+
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except BaseException:
+                with _state.lock:
+                    _state.entries.pop(cache_key, None)
+                entry.done.set()
+                raise
+            if response.status_code >= 500 or response.is_streamed:
+                with _state.lock:
+                    _state.entries.pop(cache_key, None)
+                    _state.stats["not_stored"] += 1
+            else:
+                entry.body = response.get_data()
+                entry.status = response.status_code
+                entry.headers = [(k, v) for k, v in response.headers.items() if k.lower() not in _SKIP_HEADERS]
+                entry.session = dict(session)
+            entry.done.set()
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def get_stats() -> dict:
+    with _state.lock:
+        return {**_state.stats, "entries": len(_state.entries)}
+
+
+def reset_stats() -> None:
+    with _state.lock:
+        for key in _state.stats:
+            _state.stats[key] = 0
+
+
+def _reset_after_fork() -> None:
+    global _state
+    _state = _State()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,352 @@
+"""Leaderboards: every finished game, ranked per theme and globally, all-time and per day.
+
+Boards (``board_key``):
+
+- ``all`` — every game;  ``theme:<theme>`` — one theme;
+- ``day:<YYYY-MM-DD>`` — games finished that day (UTC);
+  ``day:<YYYY-MM-DD>:theme:<theme>`` — one theme that day.
+
+Storage is SQLite (``LEADERBOARD_DB_PATH``, default ``leaderboard.sqlite3``):
+
+- ``games`` — one row per finished game, with an index per board shape on
+  ``score DESC, total_time`` so a board's top-K is an index range scan;
+- ``score_counts`` — a histogram of scores per board, updated in the same
+  transaction as the insert.  Scores are small bounded integers, so even
+  with millions of games a board has at most ``MAX_SCORE`` rows here.
+
+Writes never happen on the request path: ``record`` queues the game on a
+``BatchWriter`` and returns.  Reads come from a per-process view of each
+board that is maintained incrementally — a Fenwick tree over the score
+histogram (rank of any score in O(log MAX_SCORE)) and the top
+``TOP_SIZE`` entries.  At most every ``LEADERBOARD_CACHE_SECONDS`` (or right
+after this process wrote) the view reads only the games added since its
+watermark and folds them in, so other workers' games appear within that
+interval without ever re-reading a board.  The result page passes the
+player's own game to ``rank``, which counts it in the total until it is
+folded in (its rank doesn't depend on it: ties share a rank).
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import insort
+from collections import OrderedDict
+from typing import Optional
+
+from batch_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get(
+    "LEADERBOARD_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "leaderboard.sqlite3"),
+)
+CACHE_SECONDS = float(os.environ.get("LEADERBOARD_CACHE_SECONDS", "2"))
+TOP_SIZE = 100
+MAX_BOARDS = 128          # board views kept in memory per process (LRU, ~80 KB each)
+MAX_SCORE = 9999          # best possible game is 9000; clamped to 0..MAX_SCORE for ranking
+# More new games than this since the last refresh: drop the views and reload
+# them from the histogram instead of replaying every row
+REPLAY_LIMIT = 50_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id          INTEGER PRIMARY KEY,
+    player      TEXT    NOT NULL,
+    name        TEXT    NOT NULL,
+    theme       TEXT    NOT NULL,
+    day         TEXT    NOT NULL,
+    score       INTEGER NOT NULL,
+    solved      INTEGER NOT NULL,
+    total_time  REAL    NOT NULL,
+    victory     INTEGER NOT NULL,
+    recorded_at REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_games_all ON games (score DESC, total_time);
+CREATE INDEX IF NOT EXISTS idx_games_theme ON games (theme, score DESC, total_time);
+CREATE INDEX IF NOT EXISTS idx_games_day ON games (day, score DESC, total_time);
+CREATE INDEX IF NOT EXISTS idx_games_day_theme ON games (day, theme, score DESC, total_time);
+CREATE INDEX IF NOT EXISTS idx_games_player ON games (player, recorded_at);
+CREATE TABLE IF NOT EXISTS score_counts (
+    board   TEXT    NOT NULL,
+    score   INTEGER NOT NULL,
+    n       INTEGER NOT NULL,
+    PRIMARY KEY (board, score)
+) WITHOUT ROWID;
+"""
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Per-thread (and per-process, so forks never share a handle) connection."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    conn = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+def today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def board_key(theme: Optional[str] = None, day: Optional[str] = None) -> str:
+    if day and theme:
+        return f"day:{day}:theme:{theme}"
+    if day:
+        return f"day:{day}"
+    if theme:
+        return f"theme:{theme}"
+    return "all"
+
+
+def _boards_for(theme: str, day: str) -> tuple[str, ...]:
+    return (board_key(), board_key(theme), board_key(day=day), board_key(theme, day))
+
+
+def _board_filter(key: str) -> tuple[str, list]:
+    """SQL WHERE clause (matching one of the games indexes) for a board key."""
+    parts = key.split(":")
+    if parts[0] == "all":
+        return "1", []
+    if parts[0] == "theme":
+        return "theme = ?", [parts[1]]
+    if len(parts) == 2:
+        return "day = ?", [parts[1]]
+    return "day = ? AND theme = ?", [parts[1], parts[3]]
+
+
+# ---------------------------------------------------------------------------
+# Writes (batched, off the request path)
+# ---------------------------------------------------------------------------
+_INSERT = """
+INSERT INTO games (player, name, theme, day, score, solved, total_time, victory, recorded_at)
+VALUES (:player, :name, :theme, :day, :score, :solved, :total_time, :victory, :recorded_at)
+"""
+_COUNT = """
+INSERT INTO score_counts (board, score, n) VALUES (?, ?, 1)
+ON CONFLICT (board, score) DO UPDATE SET n = n + 1
+"""
+
+
+def _write(entries: list[dict]) -> None:
+    conn = _connect()
+    counts = [(board, _clamp(e["score"])) for e in entries for board in _boards_for(e["theme"], e["day"])]
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(_INSERT, entries)
+        conn.executemany(_COUNT, counts)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    # Our own games show up on the next read, not after the cache interval
+    _views.dirty = True
+
+
+writer = BatchWriter("leaderboard", _write, max_batch=1000, interval=0.5)
+
+
+def record(player: str, name: str, breakdown: dict) -> float:
+    """Queue a finished game (a ``GameEngine.get_score_breakdown`` result) for the leaderboards.
+
+    Returns its ``recorded_at``, which with *player* identifies the game to ``rank``.
+    """
+    recorded_at = time.time()
+    writer.submit({
+        "player": player,
+        "name": name,
+        "theme": breakdown["theme"],
+        "day": today(),
+        "score": int(breakdown["total_score"]),
+        "solved": int(breakdown["puzzles_solved"]),
+        "total_time": float(breakdown["total_time"]),
+        "victory": int(bool(breakdown["victory"])),
+        "recorded_at": recorded_at,
+    })
+    return recorded_at
+
+
+# ---------------------------------------------------------------------------
+# Per-process views
+# ---------------------------------------------------------------------------
+def _clamp(score: int) -> int:
+    return max(0, min(MAX_SCORE, int(score)))
+
+
+class Fenwick:
+    """Counts per score with O(log n) prefix sums."""
+
+    def __init__(self, size: int):
+        self.tree = array("q", bytes(8 * (size + 1)))
+        self.total = 0
+
+    def add(self, index: int, n: int = 1) -> None:
+        self.total += n
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += n
+            i += i & -i
+
+    def prefix(self, index: int) -> int:
+        """How many values are <= *index*."""
+        i, s = index + 1, 0
+        while i > 0:
+            s += self.tree[i]
+            i -= i & -i
+        return s
+
+
+class _Board:
+    """One board as seen by this process: score histogram and top entries."""
+
+    def __init__(self, key: str, watermark: int):
+        self.key = key
+        self.watermark = watermark   # highest games.id folded in
+        self.counts = Fenwick(MAX_SCORE + 1)
+        self.top: list[tuple] = []   # (-score, total_time, id, entry), best first
+
+    def add(self, row: dict) -> None:
+        self.counts.add(_clamp(row["score"]))
+        if len(self.top) < TOP_SIZE or (-row["score"], row["total_time"], row["id"]) < self.top[-1][:3]:
+            insort(self.top, (-row["score"], row["total_time"], row["id"], row))
+            del self.top[TOP_SIZE:]
+
+    def rank(self, score: int) -> int:
+        """1 + games with a strictly higher score (ties share a rank)."""
+        return 1 + self.counts.total - self.counts.prefix(_clamp(score))
+
+
+class _Views:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.boards: OrderedDict[str, _Board] = OrderedDict()
+        self.refreshed_at = 0.0
+        self.dirty = False
+        self.stats = {"loads": 0, "refreshes": 0, "folded": 0, "resets": 0}
+
+
+_views = _Views()
+
+_COLUMNS = "id, name, theme, day, score, solved, total_time, victory"
+
+
+def _load(conn: sqlite3.Connection, key: str) -> _Board:
+    """Build a board from its histogram and top-K index scan, at one consistent watermark."""
+    where, params = _board_filter(key)
+    conn.execute("BEGIN")
+    try:
+        watermark = conn.execute("SELECT COALESCE(MAX(id), 0) FROM games").fetchone()[0]
+        board = _Board(key, watermark)
+        for score, n in conn.execute("SELECT score, n FROM score_counts WHERE board = ?", (key,)):
+            board.counts.add(score, n)
+        rows = conn.execute(
+            f"SELECT {_COLUMNS} FROM games WHERE {where} AND id <= ? "
+            "ORDER BY score DESC, total_time, id LIMIT ?",
+            params + [watermark, TOP_SIZE],
+        ).fetchall()
+    finally:
+        conn.execute("COMMIT")
+    board.top = [(-r["score"], r["total_time"], r["id"], dict(r)) for r in rows]
+    return board
+
+
+def _refresh(conn: sqlite3.Connection) -> None:
+    """Fold games added since the views' watermarks into them.  Caller holds _views.lock."""
+    now = time.time()
+    if not _views.boards or (not _views.dirty and now - _views.refreshed_at < CACHE_SECONDS):
+        return
+    _views.dirty = False
+    _views.refreshed_at = now
+    _views.stats["refreshes"] += 1
+    since = min(board.watermark for board in _views.boards.values())
+    latest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM games").fetchone()[0]
+    if latest - since > REPLAY_LIMIT:
+        _views.boards.clear()
+        _views.stats["resets"] += 1
+        return
+    rows = conn.execute(f"SELECT {_COLUMNS} FROM games WHERE id > ? AND id <= ? ORDER BY id",
+                        (since, latest)).fetchall()
+    for r in rows:
+        row = dict(r)
+        for key in _boards_for(row["theme"], row["day"]):
+            board = _views.boards.get(key)
+            if board is not None and board.watermark < row["id"]:
+                board.add(row)
+    for board in _views.boards.values():
+        board.watermark = max(board.watermark, latest)
+    _views.stats["folded"] += len(rows)
+
+
+def _board(key: str) -> _Board:
+    conn = _connect()
+    with _views.lock:
+        _refresh(conn)
+        board = _views.boards.get(key)
+        if board is None:
+            board = _load(conn, key)
+            _views.boards[key] = board
+            _views.stats["loads"] += 1
+            while len(_views.boards) > MAX_BOARDS:
+                _views.boards.popitem(last=False)
+        else:
+            _views.boards.move_to_end(key)
+        return board
+
+
+def top(key: str, limit: int = 10) -> list[dict]:
+    """The best *limit* games on a board (at most TOP_SIZE), best first, with their rank."""
+    board = _board(key)
+    with _views.lock:
+        entries = [entry for _, _, _, entry in board.top[:max(0, min(limit, TOP_SIZE))]]
+        return [{**entry, "rank": board.rank(entry["score"])} for entry in entries]
+
+
+def rank(key: str, score: int, game: Optional[tuple[str, float]] = None) -> dict:
+    """Where *score* places on a board: ``{"rank", "total"}``.
+
+    *game* is the ``(player, recorded_at)`` of the game that scored it.  Until
+    that game is folded into the view (it may still be queued on some worker)
+    the total counts it anyway.
+    """
+    board = _board(key)
+    game_id = None
+    if game is not None:
+        # Looked up after the refresh: a game written since then is above the watermark
+        row = _connect().execute("SELECT id FROM games WHERE player = ? AND recorded_at = ?", game).fetchone()
+        game_id = row[0] if row else None
+    with _views.lock:
+        total = board.counts.total
+        if game is not None and (game_id is None or game_id > board.watermark):
+            total += 1
+        return {"rank": board.rank(score), "total": total}
+
+
+def flush() -> None:
+    """Write queued games now and fold them into the next read (tools and benchmarks)."""
+    writer.flush()
+    _views.dirty = True
+
+
+def get_stats() -> dict:
+    with _views.lock:
+        return {**_views.stats, "boards": len(_views.boards), "writer": writer.get_stats()}
+
+
+def _reset_after_fork() -> None:
+    # Views are cheap to rebuild, and the parent's lock may have been held mid-fork
+    global _views
+    _views = _Views()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,240 @@
+"""Record/replay cassette for LLM traffic.
+
+Sits at the ``ai_client._call_with_retry`` boundary, so it covers every
+call the engine makes — ``generate_json``, ``generate_text``,
+``validate_answer`` and ``analyze_image`` — including schema re-asks.
+
+    LLM_CASSETTE_MODE=record LLM_CASSETTE_PATH=run.jsonl.gz python -m benchmarks.bench_games
+    LLM_CASSETTE_MODE=replay LLM_CASSETTE_PATH=run.jsonl.gz python -m benchmarks.bench_games --replay
+
+Modes (``LLM_CASSETTE_MODE``):
+
+- ``off`` (default): calls go to the provider as usual;
+- ``record``: calls go to the provider and each successful reply is
+  appended to ``LLM_CASSETTE_PATH``;
+- ``replay``: no provider, no API key, no governor — replies are served from
+  the cassette.
+
+The cassette is gzip-compressed JSONL, one record per reply: a request
+fingerprint (SHA-256 of model, temperature and messages — images only
+enter the hash, so records stay small), a loose key (model plus system
+prompt) and the reply content, answering model, usage and provider latency.
+Several processes can record at once if the path contains ``{pid}``. Replay
+accepts a glob (``run-*.jsonl.gz``).
+
+Replay is deterministic. Replies for a fingerprint are served in recorded
+order, cycling when they run out. A request that was never recorded exactly
+falls back to replies recorded for the same model and system prompt
+(``loose``). Prompts that embed per-game randomness still replay; anything
+else raises ``CassetteMiss``. ``LLM_CASSETTE_LATENCY_SCALE`` replays the
+recorded provider latency: 0 (default) is full speed, 1 is the original
+timing.
+"""
+
+import atexit
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MODE = os.environ.get("LLM_CASSETTE_MODE", "off").lower()
+PATH = os.environ.get("LLM_CASSETTE_PATH", "llm_cassette.jsonl.gz")
+LATENCY_SCALE = float(os.environ.get("LLM_CASSETTE_LATENCY_SCALE", "0"))
+
+MODES = ("off", "record", "replay")
+if MODE not in MODES:
+    logger.warning("📼 Unknown LLM_CASSETTE_MODE %r — cassette off", MODE)
+    MODE = "off"
+
+
+class CassetteMiss(RuntimeError):
+    """Replay was asked for a request the cassette has no reply for."""
+
+
+_lock = threading.Lock()
+_writer = None                   # open gzip stream while recording
+_writer_path: Optional[str] = None
+_index: Optional[dict] = None    # replay: {"exact": {fp: [rec]}, "loose": {key: [rec]}}
+_cursors: dict = defaultdict(int)
+_stats = {"recorded": 0, "replayed": 0, "loose": 0, "misses": 0}
+
+
+def configure(mode: str, path: Optional[str] = None, latency_scale: Optional[float] = None) -> None:
+    """Switch mode/path at runtime (benchmarks); resets any open recording and loaded cassette."""
+    global MODE, PATH, LATENCY_SCALE, _index
+    if mode not in MODES:
+        raise ValueError(f"LLM_CASSETTE_MODE must be one of {MODES}, not {mode!r}")
+    close()
+    with _lock:
+        MODE = mode
+        if path is not None:
+            PATH = path
+        if latency_scale is not None:
+            LATENCY_SCALE = latency_scale
+        _index = None
+        _cursors.clear()
+        for key in _stats:
+            _stats[key] = 0
+
+
+def recording() -> bool:
+    return MODE == "record"
+
+
+def replaying() -> bool:
+    return MODE == "replay"
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:32]
+
+
+def fingerprint(model: str, messages: list, temperature: float) -> str:
+    """Stable identity of a request: same model, temperature and messages → same fingerprint."""
+    return _digest([model, round(float(temperature), 3), messages])
+
+
+def loose_key(model: str, messages: list) -> str:
+    """Coarser identity for replay fallback: model plus system prompt."""
+    system = next((m.get("content") for m in messages if m.get("role") == "system"), "")
+    return _digest([model, system])
+
+
+# ---------------------------------------------------------------------------
+# Record
+# ---------------------------------------------------------------------------
+def _usage(response) -> Optional[dict]:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    fields = ("prompt_tokens", "completion_tokens", "total_tokens")
+    return {f: getattr(usage, f, None) for f in fields if getattr(usage, f, None) is not None}
+
+
+def record(model: str, messages: list, temperature: float, response, latency: float) -> None:
+    """Append one successful reply to the cassette."""
+    global _writer, _writer_path
+    entry = {
+        "fp": fingerprint(model, messages, temperature),
+        "loose": loose_key(model, messages),
+        "model": model,
+        "answered_by": getattr(response, "model", None) or model,
+        "content": response.choices[0].message.content,
+        "usage": _usage(response),
+        "latency": round(latency, 4),
+        "at": round(time.time(), 3),
+    }
+    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+    with _lock:
+        if _writer is None:
+            _writer_path = PATH.format(pid=os.getpid())
+            os.makedirs(os.path.dirname(os.path.abspath(_writer_path)), exist_ok=True)
+            # Appending starts a new gzip member; concatenated members read as one stream
+            _writer = gzip.open(_writer_path, "ab")
+        _writer.write(line)
+        # Sync-flush so a crash loses at most the record being written
+        _writer.flush(zlib.Z_SYNC_FLUSH)
+        _stats["recorded"] += 1
+
+
+def close() -> None:
+    """Finish the recording (writes the gzip trailer)."""
+    global _writer
+    with _lock:
+        if _writer is not None:
+            _writer.close()
+            logger.info("📼 Recorded %d LLM replies to %s", _stats["recorded"], _writer_path)
+            _writer = None
+
+
+atexit.register(close)
+
+
+def _reset_after_fork() -> None:
+    # The parent's stream belongs to the parent; a child opens its own
+    global _writer, _lock
+    _writer = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+def read(path: str) -> list[dict]:
+    """Records from one cassette file, tolerating a tail cut off by a crash."""
+    records = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+        except (EOFError, json.JSONDecodeError):
+            logger.warning("📼 Cassette %s ends mid-record — using the %d complete ones", path, len(records))
+    return records
+
+
+def _load() -> dict:
+    """Build the replay index.  Caller must hold _lock."""
+    global _index
+    if _index is None:
+        paths = sorted(glob.glob(PATH.format(pid="*"))) or [PATH]
+        index = {"exact": defaultdict(list), "loose": defaultdict(list)}
+        total = 0
+        for path in paths:
+            for rec in read(path):
+                index["exact"][rec["fp"]].append(rec)
+                index["loose"][rec["loose"]].append(rec)
+                total += 1
+        logger.info("📼 Loaded %d LLM replies from %s", total, ", ".join(paths))
+        _index = index
+    return _index
+
+
+def _next(bucket: str, key: str, records: list) -> dict:
+    """The next record for *key*, cycling through them in recorded order.  Caller holds _lock."""
+    cursor = (bucket, key)
+    rec = records[_cursors[cursor] % len(records)]
+    _cursors[cursor] += 1
+    return rec
+
+
+def replay(model: str, messages: list, temperature: float):
+    """A recorded reply shaped like a chat completion (``.choices[0].message.content``)."""
+    fp = fingerprint(model, messages, temperature)
+    with _lock:
+        index = _load()
+        if fp in index["exact"]:
+            rec = _next("exact", fp, index["exact"][fp])
+        else:
+            key = loose_key(model, messages)
+            if key not in index["loose"]:
+                _stats["misses"] += 1
+                raise CassetteMiss(f"No recorded reply for {model} request {fp} in {PATH}")
+            rec = _next("loose", key, index["loose"][key])
+            _stats["loose"] += 1
+        _stats["replayed"] += 1
+    if LATENCY_SCALE > 0:
+        time.sleep(rec.get("latency", 0) * LATENCY_SCALE)
+    usage = SimpleNamespace(**(rec.get("usage") or {}))
+    message = SimpleNamespace(role="assistant", content=rec["content"])
+    return SimpleNamespace(model=rec.get("answered_by", model), usage=usage,
+                           choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
+
+
+def get_stats() -> dict:
+    with _lock:
+        return {"mode": MODE, "path": PATH, **_stats}
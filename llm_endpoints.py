@@ -0,0 +1,228 @@
+"""Load balancing across several OpenAI-compatible endpoints.
+
+``API_ENDPOINTS`` lists the gateways, comma-separated.  Each is a base URL
+followed by optional ``;key=value`` settings::
+
+    API_ENDPOINTS="https://gw1.example.com/v1;weight=2, https://gw2.example.com/v1;key_env=GW2_KEY"
+
+- ``key`` — the API key, or ``key_env`` — the variable holding it (default
+  ``API_KEY``);
+- ``weight`` — relative capacity (default 1);
+- ``name`` — label for logs and stats (default the URL's host).
+
+Without ``API_ENDPOINTS`` there is one endpoint, ``API_BASE_URL`` with
+``API_KEY``, as before.
+
+Each call goes to the endpoint with the fewest outstanding requests
+relative to its weight, ties broken at random.  Each endpoint has its own
+client and connection pool, built on first use.  Endpoints are ejected
+passively: ``LLM_EJECT_FAILURES`` (default 3) failures in a row (5xx,
+connection errors, timeouts) take an endpoint out of rotation for
+``LLM_EJECT_SECONDS`` (default 30), doubling on each ejection that follows
+without a success in between, up to ``LLM_EJECT_MAX_SECONDS`` (default 300).
+After that it gets traffic again, and one more failure ejects it again.  If
+every endpoint is ejected, the one due back first is used rather than none.
+Rate limiting (429) is the gateway being busy, not broken, and never ejects.
+
+Outstanding counts and ejections are per process.  Rate limits stay per
+model in ``llm_governor``: raise them to the combined capacity of the
+endpoints.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, Optional
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+EJECT_FAILURES = int(os.environ.get("LLM_EJECT_FAILURES", "3"))
+EJECT_SECONDS = float(os.environ.get("LLM_EJECT_SECONDS", "30"))
+EJECT_MAX_SECONDS = float(os.environ.get("LLM_EJECT_MAX_SECONDS", "300"))
+
+
+class Endpoint:
+    """One OpenAI-compatible gateway: its client and its health.  Counters are guarded by the pool's lock."""
+
+    def __init__(self, url: str, key: str, weight: float = 1.0, name: Optional[str] = None):
+        self.url = url
+        self.key = key
+        self.weight = weight
+        self.name = name or urlparse(url).netloc or url
+        self.outstanding = 0
+        self.failures = 0           # in a row
+        self.ejections = 0          # in a row, for the backoff
+        self.ejected_until = 0.0
+        self.stats = {"calls": 0, "ok": 0, "failed": 0, "ejected": 0}
+        self._client: "OpenAI | None" = None
+        self._client_lock = threading.Lock()
+
+    def client(self, factory: Callable[..., "OpenAI"], max_retries: int) -> "OpenAI":
+        """This endpoint's client and connection pool, created with *factory* on first use."""
+        if self._client is not None:
+            return self._client
+        with self._client_lock:
+            if self._client is None:
+                self._client = factory(self.url, self.key, max_retries)
+        return self._client
+
+
+def _endpoint_failure(error: Exception) -> bool:
+    """Whether *error* says the endpoint is unhealthy: a 5xx, a timeout or no connection."""
+    from openai import APIConnectionError  # loaded with the client
+
+    status = getattr(error, "status_code", None)
+    return status >= 500 if isinstance(status, int) else isinstance(error, APIConnectionError)
+
+
+def parse(spec: str, default_key: Optional[str]) -> list[Endpoint]:
+    """Endpoints from an ``API_ENDPOINTS`` value (see the module docstring)."""
+    endpoints = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        url, *options = [field.strip() for field in item.split(";")]
+        settings = dict(option.partition("=")[::2] for option in options if option)
+        key = settings.get("key") or (os.environ.get(settings["key_env"]) if "key_env" in settings else default_key)
+        if not key:
+            raise RuntimeError(f"No API key for endpoint {url} (set key=, key_env= or API_KEY)")
+        endpoints.append(Endpoint(url, key, float(settings.get("weight", 1)), settings.get("name")))
+    if not endpoints:
+        raise RuntimeError("API_ENDPOINTS lists no endpoints")
+    return endpoints
+
+
+class Pool:
+    """The endpoints calls are spread over."""
+
+    def __init__(self, endpoints: list[Endpoint], factory: Callable[..., "OpenAI"]):
+        self.endpoints = endpoints
+        self.factory = factory
+        self.lock = threading.Lock()
+        # Failover is ours when there is somewhere else to go; with one
+        # endpoint the openai client keeps retrying it as it always has
+        self.max_retries = 0 if len(endpoints) > 1 else 2
+
+    def pick(self, exclude: Optional[Endpoint] = None) -> Endpoint:
+        """Reserve the least-loaded healthy endpoint (not *exclude*, if there's a choice).
+
+        Pair with ``release``.
+        """
+        now = time.monotonic()
+        with self.lock:
+            healthy = [e for e in self.endpoints if e.ejected_until <= now]
+            candidates = [e for e in healthy if e is not exclude] or healthy
+            if candidates:
+                best = min((e.outstanding + 1) / e.weight for e in candidates)
+                endpoint = random.choice([e for e in candidates if (e.outstanding + 1) / e.weight == best])
+            else:
+                endpoint = min(self.endpoints, key=lambda e: e.ejected_until)
+            endpoint.outstanding += 1
+            endpoint.stats["calls"] += 1
+            return endpoint
+
+    def client(self, endpoint: Endpoint) -> "OpenAI":
+        return endpoint.client(self.factory, self.max_retries)
+
+    def release(self, endpoint: Endpoint, ok: Optional[bool]) -> None:
+        """Finish a call: *ok* True (success), False (endpoint failure) or None (neither, e.g. a 429)."""
+        with self.lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.stats["ok"] += 1
+                endpoint.failures = endpoint.ejections = 0
+                return
+            if ok is None:
+                return
+            endpoint.stats["failed"] += 1
+            if endpoint.ejected_until > time.monotonic():
+                return  # in flight when it was ejected: already accounted for
+            endpoint.failures += 1
+            # Back in rotation after an ejection: one failure is enough to go again
+            if endpoint.failures < EJECT_FAILURES and not endpoint.ejections:
+                return
+            seconds = min(EJECT_MAX_SECONDS, EJECT_SECONDS * 2 ** endpoint.ejections)
+            endpoint.ejections += 1
+            endpoint.failures = 0
+            endpoint.ejected_until = time.monotonic() + seconds
+            endpoint.stats["ejected"] += 1
+        logger.warning("⛔ Endpoint %s ejected for %.0fs after repeated failures", endpoint.name, seconds)
+
+    @contextmanager
+    def use(self, exclude: Optional[Endpoint] = None) -> Iterator[Endpoint]:
+        """``pick`` an endpoint for one call and ``release`` it with the call's outcome."""
+        endpoint = self.pick(exclude)
+        ok = None
+        try:
+            yield endpoint
+            ok = True
+        except Exception as e:
+            ok = False if _endpoint_failure(e) else None
+            raise
+        finally:
+            self.release(endpoint, ok)
+
+    def has_alternative(self, endpoint: Endpoint) -> bool:
+        """Whether another endpoint is in rotation to fail over to."""
+        now = time.monotonic()
+        with self.lock:
+            return any(e is not endpoint and e.ejected_until <= now for e in self.endpoints)
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            return {
+                e.name: {**e.stats, "weight": e.weight, "outstanding": e.outstanding,
+                         "ejected_for": round(max(0.0, e.ejected_until - now), 1)}
+                for e in self.endpoints
+            }
+
+
+_pool: Optional[Pool] = None
+_pool_lock = threading.Lock()
+
+
+def pool(default_url: str, factory: Callable[..., "OpenAI"]) -> Pool:
+    """The process-wide pool, configured from the environment on first use.
+
+    *default_url* is the endpoint when ``API_ENDPOINTS`` isn't set;
+    *factory(url, key, max_retries)* builds an endpoint's client.
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            default_key = os.environ.get("API_KEY")
+            spec = os.environ.get("API_ENDPOINTS", "").strip()
+            if spec:
+                endpoints = parse(spec, default_key)
+            else:
+                if not default_key:
+                    raise RuntimeError("API_KEY environment variable is not set")
+                endpoints = [Endpoint(default_url, default_key)]
+            _pool = Pool(endpoints, factory)
+            if len(endpoints) > 1:
+                logger.info("🔀 Balancing LLM calls over %s", ", ".join(
+                    f"{e.name} (weight {e.weight:g})" for e in endpoints))
+    return _pool
+
+
+def get_stats() -> dict:
+    return _pool.get_stats() if _pool is not None else {}
+
+
+def _reset_after_fork() -> None:
+    """Drop the parent's pool in a forked child — its clients' sockets and locks are not ours."""
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
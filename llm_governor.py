@@ -0,0 +1,487 @@
+"""Outbound LLM concurrency governor shared across gunicorn workers.
+
+``flask_limiter`` only limits *inbound* requests, per process.  This module
+limits *outbound* calls to the provider, per model, across every worker on
+the host: a token bucket caps requests per second and a lease table caps
+concurrent in-flight requests.  Callers queue for a slot instead of firing
+and being throttled with 429s.
+
+The shared governor is opt-in (``LLM_GOVERNOR=1``).  Its limits only help
+when they match the provider tier; unconfigured defaults would throttle the
+whole site to them.  The batch builders (``build_puzzle_bank``,
+``build_daily``) turn it on for their own runs.  Without it each process
+still schedules its calls by lane: a per-model gate of
+``LLM_LANE_CONCURRENCY`` in-flight calls with the same priorities, headroom
+and prefetch shedding as below, but no rate limit and nothing shared across
+workers.
+
+State lives in one small JSON file per model under ``LLM_GOVERNOR_DIR``,
+updated under an exclusive ``fcntl`` lock, so all processes sharing that
+directory share the limits.  Leases carry the holder's pid and an expiry so a
+crashed worker cannot leak slots.  Where ``fcntl`` is unavailable the
+governor falls back to per-process limits.
+
+Every call runs in a priority lane.  Interactive work (answer validation,
+hints) goes first, on-demand puzzle generation second and speculative
+prefetch last.  A lower lane is never admitted while a higher lane is queued
+on any worker, and it has to leave headroom (``LANE_RESERVE``) in both the
+token bucket and the slot table.  Prefetch that can't get a slot within
+``PREFETCH_QUEUE_TIMEOUT`` is shed (``LoadShed``) so the caller can back off
+and retry later.  In-flight HTTP calls are never cancelled.
+
+A queued caller sleeps until the bucket's next token is due.  When it waits
+for a free slot instead, a release in the same process wakes it at once.
+Releases on other workers are noticed by polling, which backs off from
+``MIN_POLL_SECONDS`` to ``MAX_POLL_SECONDS``.
+
+Configuration (environment):
+
+    LLM_GOVERNOR          1 enables the shared governor           (default 0)
+    LLM_LANES             0 disables the per-process lane gate    (default 1)
+    LLM_LANE_CONCURRENCY  in-flight calls per model per process   (default 16)
+    LLM_GOVERNOR_DIR      directory for shared state files        (default <tmp>/escape-room-llm-governor)
+    LLM_RPS               default requests/second per model       (default 5)
+    LLM_MAX_CONCURRENCY   default in-flight requests per model    (default 8)
+    LLM_GOVERNOR_LIMITS   per-model overrides, "model=rps:concurrency,..."
+    LLM_QUEUE_TIMEOUT     max seconds to wait for a slot          (default 60)
+    LLM_PREFETCH_TIMEOUT  max seconds prefetch waits before shed  (default 10)
+"""
+
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover — non-POSIX
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("LLM_GOVERNOR", "0") == "1"
+LANES_ENABLED = os.environ.get("LLM_LANES", "1") == "1"
+LANE_CONCURRENCY = int(os.environ.get("LLM_LANE_CONCURRENCY", "16"))
+GOVERNOR_DIR = os.environ.get(
+    "LLM_GOVERNOR_DIR", os.path.join(tempfile.gettempdir(), "escape-room-llm-governor")
+)
+DEFAULT_RPS = float(os.environ.get("LLM_RPS", "5"))
+DEFAULT_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "60"))
+PREFETCH_QUEUE_TIMEOUT = float(os.environ.get("LLM_PREFETCH_TIMEOUT", "10"))
+
+# Priority lanes — lower number wins
+LANE_INTERACTIVE = 0   # answer validation, hints: a player is staring at a spinner
+LANE_ON_DEMAND = 1     # puzzle generation the player is blocked on
+LANE_PREFETCH = 2      # speculative background generation
+LANE_NAMES = {LANE_INTERACTIVE: "interactive", LANE_ON_DEMAND: "on_demand", LANE_PREFETCH: "prefetch"}
+
+# Fraction of slots and burst tokens a lane must leave free for higher lanes
+LANE_RESERVE = {LANE_INTERACTIVE: 0.0, LANE_ON_DEMAND: 0.125, LANE_PREFETCH: 0.25}
+
+# A lane, or a callable returning one (re-read while queued so a job can be promoted)
+Lane = Union[int, Callable[[], int]]
+
+LEASE_TTL_SECONDS = 180      # a slot held longer than this is presumed leaked
+MIN_POLL_SECONDS = 0.05      # first re-check while waiting for a slot held on another worker
+MAX_POLL_SECONDS = 0.5       # re-checks back off to this (well under WAITER_TTL_SECONDS)
+WAIT_SAMPLES = 1000          # queue-wait samples kept per model for stats
+WAITER_TTL_SECONDS = 2       # a queued caller that stops polling is forgotten after this
+
+
+class GovernorTimeout(RuntimeError):
+    """No slot became free within the queue timeout."""
+
+
+class LoadShed(GovernorTimeout):
+    """Low-priority work dropped to keep capacity for higher lanes."""
+
+
+def _parse_limits(spec: str) -> dict[str, tuple[float, int]]:
+    """Parse ``"model=rps:concurrency,..."`` into {model: (rps, concurrency)}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, values = item.partition("=")
+        rps, _, concurrency = values.partition(":")
+        limits[model.strip()] = (
+            float(rps) if rps else DEFAULT_RPS,
+            int(concurrency) if concurrency else DEFAULT_CONCURRENCY,
+        )
+    return limits
+
+
+MODEL_LIMITS = _parse_limits(os.environ.get("LLM_GOVERNOR_LIMITS", ""))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Bucket:
+    """Token bucket plus lease table for one model."""
+
+    def __init__(self, model: str, rps: float, concurrency: int):
+        self.model = model
+        self.rps = rps
+        self.burst = max(1.0, rps)
+        self.concurrency = concurrency
+        self._local_lock = threading.Lock()
+        self._local_state: dict = {}
+        self._released = threading.Condition()   # wakes this process's waiters on release
+        self.path = None
+        if fcntl is not None:
+            os.makedirs(GOVERNOR_DIR, exist_ok=True)
+            safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in model)
+            self.path = os.path.join(GOVERNOR_DIR, f"{safe}.json")
+
+    @contextmanager
+    def _state(self) -> Iterator[dict]:
+        """Exclusive read-modify-write access to the shared state."""
+        if self.path is None:
+            with self._local_lock:
+                yield self._local_state
+            return
+        with self._local_lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                try:
+                    state = json.loads(raw) if raw else {}
+                except json.JSONDecodeError:
+                    state = {}
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state, separators=(",", ":")))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_acquire(self, lane: int, waiter_id: str) -> tuple[Optional[str], float, bool]:
+        """Take a slot for *lane* if one is free.
+
+        Returns (lease_id, 0, False) on success, otherwise (None, seconds
+        until the next token is due or 0 if waiting on a slot, whether a
+        higher lane is queued).  A caller that doesn't get a slot stays
+        registered as a waiter so lower lanes on other workers hold back
+        until it is served or stops polling.
+        """
+        now = time.time()
+        pid = os.getpid()
+        reserve = LANE_RESERVE.get(lane, 0.0)
+        with self._state() as state:
+            elapsed = max(0.0, now - state.get("updated", now))
+            tokens = min(self.burst, state.get("tokens", self.burst) + elapsed * self.rps)
+            leases = {
+                lease: holder for lease, holder in state.get("leases", {}).items()
+                if holder[1] > now and _pid_alive(holder[0])
+            }
+            waiters = {
+                wid: waiter for wid, waiter in state.get("waiters", {}).items()
+                if wid != waiter_id and waiter[2] > now
+            }
+            outranked = any(waiter[1] < lane for waiter in waiters.values())
+
+            lease_id = None
+            need_tokens = min(self.burst, 1 + reserve * self.burst)
+            free_slots = self.concurrency - len(leases)
+            if not outranked and tokens >= need_tokens and free_slots > int(reserve * self.concurrency):
+                tokens -= 1
+                lease_id = f"{pid}-{uuid.uuid4().hex[:8]}"
+                leases[lease_id] = [pid, now + LEASE_TTL_SECONDS]
+            else:
+                waiters[waiter_id] = [pid, lane, now + WAITER_TTL_SECONDS]
+            state.update(tokens=tokens, updated=now, leases=leases, waiters=waiters)
+
+        if lease_id:
+            return lease_id, 0.0, False
+        if tokens < need_tokens:
+            return None, (need_tokens - tokens) / self.rps, outranked
+        return None, 0.0, outranked
+
+    def wait(self, seconds: float) -> None:
+        """Sleep up to *seconds*, or until a slot is released in this process."""
+        with self._released:
+            self._released.wait(seconds)
+
+    def leave(self, waiter_id: str) -> None:
+        """Stop waiting without taking a slot."""
+        with self._state() as state:
+            state.get("waiters", {}).pop(waiter_id, None)
+
+    def release(self, lease_id: str) -> None:
+        with self._state() as state:
+            state.get("leases", {}).pop(lease_id, None)
+        with self._released:
+            self._released.notify_all()
+
+    def in_flight(self) -> int:
+        now = time.time()
+        with self._state() as state:
+            return sum(1 for holder in state.get("leases", {}).values() if holder[1] > now)
+
+
+class _Gate:
+    """Per-process lane scheduler for one model, used when the shared governor is off.
+
+    Same admission rule as ``_Bucket.try_acquire`` — no lower lane while a
+    higher one is queued, and each lane leaves its ``LANE_RESERVE`` of slots
+    free — over an in-memory slot count instead of the shared state file.
+    """
+
+    def __init__(self, model: str, concurrency: int):
+        self.model = model
+        self.concurrency = concurrency
+        self.in_use = 0
+        self.queued = dict.fromkeys(LANE_NAMES, 0)
+        self._changed = threading.Condition()
+
+    def acquire(self, lane: Lane, timeout: Optional[float]) -> tuple[int, float]:
+        """Block until a slot is free for *lane*.  Returns (lane admitted in, seconds queued)."""
+        start = time.monotonic()
+        queued_in = None
+        with self._changed:
+            try:
+                while True:
+                    current = resolve_lane(lane)
+                    if current != queued_in:
+                        # Promoted (or first time round): queue in the new lane
+                        if queued_in is not None:
+                            self.queued[queued_in] -= 1
+                        self.queued[current] = self.queued.get(current, 0) + 1
+                        queued_in = current
+                    outranked = any(n for other, n in self.queued.items() if other < current)
+                    free = self.concurrency - self.in_use
+                    waited = time.monotonic() - start
+                    if not outranked and free > int(LANE_RESERVE.get(current, 0.0) * self.concurrency):
+                        self.in_use += 1
+                        return current, waited
+
+                    limit = timeout if timeout is not None else (
+                        PREFETCH_QUEUE_TIMEOUT if current == LANE_PREFETCH else QUEUE_TIMEOUT
+                    )
+                    if waited >= limit:
+                        if current == LANE_PREFETCH:
+                            raise LoadShed(f"Shed prefetch call to {self.model} after {waited:.1f}s "
+                                           f"({'higher-priority work queued' if outranked else 'no free slot'})")
+                        raise GovernorTimeout(f"No {self.model} slot free after {waited:.1f}s")
+                    # Wake on a release, or now and then to notice a promotion
+                    self._changed.wait(min(limit - waited, MAX_POLL_SECONDS))
+            finally:
+                if queued_in is not None:
+                    self.queued[queued_in] -= 1
+                    # Lower lanes held back by this caller may go now
+                    self._changed.notify_all()
+
+    def release(self) -> None:
+        with self._changed:
+            self.in_use -= 1
+            self._changed.notify_all()
+
+
+_buckets: dict[str, _Bucket] = {}
+_buckets_lock = threading.Lock()
+_gates: dict[str, _Gate] = {}
+
+# Per-process queue statistics: model -> {"acquired", "timeouts", "waits": deque}
+_stats: dict[str, dict] = {}
+# Per-process lane statistics: lane -> {"calls", "shed", "waits": deque, "latencies": deque}
+_lane_stats: dict[int, dict] = {}
+_stats_lock = threading.Lock()
+
+
+def _bucket(model: str) -> _Bucket:
+    with _buckets_lock:
+        bucket = _buckets.get(model)
+        if bucket is None:
+            rps, concurrency = MODEL_LIMITS.get(model, (DEFAULT_RPS, DEFAULT_CONCURRENCY))
+            bucket = _buckets[model] = _Bucket(model, rps, concurrency)
+        return bucket
+
+
+def _gate(model: str) -> _Gate:
+    with _buckets_lock:
+        gate = _gates.get(model)
+        if gate is None:
+            gate = _gates[model] = _Gate(model, LANE_CONCURRENCY)
+        return gate
+
+
+def _reset_after_fork() -> None:
+    """Start a forked child with empty gates; the parent's slot counts and locks aren't ours."""
+    global _gates, _buckets_lock
+    _gates = {}
+    _buckets_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _record(model: str, lane: int, waited: Optional[float], shed: bool = False) -> None:
+    with _stats_lock:
+        entry = _stats.setdefault(model, {"acquired": 0, "timeouts": 0, "waits": deque(maxlen=WAIT_SAMPLES)})
+        lane_entry = _lane_entry(lane)
+        if waited is None:
+            entry["timeouts"] += 1
+            if shed:
+                lane_entry["shed"] += 1
+        else:
+            entry["acquired"] += 1
+            entry["waits"].append(waited)
+            lane_entry["waits"].append(waited)
+
+
+def _lane_entry(lane: int) -> dict:
+    """Stats bucket for a lane.  Caller must hold _stats_lock."""
+    return _lane_stats.setdefault(lane, {
+        "calls": 0, "shed": 0,
+        "waits": deque(maxlen=WAIT_SAMPLES),
+        "latencies": deque(maxlen=WAIT_SAMPLES),
+    })
+
+
+def record_latency(lane: int, seconds: float) -> None:
+    """Record the end-to-end latency (queue + call) of one LLM call in *lane*."""
+    with _stats_lock:
+        entry = _lane_entry(lane)
+        entry["calls"] += 1
+        entry["latencies"].append(seconds)
+
+
+def resolve_lane(lane: Lane) -> int:
+    return lane() if callable(lane) else lane
+
+
+def acquire(model: str, lane: Lane = LANE_ON_DEMAND, timeout: Optional[float] = None) -> tuple[str, float]:
+    """Block until a slot for *model* is free for *lane*. Returns (lease_id, seconds queued).
+
+    Raises LoadShed if prefetch work waits longer than PREFETCH_QUEUE_TIMEOUT
+    (it is never admitted while a higher lane is queued), and GovernorTimeout
+    if any other lane waits longer than *timeout*.
+    """
+    bucket = _bucket(model)
+    waiter_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    start = time.monotonic()
+    poll = MIN_POLL_SECONDS
+    while True:
+        current = resolve_lane(lane)
+        lease_id, wait, outranked = bucket.try_acquire(current, waiter_id)
+        waited = time.monotonic() - start
+        if lease_id:
+            _record(model, current, waited)
+            return lease_id, waited
+
+        limit = timeout if timeout is not None else (
+            PREFETCH_QUEUE_TIMEOUT if current == LANE_PREFETCH else QUEUE_TIMEOUT
+        )
+        # Jitter so queued threads across workers don't retry in lockstep
+        if wait:
+            wait *= 1 + 0.2 * random.random()
+        else:
+            wait, poll = poll * (0.5 + random.random()), min(MAX_POLL_SECONDS, poll * 2)
+        if current == LANE_PREFETCH and waited + wait > limit:
+            bucket.leave(waiter_id)
+            _record(model, current, None, shed=True)
+            raise LoadShed(f"Shed prefetch call to {model} after {waited:.1f}s "
+                           f"({'higher-priority work queued' if outranked else 'no free slot'})")
+        if waited + wait > limit:
+            bucket.leave(waiter_id)
+            _record(model, current, None)
+            raise GovernorTimeout(f"No {model} slot free after {waited:.1f}s")
+        # A long token wait still checks in often enough to stay registered as a waiter
+        bucket.wait(min(wait, MAX_POLL_SECONDS))
+
+
+def release(model: str, lease_id: str) -> None:
+    _bucket(model).release(lease_id)
+
+
+@contextmanager
+def slot(model: str, lane: Lane = LANE_ON_DEMAND, timeout: Optional[float] = None) -> Iterator[float]:
+    """Hold one outbound slot for *model* in *lane*; yields the seconds spent queued."""
+    if not ENABLED:
+        if not LANES_ENABLED:
+            yield 0.0
+            return
+        gate = _gate(model)
+        try:
+            admitted, waited = gate.acquire(lane, timeout)
+        except GovernorTimeout as e:
+            current = resolve_lane(lane)
+            _record(model, current, None, shed=isinstance(e, LoadShed))
+            raise
+        _record(model, admitted, waited)
+        if waited >= 1.0:
+            logger.info("🚦 [Governor] Queued %.1fs for a %s slot (%s, this worker)", waited, model,
+                        LANE_NAMES.get(admitted, admitted))
+        try:
+            yield waited
+        finally:
+            gate.release()
+        return
+    lease_id, waited = acquire(model, lane, timeout)
+    if waited >= 1.0:
+        logger.info("🚦 [Governor] Queued %.1fs for a %s slot (%s)", waited, model,
+                    LANE_NAMES.get(resolve_lane(lane), lane))
+    try:
+        yield waited
+    finally:
+        release(model, lease_id)
+
+
+def _percentile_ms(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000, 1)
+
+
+def get_stats() -> dict:
+    """Queue-wait and per-lane latency statistics (this process) plus in-flight counts (all workers)."""
+    with _stats_lock:
+        models = {model: (entry["acquired"], entry["timeouts"], sorted(entry["waits"]))
+                  for model, entry in _stats.items()}
+        lanes = {lane: (entry["calls"], entry["shed"], sorted(entry["waits"]), sorted(entry["latencies"]))
+                 for lane, entry in _lane_stats.items()}
+    result = {"models": {}, "lanes": {}}
+    for model, (acquired, timeouts, waits) in models.items():
+        if ENABLED:
+            bucket = _bucket(model)
+            limits = {"rps": bucket.rps, "concurrency": bucket.concurrency, "in_flight": bucket.in_flight()}
+        else:
+            gate = _gate(model)
+            limits = {"rps": None, "concurrency": gate.concurrency, "in_flight": gate.in_use}
+        result["models"][model] = {
+            "scope": "host" if ENABLED else "process",
+            **limits,
+            "acquired": acquired,
+            "timeouts": timeouts,
+            "queue_wait_p50_ms": _percentile_ms(waits, 50),
+            "queue_wait_p95_ms": _percentile_ms(waits, 95),
+            "queue_wait_max_ms": _percentile_ms(waits, 100),
+        }
+    for lane, (calls, shed, waits, latencies) in sorted(lanes.items()):
+        result["lanes"][LANE_NAMES.get(lane, str(lane))] = {
+            "calls": calls,
+            "shed": shed,
+            "queue_wait_p50_ms": _percentile_ms(waits, 50),
+            "queue_wait_p95_ms": _percentile_ms(waits, 95),
+            "latency_p50_ms": _percentile_ms(latencies, 50),
+            "latency_p95_ms": _percentile_ms(latencies, 95),
+            "latency_p99_ms": _percentile_ms(latencies, 99),
+        }
+    return result
@@ -0,0 +1,420 @@
+"""Tolerant JSON extraction and schema repair for LLM replies.
+
+Models wrap JSON in prose or markdown fences, leave trailing commas, use
+smart quotes, forget to escape inner quotes and get cut off mid-array.  A
+reply used to be thrown away (and the route answered 503) whenever three
+``json.loads`` attempts and a regex all failed.
+
+Parsing is now a single scan: a C-speed ``raw_decode`` from the first ``{``
+handles clean replies (including fenced ones and trailing prose), and
+anything else goes through a forgiving recursive-descent parser that
+repairs defects as it reads.  The result is then conformed to the task's
+schema (puzzle, validation, hint, vision): values are coerced to the right
+types, optional fields get defaults, and the required fields that are
+still missing are reported so the caller can ask the model for just those.
+"""
+
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from prompts import PUZZLE_TYPES
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+_decoder = json.JSONDecoder()
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+# A quoted key right after a closing quote means the comma was left out
+_NEXT_KEY = re.compile(r'["“][^"“”\n]{1,64}["”]\s*:')
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_\-]*")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_OPEN_QUOTES = '"“”'
+_CLOSE_QUOTES = '"”“'
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+
+class _Truncated:
+    """Marker for a value cut off by the end of the reply."""
+
+
+_TRUNCATED = _Truncated()
+
+
+class _TolerantParser:
+    """Recursive-descent JSON reader that repairs common LLM defects in one pass."""
+
+    def __init__(self, text: str, pos: int):
+        self.text = text
+        self.pos = pos
+        self.end = len(text)
+        self.repairs: list[str] = []
+
+    def _note(self, repair: str) -> None:
+        if repair not in self.repairs:
+            self.repairs.append(repair)
+
+    def _skip_ws(self) -> None:
+        text, pos = self.text, self.pos
+        while pos < self.end:
+            if text[pos].isspace():
+                pos += 1
+            elif text.startswith("//", pos):
+                self._note("comment")
+                newline = text.find("\n", pos)
+                pos = self.end if newline == -1 else newline + 1
+            else:
+                break
+        self.pos = pos
+
+    def _after_comma(self) -> bool:
+        """Whether the last non-blank character before the cursor is a comma."""
+        pos = self.pos - 1
+        while pos >= 0 and self.text[pos].isspace():
+            pos -= 1
+        return pos >= 0 and self.text[pos] == ","
+
+    def value(self) -> Any:
+        self._skip_ws()
+        if self.pos >= self.end:
+            return _TRUNCATED
+        char = self.text[self.pos]
+        if char == "{":
+            return self._object()
+        if char == "[":
+            return self._array()
+        if char in _OPEN_QUOTES:
+            return self._string()
+        if char == "-" or char.isdigit():
+            match = _NUMBER.match(self.text, self.pos)
+            if match:
+                self.pos = match.end()
+                number = match.group()
+                return float(number) if any(c in number for c in ".eE") else int(number)
+        return self._bare()
+
+    def _object(self) -> dict:
+        self.pos += 1
+        result: dict = {}
+        while True:
+            self._skip_ws()
+            if self.pos >= self.end:
+                self._note("truncated")
+                return result
+            char = self.text[self.pos]
+            if char == "}":
+                if result and self._after_comma():
+                    self._note("trailing comma")
+                self.pos += 1
+                return result
+            if char == ",":
+                self._note("extra comma")
+                self.pos += 1
+                continue
+            if char == "]":
+                self._note("mismatched bracket")
+                self.pos += 1
+                return result
+            key = self._string() if char in _OPEN_QUOTES else self._bare()
+            if key is _TRUNCATED:
+                self._note("truncated")
+                return result
+            self._skip_ws()
+            if self.pos < self.end and self.text[self.pos] in ":=":
+                self.pos += 1
+            else:
+                self._note("missing colon")
+            value = self.value()
+            if value is _TRUNCATED:
+                self._note("truncated")
+                return result
+            result[str(key)] = value
+            self._skip_ws()
+            if self.pos < self.end and self.text[self.pos] == ",":
+                self.pos += 1
+            elif self.pos < self.end and self.text[self.pos] not in "}]":
+                self._note("missing comma")
+
+    def _array(self) -> list:
+        self.pos += 1
+        result: list = []
+        while True:
+            self._skip_ws()
+            if self.pos >= self.end:
+                self._note("truncated")
+                return result
+            char = self.text[self.pos]
+            if char == "]":
+                if result and self._after_comma():
+                    self._note("trailing comma")
+                self.pos += 1
+                return result
+            if char == ",":
+                self._note("extra comma")
+                self.pos += 1
+                continue
+            if char == "}":
+                self._note("mismatched bracket")
+                self.pos += 1
+                return result
+            value = self.value()
+            if value is _TRUNCATED:
+                # A half-written element (e.g. the last hint) is dropped
+                self._note("truncated")
+                return result
+            result.append(value)
+            self._skip_ws()
+            if self.pos < self.end and self.text[self.pos] == ",":
+                self.pos += 1
+            elif self.pos < self.end and self.text[self.pos] not in "]}":
+                self._note("missing comma")
+
+    def _string(self) -> Any:
+        text = self.text
+        if text[self.pos] != '"':
+            self._note("smart quotes")
+        self.pos += 1
+        chunks: list[str] = []
+        while self.pos < self.end:
+            char = text[self.pos]
+            if char == "\\" and self.pos + 1 < self.end:
+                escaped = text[self.pos + 1]
+                if escaped == "u" and self.pos + 6 <= self.end:
+                    try:
+                        chunks.append(chr(int(text[self.pos + 2:self.pos + 6], 16)))
+                        self.pos += 6
+                        continue
+                    except ValueError:
+                        pass
+                chunks.append(_ESCAPES.get(escaped, escaped))
+                self.pos += 2
+                continue
+            if char in _CLOSE_QUOTES:
+                # Only a quote followed by structure (or the next key) ends the
+                # string; anything else is an unescaped quote inside the text
+                after = self.pos + 1
+                while after < self.end and text[after] in " \t\r\n":
+                    after += 1
+                if after >= self.end or text[after] in ",:}]" or _NEXT_KEY.match(text, after):
+                    if char != '"':
+                        self._note("smart quotes")
+                    self.pos += 1
+                    return "".join(chunks)
+                self._note("unescaped quote")
+            chunks.append(char)
+            self.pos += 1
+        return _TRUNCATED
+
+    def _bare(self) -> Any:
+        """An unquoted literal, key or word."""
+        match = _WORD.match(self.text, self.pos)
+        if match and match.group() in _LITERALS:
+            if match.group()[0].isupper():
+                self._note("python literal")
+            self.pos = match.end()
+            return _LITERALS[match.group()]
+        start = self.pos
+        while self.pos < self.end and self.text[self.pos] not in ",:}]\n":
+            self.pos += 1
+        word = self.text[start:self.pos].strip()
+        if not word:
+            # A stray character we can't use — step over it
+            self.pos = max(self.pos, start + 1)
+        self._note("unquoted text")
+        return word
+
+
+def parse_json(text: str) -> tuple[dict, list[str]]:
+    """Extract the first JSON object in *text*.  Returns ``(object, repairs)``.
+
+    Raises ValueError if the reply contains no object at all.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ValueError(f"Could not extract JSON from response: {text[:200]}")
+    try:
+        # Fast path: clean JSON, optionally fenced or followed by prose
+        result, _ = _decoder.raw_decode(text, start)
+        if isinstance(result, dict):
+            return result, []
+    except json.JSONDecodeError:
+        pass
+    parser = _TolerantParser(text, start)
+    result = parser.value()
+    if not isinstance(result, dict):
+        raise ValueError(f"Could not extract JSON from response: {text[:200]}")
+    return result, parser.repairs
+
+
+def extract_json(text: str) -> dict:
+    """Extract (and repair) the JSON object in a model reply."""
+    return parse_json(text)[0]
+
+
+# ---------------------------------------------------------------------------
+# Schemas
+# ---------------------------------------------------------------------------
+@dataclass(frozen=True)
+class Field:
+    """One expected key of a task's reply."""
+    kind: type
+    required: bool = False
+    default: Any = None
+    choices: Optional[tuple] = None
+    bounds: Optional[tuple[int, int]] = None
+    items: type = str          # element type of a list field: str, or dict for a list of objects
+
+
+_PUZZLE_FIELDS = {
+    "question": Field(str, required=True),
+    "type": Field(str, default="riddle", choices=tuple(PUZZLE_TYPES)),
+    "answer": Field(str, required=True),
+    "hints": Field(list, default=()),
+    "narrative_text": Field(str, default=""),
+    "difficulty": Field(int, bounds=(1, 5)),
+}
+
+SCHEMAS: dict[str, dict[str, Field]] = {
+    "puzzle": _PUZZLE_FIELDS,
+    "vision": {
+        **_PUZZLE_FIELDS,
+        "type": Field(str, default="visual", choices=tuple(PUZZLE_TYPES)),
+        "image_description": Field(str, default=""),
+    },
+    "validation": {
+        "correct": Field(bool, required=True),
+        "feedback": Field(str, default=""),
+    },
+    "validations": {
+        "verdicts": Field(list, required=True, items=dict),
+    },
+    "hint": {
+        "hint": Field(str, required=True),
+        "encouragement": Field(str),
+    },
+    "aliases": {
+        "aliases": Field(list, required=True),
+    },
+}
+
+# Alternative key spellings models use
+_ALIASES = {
+    "puzzle_type": "type",
+    "narrative": "narrative_text",
+    "clues": "hints",
+    "is_correct": "correct",
+    "message": "feedback",
+}
+
+_TRUE_WORDS = {"true", "yes", "correct", "right", "1"}
+_FALSE_WORDS = {"false", "no", "incorrect", "wrong", "0"}
+
+
+def _coerce(value: Any, field: Field) -> Any:
+    """Convert *value* to the field's type, or return None if it can't be used."""
+    if value is None:
+        return None
+    if field.kind is str:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        value = value.strip()
+        if field.choices is not None:
+            value = value.lower()
+            if value not in field.choices:
+                return None
+        return value
+    if field.kind is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float)):
+            return bool(value)
+        if isinstance(value, str):
+            word = value.strip().lower()
+            if word in _TRUE_WORDS:
+                return True
+            if word in _FALSE_WORDS:
+                return False
+        return None
+    if field.kind is int:
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, str):
+            digits = re.search(r"\d+", value)
+            value = int(digits.group()) if digits else None
+        if isinstance(value, (int, float)):
+            value = int(round(value))
+            if field.bounds:
+                value = max(field.bounds[0], min(field.bounds[1], value))
+            return value
+        return None
+    if field.kind is list:
+        if isinstance(value, str):
+            value = [value]
+        elif isinstance(value, dict):
+            value = list(value.values())
+        if not isinstance(value, list):
+            return None
+        if field.items is dict:
+            return [item for item in value if isinstance(item, dict)]
+        items = [str(item).strip() for item in value
+                 if isinstance(item, (str, int, float)) and str(item).strip()]
+        return items
+    return value
+
+
+def conform(task: str, data: dict, defaults: Optional[dict] = None) -> tuple[dict, list[str]]:
+    """Coerce *data* to the task's schema.  Returns ``(result, missing_required_fields)``.
+
+    Unknown keys are kept; unusable optional values fall back to *defaults*
+    (e.g. the requested difficulty) and then to the schema default.
+    """
+    schema = SCHEMAS[task]
+    result = dict(data)
+    for alias, name in _ALIASES.items():
+        if alias in result and name in schema and name not in result:
+            result[name] = result.pop(alias)
+    missing = []
+    for name, field in schema.items():
+        value = _coerce(result.get(name), field)
+        if value is None:
+            if field.required:
+                missing.append(name)
+                result.pop(name, None)
+                continue
+            if defaults and defaults.get(name) is not None:
+                value = defaults[name]
+            elif field.default is not None:
+                value = list(field.default) if field.kind is list else field.default
+            else:
+                result.pop(name, None)
+                continue
+        result[name] = value
+    return result, missing
+
+
+def read_reply(task: str, text: str, defaults: Optional[dict] = None) -> tuple[dict, list[str]]:
+    """Parse and conform a raw reply.  A reply with no JSON at all has every required field missing."""
+    try:
+        data, repairs = parse_json(text)
+    except ValueError:
+        data, repairs = {}, ["no json"]
+    if repairs:
+        logger.info("🩹 Repaired %s reply locally: %s", task, ", ".join(repairs))
+    return conform(task, data, defaults)
+
+
+def missing_fields_prompt(task: str, missing: list[str]) -> str:
+    """Follow-up asking the model for only the fields its last reply lacked."""
+    shape = ", ".join(f'"{name}": <{SCHEMAS[task][name].kind.__name__}>' for name in missing)
+    return (
+        f"Your previous reply was missing or had unusable values for: {', '.join(missing)}. "
+        f"Respond with ONLY a JSON object containing those fields: {{{shape}}}"
+    )
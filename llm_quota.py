@@ -0,0 +1,377 @@
+"""LLM-cost quotas per session and per IP.
+
+``flask_limiter`` counts HTTP requests, but requests differ a lot in cost.
+A ``/time-check`` is free.  A ``/start`` sets off a dozen puzzle
+generations, and a ``/hint`` past the pre-generated ones is a completion
+of its own.  Here each caller is charged for the LLM work it actually
+causes: the tokens reported in ``response.usage`` and the number of calls.
+The charge goes to its session and to its IP, over a sliding window of ``LLM_QUOTA_WINDOW_SECONDS`` (default 600).
+
+Limits per window:
+
+- ``LLM_QUOTA_SESSION_TOKENS`` / ``LLM_QUOTA_SESSION_CALLS`` (default
+  60000 / 60, about six ordinary games);
+- ``LLM_QUOTA_IP_TOKENS`` / ``LLM_QUOTA_IP_CALLS`` (default 1200000 /
+  1200).  A ``/start`` fans out to about a dozen generations, so an IP limit
+  is players behind the address × games per window × ~12 calls; the default
+  is about a hundred games, twenty sessions' worth.  It stops a client that
+  drops its cookie to get a fresh session quota.  One IP is often many
+  players: everyone behind a reverse proxy shares the proxy's address unless
+  ``TRUSTED_PROXIES`` is set (see app.py), and a classroom behind one NAT
+  shares one address even then.  Set both to 0 to turn IP limits off.
+
+Past ``LLM_QUOTA_SOFT`` (default 0.75) of any limit a caller gets no more
+speculative prefetch.  Over a limit it gets no LLM calls at all until the
+window slides on.  ``check`` raises ``QuotaExceeded`` (a ``LoadShed``)
+before the call is queued, and the game falls back to what it does when
+the provider is down: puzzles from the bank, answers matched locally and
+hints made from the answer itself.  The player can keep playing; they just
+stop costing anything.
+
+Who pays is bound per request (``bind``, from ``app.before_request``) in a
+context variable.  Background work started by a request captures
+``current()`` and runs under ``paying(...)``.  A call shared by several
+payers, like a validation batch, splits its cost between them.
+
+Usage is shared by every worker through SQLite (``LLM_QUOTA_DB_PATH``), but
+neither a check nor a charge touches it on the request path.  Each process
+keeps the totals of the identities it has seen in memory.  A charge adds to
+them and is queued on a ``BatchWriter``.  A check reads the database only for
+identities whose totals are older than ``LLM_QUOTA_REFRESH_SECONDS``
+(default 5), and adds this process's charges still waiting to be written.
+So other workers' usage shows up within that interval plus the writer's.
+A window is ``BUCKETS`` time buckets per identity, so a refresh sums at most
+that many rows.  ``LLM_QUOTA=0`` turns quotas off.
+"""
+
+import contextvars
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+import llm_governor
+from batch_writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("LLM_QUOTA", "1") != "0"
+DB_PATH = os.environ.get(
+    "LLM_QUOTA_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_quota.sqlite3"),
+)
+WINDOW_SECONDS = float(os.environ.get("LLM_QUOTA_WINDOW_SECONDS", "600"))
+SESSION_TOKENS = int(os.environ.get("LLM_QUOTA_SESSION_TOKENS", "60000"))
+SESSION_CALLS = int(os.environ.get("LLM_QUOTA_SESSION_CALLS", "60"))
+IP_TOKENS = int(os.environ.get("LLM_QUOTA_IP_TOKENS", "1200000"))
+IP_CALLS = int(os.environ.get("LLM_QUOTA_IP_CALLS", "1200"))
+IP_LIMITED = IP_TOKENS > 0 or IP_CALLS > 0
+SOFT = float(os.environ.get("LLM_QUOTA_SOFT", "0.75"))
+REFRESH_SECONDS = float(os.environ.get("LLM_QUOTA_REFRESH_SECONDS", "5"))
+BUCKETS = 10
+MAX_TRACKED = 10_000   # identities whose totals a process keeps in memory
+
+# A payer is the identities one caller is charged under, e.g. ("s:3f2a…", "ip:203.0.113.7")
+Payer = tuple[str, ...]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    ident   TEXT    NOT NULL,
+    bucket  INTEGER NOT NULL,
+    tokens  REAL    NOT NULL,
+    calls   REAL    NOT NULL,
+    PRIMARY KEY (ident, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_usage_bucket ON usage (bucket);
+"""
+
+
+class QuotaExceeded(llm_governor.LoadShed):
+    """The caller has used up its LLM budget for now."""
+
+
+# Payers for LLM calls made in the current request (or background job)
+_payers: contextvars.ContextVar = contextvars.ContextVar("llm_payers", default=())
+
+_local = threading.local()
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pruned = 0          # last bucket old rows were deleted at
+        self.over: dict[str, str] = {}   # identity -> level last logged ("soft" / "hard")
+        # identity -> [monotonic time read from the database, tokens, calls], plus our charges since
+        self.totals: dict[str, list] = {}
+        # (identity, bucket) -> [tokens, calls] charged here but not written yet
+        self.unwritten: dict[tuple[str, int], list] = {}
+        # Bumped when a write starts and when it's done: odd while one is in flight
+        self.generation = 0
+        self.stats = {"checks": 0, "refused": 0, "prefetch_refused": 0, "charged_calls": 0,
+                      "charged_tokens": 0, "refreshes": 0, "refresh_races": 0, "errors": 0}
+
+
+_state = _State()
+
+
+def _connect() -> sqlite3.Connection:
+    """Per-thread (and per-process, so forks never share a handle) connection."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    conn = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+def _bucket(now: Optional[float] = None) -> int:
+    return int((now or time.time()) // (WINDOW_SECONDS / BUCKETS))
+
+
+def _limits(ident: str) -> tuple[int, int]:
+    return (SESSION_TOKENS, SESSION_CALLS) if ident.startswith("s:") else (IP_TOKENS, IP_CALLS)
+
+
+# ---------------------------------------------------------------------------
+# Who pays
+# ---------------------------------------------------------------------------
+def bind(session_id: Optional[str], ip: Optional[str]) -> None:
+    """Charge LLM calls in the current request to this session (and IP, if IPs are limited)."""
+    ip = ip if IP_LIMITED else None
+    payer = tuple(ident for ident in (session_id and f"s:{session_id}", ip and f"ip:{ip}") if ident)
+    _payers.set((payer,) if payer else ())
+
+
+def current() -> tuple[Payer, ...]:
+    """The payers of the current context, for handing to background work."""
+    return _payers.get()
+
+
+@contextmanager
+def paying(payers: tuple[Payer, ...]):
+    """Charge LLM calls in this block to *payers* (from ``current()``), split evenly."""
+    token = _payers.set(tuple(payers))
+    try:
+        yield
+    finally:
+        _payers.reset(token)
+
+
+# ---------------------------------------------------------------------------
+# Checking and charging
+# ---------------------------------------------------------------------------
+def _refresh(idents: list[str], now: float) -> None:
+    """Re-read the shared totals of *idents* from the database.
+
+    The read is added to this process's unwritten charges, which only adds up
+    if no write of ours started or finished while it ran; otherwise it is
+    retried (writes are batched, so at most a few times a second).
+    """
+    oldest = _bucket() - BUCKETS
+    for attempt in range(3):
+        with _state.lock:
+            generation = _state.generation
+        rows = _connect().execute(
+            f"SELECT ident, SUM(tokens), SUM(calls) FROM usage "
+            f"WHERE ident IN ({','.join('?' * len(idents))}) AND bucket > ? GROUP BY ident",
+            idents + [oldest],
+        ).fetchall()
+        with _state.lock:
+            if generation % 2 or _state.generation != generation:
+                if attempt < 2:
+                    continue
+                # Still racing our writer: the totals may be off until the next refresh
+                _state.stats["refresh_races"] += 1
+            _state.stats["refreshes"] += 1
+            if len(_state.totals) > MAX_TRACKED:
+                _state.totals = {ident: t for ident, t in _state.totals.items() if now - t[0] < REFRESH_SECONDS}
+            for key in [key for key in _state.unwritten if key[1] <= oldest]:
+                del _state.unwritten[key]   # a write that was dropped; out of the window anyway
+            fetched = {ident: (tokens, calls) for ident, tokens, calls in rows}
+            for ident in idents:
+                tokens, calls = fetched.get(ident, (0.0, 0.0))
+                for (pending, _), (more_tokens, more_calls) in _state.unwritten.items():
+                    if pending == ident:
+                        tokens, calls = tokens + more_tokens, calls + more_calls
+                _state.totals[ident] = [now, tokens, calls]
+            return
+
+
+def usage(idents) -> dict[str, tuple[float, float]]:
+    """(tokens, calls) used in the current window per identity, at most REFRESH_SECONDS stale."""
+    idents = list(dict.fromkeys(idents))
+    now = time.monotonic()
+    with _state.lock:
+        stale = [ident for ident in idents
+                 if ident not in _state.totals or now - _state.totals[ident][0] >= REFRESH_SECONDS]
+    if stale:
+        _refresh(stale, now)
+    with _state.lock:
+        return {ident: (t[1], t[2]) for ident in idents
+                if (t := _state.totals.get(ident)) is not None and (t[1] or t[2])}
+
+
+def _level(ident: str, used: tuple[float, float]) -> float:
+    """Fraction of the identity's tightest limit used."""
+    max_tokens, max_calls = _limits(ident)
+    return max(used[0] / max_tokens if max_tokens else 0.0, used[1] / max_calls if max_calls else 0.0)
+
+
+def _note(ident: str, level: str) -> None:
+    """Log an identity crossing into (or out of) soft/hard territory once, not on every call."""
+    with _state.lock:
+        if _state.over.get(ident) == level:
+            return
+        if len(_state.over) > 10_000:
+            _state.over.clear()
+        if level:
+            _state.over[ident] = level
+        else:
+            _state.over.pop(ident, None)
+    if level == "hard":
+        logger.warning("🪙 %s is over its LLM quota — bank and local answers only", ident)
+    elif level == "soft":
+        logger.info("🪙 %s is near its LLM quota — no more prefetch", ident)
+
+
+def check(lane: llm_governor.Lane = llm_governor.LANE_ON_DEMAND) -> None:
+    """Raise ``QuotaExceeded`` if the current payers may not make an LLM call in *lane*.
+
+    Prefetch stops at the soft limit, everything else at the hard one.  A
+    call shared by several payers is refused only when all of them are over:
+    one abusive player doesn't take a batch down with it.  Fails open if
+    the usage table can't be read.
+    """
+    payers = current()
+    if not ENABLED or not payers:
+        return
+    limit = SOFT if llm_governor.resolve_lane(lane) == llm_governor.LANE_PREFETCH else 1.0
+    try:
+        used = usage({ident for payer in payers for ident in payer})
+    except sqlite3.Error as e:
+        with _state.lock:
+            _state.stats["errors"] += 1
+        logger.warning("⚠️ LLM quota check failed, allowing the call: %s", e)
+        return
+
+    refused = None
+    for payer in payers:
+        levels = {ident: _level(ident, used.get(ident, (0, 0))) for ident in payer}
+        for ident, level in levels.items():
+            _note(ident, "hard" if level >= 1.0 else "soft" if level >= SOFT else "")
+        worst = max(levels, key=levels.get)
+        if levels[worst] < limit:
+            refused = None
+            break
+        refused = worst
+    with _state.lock:
+        _state.stats["checks"] += 1
+        if refused:
+            _state.stats["prefetch_refused" if limit < 1.0 else "refused"] += 1
+    if refused:
+        raise QuotaExceeded(f"{refused} is over its LLM quota")
+
+
+def _write(charges: list[tuple[str, int, float, float]]) -> None:
+    """Add queued (ident, bucket, tokens, calls) charges to the shared table in one transaction."""
+    rows: dict[tuple[str, int], list] = {}
+    for ident, bucket, tokens, calls in charges:
+        row = rows.setdefault((ident, bucket), [0.0, 0.0])
+        row[0] += tokens
+        row[1] += calls
+    newest = max(bucket for _, bucket in rows)
+    conn = _connect()
+    with _state.lock:
+        _state.generation += 1
+    written = False
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO usage (ident, bucket, tokens, calls) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (ident, bucket) DO UPDATE SET tokens = tokens + excluded.tokens, "
+                "calls = calls + excluded.calls",
+                [(ident, bucket, tokens, calls) for (ident, bucket), (tokens, calls) in rows.items()],
+            )
+            if _state.pruned < newest:
+                conn.execute("DELETE FROM usage WHERE bucket <= ?", (newest - BUCKETS,))
+            conn.execute("COMMIT")
+            written = True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        with _state.lock:
+            _state.generation += 1
+            if written:
+                _state.pruned = max(_state.pruned, newest)
+                for key, (tokens, calls) in rows.items():
+                    pending = _state.unwritten.get(key)
+                    if pending is not None:
+                        pending[0] -= tokens
+                        pending[1] -= calls
+                        if pending[1] <= 1e-9:
+                            del _state.unwritten[key]
+
+writer = BatchWriter("llm_quota", _write, max_batch=2000, interval=1.0)
+
+
+def charge(usage_info) -> None:
+    """Charge one successful call (its ``response.usage``) to the current payers."""
+    payers = current()
+    if not ENABLED or not payers:
+        return
+    tokens = getattr(usage_info, "total_tokens", None) or 0
+    share = 1.0 / len(payers)
+    amounts: Counter = Counter()
+    for payer in payers:
+        for ident in payer:
+            amounts[ident] += share
+    bucket = _bucket()
+    with _state.lock:
+        for ident, part in amounts.items():
+            total = _state.totals.get(ident)
+            if total is not None:
+                total[1] += tokens * part
+                total[2] += part
+            pending = _state.unwritten.setdefault((ident, bucket), [0.0, 0.0])
+            pending[0] += tokens * part
+            pending[1] += part
+        _state.stats["charged_calls"] += 1
+        _state.stats["charged_tokens"] += tokens
+    for ident, part in amounts.items():
+        writer.submit((ident, bucket, tokens * part, part))
+
+
+def flush() -> None:
+    """Write queued charges now (tools and benchmarks)."""
+    writer.flush()
+
+
+def get_stats() -> dict:
+    with _state.lock:
+        return {**_state.stats, "enabled": ENABLED, "tracked": len(_state.totals),
+                "over": dict(Counter(_state.over.values())), "window_seconds": WINDOW_SECONDS,
+                "writer": writer.get_stats()}
+
+
+def reset_stats() -> None:
+    with _state.lock:
+        for key in _state.stats:
+            _state.stats[key] = 0
+
+
+def _reset_after_fork() -> None:
+    global _state
+    _state = _State()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,177 @@
+"""Latency SLO for LLM calls: switch the game into degraded mode when the provider is slow.
+
+When the provider's latency spikes, every route that generates a puzzle,
+validates an answer or writes a hint slows down at once, and the queue
+behind them turns into timeouts and 503s.  Every completed LLM call's
+latency is recorded here (provider time, not time queued in the governor).
+A failed call (5xx, 429, timeout) counts as a miss.  Once the rolling p95 over
+``LLM_SLO_WINDOW_SECONDS`` (default 60) exceeds ``LLM_SLO_P95_MS`` (default
+8000), with at least ``LLM_SLO_MIN_SAMPLES`` calls in the window, the process
+goes degraded.  ``degraded()`` then tells the engine to stay off the LLM:
+
+- puzzles come from the persistent bank (the LLM only if the bank has none);
+- answers are matched locally only;
+- hints are the stored ones only.
+
+Recovery needs evidence, and a degraded process makes almost no calls.  So
+once every ``LLM_SLO_PROBE_SECONDS`` (default 5) ``degraded()`` answers False
+to one caller, and that call is the probe.  After ``LLM_SLO_RECOVER_PROBES``
+(default 3) probes in a row finish under ``LLM_SLO_RECOVER`` (default 0.75)
+of the SLO, the process switches back with a fresh window.
+
+Each worker decides from its own calls.  Transitions are logged, kept in
+``get_stats()`` (``/llm-status``) and written to the event log as ``slo``
+events.  ``LLM_SLO=0`` turns the controller off.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import event_log
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("LLM_SLO", "1") != "0"
+P95_SECONDS = float(os.environ.get("LLM_SLO_P95_MS", "8000")) / 1000
+WINDOW_SECONDS = float(os.environ.get("LLM_SLO_WINDOW_SECONDS", "60"))
+MIN_SAMPLES = int(os.environ.get("LLM_SLO_MIN_SAMPLES", "20"))
+PROBE_SECONDS = float(os.environ.get("LLM_SLO_PROBE_SECONDS", "5"))
+RECOVER_PROBES = int(os.environ.get("LLM_SLO_RECOVER_PROBES", "3"))
+RECOVER = float(os.environ.get("LLM_SLO_RECOVER", "0.75"))
+MAX_SAMPLES = 5000
+EVALUATE_SECONDS = 1.0   # the p95 is recomputed at most this often
+TRANSITIONS_KEPT = 50
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: deque = deque(maxlen=MAX_SAMPLES)   # (monotonic time, seconds or inf)
+        self.degraded = False
+        self.since = time.time()
+        self.switched = 0.0
+        self.evaluated = 0.0
+        self.p95 = 0.0
+        self.next_probe = 0.0
+        self.good_probes = 0
+        self.transitions: deque = deque(maxlen=TRANSITIONS_KEPT)
+        self.stats = {"samples": 0, "failures": 0, "probes": 0, "degraded_checks": 0}
+
+
+_state = _State()
+
+
+def _p95(now: float) -> tuple[float, int]:
+    """Rolling p95 (seconds) and sample count over the window.  Caller holds _state.lock."""
+    samples = _state.samples
+    while samples and now - samples[0][0] > WINDOW_SECONDS:
+        samples.popleft()
+    if not samples:
+        return 0.0, 0
+    ordered = sorted(seconds for _, seconds in samples)
+    return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], len(ordered)
+
+
+def _transition(degraded: bool, p95: float, samples: int) -> None:
+    """Record a switch.  Caller holds _state.lock."""
+    _state.degraded = degraded
+    _state.since = time.time()
+    _state.switched = time.monotonic()
+    _state.good_probes = 0
+    _state.next_probe = _state.switched + PROBE_SECONDS
+    if not degraded:
+        # The slow samples that tripped the switch would trip it again
+        _state.samples.clear()
+    p95_ms = round(p95 * 1000, 1) if p95 != float("inf") else None
+    _state.transitions.append({"t": round(_state.since, 3), "mode": "degraded" if degraded else "normal",
+                               "p95_ms": p95_ms, "samples": samples})
+    event_log.emit("slo", mode="degraded" if degraded else "normal", p95_ms=p95_ms, n=samples)
+    if degraded:
+        logger.warning("🐢 LLM p95 %s ms over %d calls misses the %.0f ms SLO — degraded mode "
+                       "(bank puzzles, local answers, stored hints)", p95_ms, samples, P95_SECONDS * 1000)
+    else:
+        logger.warning("🐇 %d probes under %.0f ms — LLM back in use", RECOVER_PROBES,
+                       P95_SECONDS * RECOVER * 1000)
+
+
+def record(seconds: float, failed: bool = False) -> None:
+    """Record one LLM call: its provider latency, or a failure (always a miss)."""
+    if not ENABLED:
+        return
+    now = time.monotonic()
+    sample = float("inf") if failed else seconds
+    with _state.lock:
+        _state.stats["samples"] += 1
+        _state.stats["failures"] += failed
+        if now - seconds < _state.switched:
+            # In flight at the last switch: says nothing about the mode we're in now
+            return
+        if _state.degraded:
+            # Calls started while degraded are the probes
+            if sample <= P95_SECONDS * RECOVER:
+                _state.good_probes += 1
+                if _state.good_probes >= RECOVER_PROBES:
+                    _transition(False, sample, _state.good_probes)
+            else:
+                _state.good_probes = 0
+            return
+        _state.samples.append((now, sample))
+        if now - _state.evaluated < EVALUATE_SECONDS:
+            return
+        _state.evaluated = now
+        _state.p95, count = _p95(now)
+        if count >= MIN_SAMPLES and _state.p95 > P95_SECONDS:
+            _transition(True, _state.p95, count)
+
+
+def degraded() -> bool:
+    """True if the caller should stay off the LLM (bank, local matching, stored hints).
+
+    While degraded, one caller per ``PROBE_SECONDS`` gets False: its LLM
+    call is the probe that decides when to switch back.
+    """
+    if not ENABLED or not _state.degraded:
+        return False
+    now = time.monotonic()
+    with _state.lock:
+        if not _state.degraded:
+            return False
+        if now >= _state.next_probe:
+            _state.next_probe = now + PROBE_SECONDS
+            _state.stats["probes"] += 1
+            return False
+        _state.stats["degraded_checks"] += 1
+        return True
+
+
+def get_stats() -> dict:
+    with _state.lock:
+        p95, count = _p95(time.monotonic())
+        return {
+            **_state.stats,
+            "enabled": ENABLED,
+            "mode": "degraded" if _state.degraded else "normal",
+            "since": round(_state.since, 3),
+            "p95_ms": round(p95 * 1000, 1) if p95 != float("inf") else None,
+            "window_samples": count,
+            "slo_p95_ms": P95_SECONDS * 1000,
+            "transitions": list(_state.transitions),
+        }
+
+
+def reset() -> None:
+    """Back to normal mode with an empty window (benchmarks and tools)."""
+    global _state
+    _state = _State()
+
+
+def _reset_after_fork() -> None:
+    # Each worker judges the provider by its own calls
+    reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,453 @@
+"""Party rooms: one generated puzzle sequence shared by a group of players.
+
+A host creates a party and gets a short join code.  Everyone who joins plays
+the same puzzles and narrative, generated once for the whole group, while
+keeping their own ``GameState`` — timer, score, hints and attempts stay per
+player.  Each puzzle of the sequence costs one LLM generation per party, not
+one per player.
+
+State lives in SQLite (``PARTY_DB_PATH``, default ``party.sqlite3`` next to
+this file) so every gunicorn worker sees the same parties:
+
+- ``parties``: code, theme, difficulty, easter-egg slot and a progress
+  ``version`` bumped whenever a member's progress changes;
+- ``party_puzzles``: one row per puzzle of the sequence.  A worker claims a
+  row (``pending``) before generating it and everyone else waits for it to
+  turn ``ready``, so two members reaching a puzzle together — on any
+  worker — never pay for two generations.  A claim older than
+  ``PARTY_CLAIM_TIMEOUT`` (its worker died) can be taken over;
+- ``party_members``: per-member progress shown to the group.
+
+After the host's first puzzle, a background thread generates the rest of the
+sequence in the prefetch lane (promoted to on-demand while a member in this
+process waits for it).  Progress snapshots are cached per process for
+``PARTY_SNAPSHOT_TTL`` seconds and tagged with the party version, so a room
+full of polling members costs about one query per party per interval and
+unchanged polls are answered with 304.
+
+Parties expire ``PARTY_TTL_SECONDS`` after creation.
+"""
+
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+import ai_client
+import llm_governor
+import llm_quota
+from game_engine import GameEngine, GameState, TOTAL_PUZZLES
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get(
+    "PARTY_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "party.sqlite3"),
+)
+PARTY_TTL_SECONDS = int(os.environ.get("PARTY_TTL_SECONDS", str(2 * 60 * 60)))
+MAX_MEMBERS = int(os.environ.get("PARTY_MAX_MEMBERS", "20"))
+CLAIM_TIMEOUT = float(os.environ.get("PARTY_CLAIM_TIMEOUT", "90"))
+SNAPSHOT_TTL = float(os.environ.get("PARTY_SNAPSHOT_TTL", "1.0"))
+
+# How long a member waits for a puzzle someone else is generating (matches
+# puzzle_cache.PENDING_WAIT_SECONDS)
+WAIT_SECONDS = 45
+POLL_SECONDS = 0.1
+
+# Join codes: no 0/O, 1/I/L so they survive being read aloud
+CODE_ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parties (
+    code                TEXT    PRIMARY KEY,
+    theme               TEXT    NOT NULL,
+    difficulty          INTEGER NOT NULL,
+    easter_egg_puzzle   INTEGER NOT NULL,
+    version             INTEGER NOT NULL DEFAULT 0,
+    created_at          REAL    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_parties_created ON parties (created_at);
+CREATE TABLE IF NOT EXISTS party_puzzles (
+    code            TEXT    NOT NULL,
+    idx             INTEGER NOT NULL,
+    status          TEXT    NOT NULL,   -- pending | ready
+    claimed_at      REAL    NOT NULL,
+    puzzle          TEXT,               -- PuzzleState dict as JSON once ready
+    PRIMARY KEY (code, idx)
+);
+CREATE TABLE IF NOT EXISTS party_members (
+    code            TEXT    NOT NULL,
+    member_id       TEXT    NOT NULL,
+    name            TEXT    NOT NULL,
+    puzzle_number   INTEGER NOT NULL DEFAULT 1,
+    solved          INTEGER NOT NULL DEFAULT 0,
+    score           INTEGER NOT NULL DEFAULT 0,
+    status          TEXT    NOT NULL DEFAULT 'playing',
+    joined_at       REAL    NOT NULL,
+    PRIMARY KEY (code, member_id)
+);
+"""
+
+
+class PartyError(ValueError):
+    """Unknown or expired join code, or the party is full."""
+
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Per-thread (and per-process, so forks never share a handle) connection."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    conn = sqlite3.connect(DB_PATH, timeout=5, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+# Created on first use (benchmarks may assign their own)
+engine: Optional[GameEngine] = None
+
+
+def _engine() -> GameEngine:
+    global engine
+    if engine is None:
+        engine = GameEngine()
+    return engine
+
+
+# Per-process state: (code, idx) a request here is waiting on (promotes the
+# prefetcher's call), cached progress snapshots, counters for benchmarks
+_lock = threading.Lock()
+_waiting: Counter = Counter()
+_snapshots: dict[str, tuple[float, dict]] = {}
+_STAT_KEYS = ("created", "joined", "generated", "served", "waited")
+_stats = dict.fromkeys(_STAT_KEYS, 0)
+
+
+def _reset_after_fork() -> None:
+    # The parent's prefetch threads don't exist in the child, and its lock may
+    # have been held mid-fork
+    global _lock, _waiting, _snapshots
+    _lock = threading.Lock()
+    _waiting = Counter()
+    _snapshots = {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _lock:
+        _stats[key] += n
+
+
+def normalize_code(code: str) -> str:
+    return "".join(ch for ch in (code or "").upper() if ch.isalnum())
+
+
+# ---------------------------------------------------------------------------
+# Parties and members
+# ---------------------------------------------------------------------------
+def _expire(conn: sqlite3.Connection, now: float) -> None:
+    cutoff = now - PARTY_TTL_SECONDS
+    expired = [row[0] for row in conn.execute("SELECT code FROM parties WHERE created_at < ?", (cutoff,))]
+    if not expired:
+        return
+    marks = ",".join("?" * len(expired))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table in ("party_members", "party_puzzles", "parties"):
+            conn.execute(f"DELETE FROM {table} WHERE code IN ({marks})", expired)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    logger.info("🧹 [Party] Expired %d parties", len(expired))
+
+
+def create(theme: str, difficulty: int, easter_egg_puzzle: int) -> str:
+    """Open a party and return its join code."""
+    conn = _connect()
+    now = time.time()
+    _expire(conn, now)
+    while True:
+        code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO parties (code, theme, difficulty, easter_egg_puzzle, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (code, theme, difficulty, easter_egg_puzzle, now),
+        )
+        if cur.rowcount:
+            _count("created")
+            logger.info("🎉 [Party] Created %s (%s, difficulty %d)", code, theme, difficulty)
+            return code
+
+
+def get(code: str) -> Optional[dict]:
+    """The party for *code*, or None if it doesn't exist or has expired."""
+    row = _connect().execute("SELECT * FROM parties WHERE code = ?", (normalize_code(code),)).fetchone()
+    if row is None or row["created_at"] < time.time() - PARTY_TTL_SECONDS:
+        return None
+    return dict(row)
+
+
+def join(code: str, name: str) -> str:
+    """Add a member and return their id.  Raises PartyError."""
+    code = normalize_code(code)
+    if get(code) is None:
+        raise PartyError("No party with that code — it may have expired.")
+    conn = _connect()
+    member_id = secrets.token_hex(4)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        members = conn.execute("SELECT COUNT(*) FROM party_members WHERE code = ?", (code,)).fetchone()[0]
+        if members >= MAX_MEMBERS:
+            raise PartyError(f"This party is full ({MAX_MEMBERS} players).")
+        conn.execute(
+            "INSERT INTO party_members (code, member_id, name, joined_at) VALUES (?, ?, ?, ?)",
+            (code, member_id, name or f"Player {members + 1}", time.time()),
+        )
+        conn.execute("UPDATE parties SET version = version + 1 WHERE code = ?", (code,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _invalidate(code)
+    _count("joined")
+    return member_id
+
+
+def report(state: GameState) -> bool:
+    """Publish a member's progress to the party.  Returns True if anything changed."""
+    values = (state.current_puzzle_index + 1, state.solved_count, state.score, state.status)
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.execute(
+            "UPDATE party_members SET puzzle_number = ?, solved = ?, score = ?, status = ? "
+            "WHERE code = ? AND member_id = ? "
+            "AND (puzzle_number != ? OR solved != ? OR score != ? OR status != ?)",
+            values + (state.party_code, state.party_member) + values,
+        )
+        changed = cur.rowcount > 0
+        if changed:
+            conn.execute("UPDATE parties SET version = version + 1 WHERE code = ?", (state.party_code,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if changed:
+        _invalidate(state.party_code)
+    return changed
+
+
+# ---------------------------------------------------------------------------
+# Progress fan-out
+# ---------------------------------------------------------------------------
+def _invalidate(code: str) -> None:
+    with _lock:
+        _snapshots.pop(code, None)
+
+
+def progress(code: str) -> Optional[dict]:
+    """Standings for the party, identical for every member (so responses share one ETag).
+
+    Served from this process's snapshot for up to SNAPSHOT_TTL; after that one
+    cheap version check, and the member list is only re-read when it changed.
+    """
+    code = normalize_code(code)
+    now = time.time()
+    with _lock:
+        cached = _snapshots.get(code)
+    if cached and now - cached[0] < SNAPSHOT_TTL:
+        return cached[1]
+
+    conn = _connect()
+    row = conn.execute("SELECT theme, version, created_at FROM parties WHERE code = ?", (code,)).fetchone()
+    if row is None or row["created_at"] < now - PARTY_TTL_SECONDS:
+        _invalidate(code)
+        return None
+    if cached and cached[1]["version"] == row["version"]:
+        snapshot = cached[1]
+    else:
+        members = conn.execute(
+            "SELECT member_id, name, puzzle_number, solved, score, status FROM party_members "
+            "WHERE code = ? ORDER BY solved DESC, score DESC, joined_at",
+            (code,),
+        ).fetchall()
+        snapshot = {
+            "code": code,
+            "theme": row["theme"],
+            "version": row["version"],
+            "total_puzzles": TOTAL_PUZZLES,
+            "members": [
+                {"id": m["member_id"], "name": m["name"], "puzzle_number": m["puzzle_number"],
+                 "solved": m["solved"], "score": m["score"], "status": m["status"]}
+                for m in members
+            ],
+        }
+    with _lock:
+        if len(_snapshots) > 10_000:
+            _snapshots.clear()
+        _snapshots[code] = (now, snapshot)
+    return snapshot
+
+
+# ---------------------------------------------------------------------------
+# Shared puzzle sequence
+# ---------------------------------------------------------------------------
+def _ready_puzzles(code: str) -> dict[int, dict]:
+    rows = _connect().execute(
+        "SELECT idx, puzzle FROM party_puzzles WHERE code = ? AND status = 'ready'", (code,)
+    ).fetchall()
+    return {row["idx"]: json.loads(row["puzzle"]) for row in rows}
+
+
+def _claim(code: str, idx: int) -> bool:
+    """Take the right to generate puzzle *idx* — new, or abandoned by a dead worker."""
+    conn = _connect()
+    now = time.time()
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO party_puzzles (code, idx, status, claimed_at) VALUES (?, ?, 'pending', ?)",
+        (code, idx, now),
+    )
+    if cur.rowcount:
+        return True
+    cur = conn.execute(
+        "UPDATE party_puzzles SET claimed_at = ? WHERE code = ? AND idx = ? AND status = 'pending' "
+        "AND claimed_at < ?",
+        (now, code, idx, now - CLAIM_TIMEOUT),
+    )
+    if cur.rowcount:
+        logger.warning("🎉 [Party] Took over abandoned generation of puzzle %d for %s", idx + 1, code)
+    return cur.rowcount > 0
+
+
+def _generate(party: dict, idx: int, earlier: dict[int, dict]) -> None:
+    """Generate puzzle *idx* for the party, continuing the story of the puzzles before it."""
+    code = party["code"]
+    puzzles = [earlier[i] for i in range(idx)]
+    state = GameState(
+        theme=party["theme"],
+        status="playing",
+        current_puzzle_index=idx,
+        puzzles=puzzles,
+        narrative_log=[p["narrative_text"] for p in puzzles if p.get("narrative_text")],
+        difficulty_level=party["difficulty"],
+        easter_egg_puzzle=party["easter_egg_puzzle"],
+    )
+    try:
+        state = _engine().generate_puzzle(state)
+    except Exception:
+        # Release the claim so the next member to get here retries
+        _connect().execute("DELETE FROM party_puzzles WHERE code = ? AND idx = ? AND status = 'pending'",
+                           (code, idx))
+        raise
+    _connect().execute(
+        "UPDATE party_puzzles SET status = 'ready', puzzle = ? WHERE code = ? AND idx = ?",
+        (json.dumps(state.puzzles[-1]), code, idx),
+    )
+    _count("generated")
+    logger.info("🎉 [Party] Puzzle %d ready for %s", idx + 1, code)
+
+
+def _ensure(party: dict, idx: int, deadline: float) -> dict[int, dict]:
+    """Make puzzles 0..idx ready (generating or waiting as needed); returns every ready puzzle."""
+    code = party["code"]
+    ready = _ready_puzzles(code)
+    waited = False
+    for i in range(idx + 1):
+        # In order: each puzzle continues the narrative of the ones before it
+        while i not in ready:
+            if _claim(code, i):
+                _generate(party, i, ready)
+            else:
+                if time.time() >= deadline:
+                    raise TimeoutError(f"Party {code} puzzle {i + 1} is still being generated")
+                waited = True
+                time.sleep(POLL_SECONDS)
+            ready = _ready_puzzles(code)
+    if waited:
+        _count("waited")
+    return ready
+
+
+def _waited_on(code: str, idx: int) -> bool:
+    with _lock:
+        return _waiting[(code, idx)] > 0
+
+
+def puzzle(code: str, idx: int, timeout: float = WAIT_SECONDS) -> dict:
+    """Puzzle *idx* of the party's sequence as a cache branch (``{"puzzle", "narrative_text"}``).
+
+    Served from the shared sequence when it's ready; otherwise generated
+    here, or waited for while another member (or the prefetcher) generates it.
+    """
+    party = get(code)
+    if party is None:
+        raise PartyError("No party with that code — it may have expired.")
+    key = (party["code"], idx)
+    with _lock:
+        _waiting[key] += 1
+    try:
+        ready = _ensure(party, idx, time.time() + timeout)
+    finally:
+        with _lock:
+            _waiting[key] -= 1
+            if _waiting[key] <= 0:
+                del _waiting[key]
+    _count("served")
+    shared = ready[idx]
+    return {"puzzle": shared, "narrative_text": shared.get("narrative_text", "")}
+
+
+def start_prefetch(code: str) -> None:
+    """Generate the rest of the sequence in the background, ahead of the fastest member."""
+    # Charged to the member who started it, like their own puzzle cache
+    threading.Thread(target=_prefetch, args=(normalize_code(code), llm_quota.current()), daemon=True,
+                     name=f"party-prefetch-{code}").start()
+
+
+def _prefetch(code: str, payers: tuple = ()) -> None:
+    party = get(code)
+    if party is None:
+        return
+    for idx in range(1, TOTAL_PUZZLES):
+        def lane(idx=idx) -> int:
+            # Speculative until a member in this process is waiting on it
+            return llm_governor.LANE_ON_DEMAND if _waited_on(code, idx) else llm_governor.LANE_PREFETCH
+
+        try:
+            with ai_client.priority(lane), llm_quota.paying(payers):
+                _ensure(party, idx, time.time() + WAIT_SECONDS)
+        except llm_governor.LoadShed as e:
+            # Players who are waiting come first; members generate the rest on demand
+            logger.info("🪶 [Party] Prefetch for %s shed at puzzle %d: %s", code, idx + 1, e)
+            return
+        except Exception as e:
+            logger.error("❌ [Party] Prefetch for %s failed at puzzle %d: %s", code, idx + 1, e)
+            return
+
+
+def get_stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
+
+def reset_stats() -> None:
+    with _lock:
+        for key in _STAT_KEYS:
+            _stats[key] = 0
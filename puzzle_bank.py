@@ -0,0 +1,179 @@
+"""Persistent bank of generated puzzles (SQLite).
+
+Every puzzle ``GameEngine.generate_puzzle`` produces is kept here, indexed by
+theme, puzzle type, difficulty and normalized answer, so a game can draw a
+ready-made puzzle in milliseconds when the LLM is slow or down — without
+repeating a type or answer the player has already seen.
+
+The database path comes from ``PUZZLE_BANK_PATH`` (default
+``puzzle_bank.sqlite3`` next to this file).  Connections are per thread and
+per process, and the file runs in WAL mode so gunicorn workers can read while
+another writes.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+BANK_PATH = os.environ.get(
+    "PUZZLE_BANK_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "puzzle_bank.sqlite3"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS puzzles (
+    id              INTEGER PRIMARY KEY,
+    theme           TEXT    NOT NULL,
+    puzzle_type     TEXT    NOT NULL,
+    difficulty      INTEGER NOT NULL,
+    answer_key      TEXT    NOT NULL,   -- GameEngine._normalize(answer)
+    question        TEXT    NOT NULL,
+    answer          TEXT    NOT NULL,
+    hints           TEXT    NOT NULL,   -- JSON array
+    narrative_text  TEXT    NOT NULL DEFAULT '',
+    source          TEXT    NOT NULL DEFAULT 'live',
+    created_at      REAL    NOT NULL,
+    served_count    INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (theme, answer_key)
+);
+CREATE INDEX IF NOT EXISTS idx_puzzles_draw ON puzzles (theme, difficulty, puzzle_type, served_count);
+"""
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Per-thread (and per-process, so forks never share a handle) connection."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    conn = sqlite3.connect(BANK_PATH, timeout=5, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+def _row_values(theme: str, puzzle: dict, answer_key: str, source: str, now: float) -> tuple:
+    return (
+        theme,
+        puzzle.get("puzzle_type") or puzzle.get("type") or "riddle",
+        int(puzzle.get("difficulty") or 2),
+        answer_key,
+        puzzle.get("question", ""),
+        puzzle.get("answer", ""),
+        json.dumps(puzzle.get("hints") or []),
+        puzzle.get("narrative_text", ""),
+        source,
+        now,
+    )
+
+
+_INSERT = """
+INSERT OR IGNORE INTO puzzles
+    (theme, puzzle_type, difficulty, answer_key, question, answer, hints, narrative_text, source, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def add_puzzle(theme: str, puzzle: dict, answer_key: str, source: str = "live") -> bool:
+    """Store one puzzle. Returns False if the theme already has that answer."""
+    if not answer_key or not puzzle.get("question"):
+        return False
+    cur = _connect().execute(_INSERT, _row_values(theme, puzzle, answer_key, source, time.time()))
+    return cur.rowcount > 0
+
+
+def add_puzzles(rows: Iterable[tuple[str, dict, str]], source: str = "bulk") -> int:
+    """Store many (theme, puzzle, answer_key) rows in one transaction. Returns how many were new."""
+    conn = _connect()
+    now = time.time()
+    values = [_row_values(theme, puzzle, key, source, now) for theme, puzzle, key in rows
+              if key and puzzle.get("question")]
+    if not values:
+        return 0
+    before = conn.total_changes
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(_INSERT, values)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.total_changes - before
+
+
+def draw_puzzle(theme: str, difficulty: int,
+                exclude_types: Iterable[str] = (),
+                exclude_answer_keys: Iterable[str] = ()) -> Optional[dict]:
+    """Pick a banked puzzle for *theme* nearest to *difficulty*.
+
+    Never returns an excluded answer.  Excluded types are avoided when the
+    bank has anything else, otherwise relaxed.  Least-served puzzles win ties
+    so the bank rotates.  Returns a PuzzleState-shaped dict or None.
+    """
+    conn = _connect()
+    answer_keys = list(exclude_answer_keys)
+    types = list(exclude_types)
+    for avoid_types in ([True, False] if types else [False]):
+        where = ["theme = ?"]
+        params: list = [theme]
+        if answer_keys:
+            where.append(f"answer_key NOT IN ({','.join('?' * len(answer_keys))})")
+            params += answer_keys
+        if avoid_types:
+            where.append(f"puzzle_type NOT IN ({','.join('?' * len(types))})")
+            params += types
+        row = conn.execute(
+            f"SELECT * FROM puzzles WHERE {' AND '.join(where)} "
+            "ORDER BY ABS(difficulty - ?), served_count, RANDOM() LIMIT 1",
+            params + [difficulty],
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE puzzles SET served_count = served_count + 1 WHERE id = ?", (row["id"],))
+            return {
+                "question": row["question"],
+                "puzzle_type": row["puzzle_type"],
+                "answer": row["answer"],
+                "hints": json.loads(row["hints"]),
+                "narrative_text": row["narrative_text"],
+                "difficulty": row["difficulty"],
+            }
+    return None
+
+
+def count(theme: Optional[str] = None) -> int:
+    """Number of banked puzzles, optionally for one theme."""
+    if theme is None:
+        return _connect().execute("SELECT COUNT(*) FROM puzzles").fetchone()[0]
+    return _connect().execute("SELECT COUNT(*) FROM puzzles WHERE theme = ?", (theme,)).fetchone()[0]
+
+
+def cell_counts() -> dict[tuple[str, str, int], int]:
+    """Banked puzzle counts per (theme, puzzle_type, difficulty)."""
+    rows = _connect().execute(
+        "SELECT theme, puzzle_type, difficulty, COUNT(*) FROM puzzles GROUP BY theme, puzzle_type, difficulty"
+    ).fetchall()
+    return {(theme, ptype, diff): n for theme, ptype, diff, n in rows}
+
+
+def answer_keys(theme: str) -> set[str]:
+    """Every normalized answer already banked for *theme*."""
+    rows = _connect().execute("SELECT answer_key FROM puzzles WHERE theme = ?", (theme,)).fetchall()
+    return {row[0] for row in rows}
+
+
+def recent_answers(theme: str, limit: int) -> list[str]:
+    """The last *limit* answers banked for *theme*, oldest first."""
+    rows = _connect().execute(
+        "SELECT answer FROM puzzles WHERE theme = ? ORDER BY id DESC LIMIT ?", (theme, limit)
+    ).fetchall()
+    return [row[0] for row in reversed(rows)]
@@ -1,103 +1,393 @@
 """Background puzzle pre-generation cache.
 
-Generates all puzzles ahead of time in background threads so the player
-never waits for AI after the first puzzle.
+Generates upcoming puzzles ahead of time in background threads so the player
+rarely waits for AI after the first puzzle.
 
-Fix #5: Cache entries have a TTL (30 min) and the total cache is capped
-at MAX_SESSIONS to prevent unbounded memory growth.
+Fix #5: Cache entries have a TTL (30 min) and the cache is capped so memory
+can't grow without bound — by bytes (CACHE_MAX_BYTES, from per-session size
+accounting), evicting least-recently-used sessions first.  Sessions live in
+a ``cache_core.ShardedCache``: LRU touch, insert and TTL expiry are O(1) /
+O(log n) and each shard has its own lock, so players on different shards
+never contend.
+
+In-flight generations are registered as futures so an on-demand request
+for a puzzle the background thread is already working on waits for that
+result (and bumps it to the front of the queue) instead of paying for a
+second LLM call.
+
+Adaptive difficulty: the player's level can move one step after every
+answer, so the prefetcher keeps a rolling window of branches — the next
+LOOKAHEAD puzzles, each at difficulty d-1, d and d+1 around the current
+level.  The route picks the branch matching the adjusted level with a dict
+lookup and reports progress through ``advance``, which slides the window.
+Branches nobody played are recycled into a shared pool per (theme,
+difficulty) that other sessions draw from before calling the LLM (every
+generated puzzle is also kept in the persistent puzzle bank).
 """
 
+import os
 import threading
 import logging
 import time
 import copy
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from typing import Optional
 
-from game_engine import GameEngine, GameState, PuzzleState, TOTAL_PUZZLES
+import ai_client
+import llm_governor
+import llm_quota
+import request_timing
+from cache_core import CacheShard, ShardedCache, deep_sizeof
+from game_engine import GameEngine, GameState, TOTAL_PUZZLES
+
+# Thread-safety: everything about a session — its branches, queue, futures
+# ("pending"), promoted branches and generator count — lives in its cache
+# entry and is only touched under that session's shard lock.  Background
+# threads check ``entry["alive"]`` (cleared on eviction, invalidation or a
+# new game) under the lock before writing, so a stale thread can never touch
+# a newer game on the same session id.  The recycle pool has its own lock,
+# always taken after (never while waiting for) a shard lock.  Futures are
+# resolved under the lock but waited on outside it.
 
 logger = logging.getLogger(__name__)
 
 # --- Fix #5: TTL and size limits ---
 CACHE_TTL_SECONDS = 30 * 60   # 30 minutes
-MAX_SESSIONS = 200             # max concurrent cached sessions
+CACHE_MAX_BYTES = int(os.environ.get("PUZZLE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_SHARDS = int(os.environ.get("PUZZLE_CACHE_SHARDS", "16"))
+
+# How long an on-demand request waits for an in-flight background generation
+# before giving up and generating the puzzle itself.
+PENDING_WAIT_SECONDS = 45
+
+# Prefetch shed by the LLM governor is retried with linear backoff, then dropped
+MAX_SHEDS = 3
+SHED_BACKOFF_SECONDS = 2
+
+# Rolling prefetch window: how many upcoming puzzles get difficulty branches.
+# Every extra puzzle of lookahead costs up to three more LLM calls per answer
+# (about 8 vs 10 calls per game at 1 and 2 in bench_games), and branches past the next
+# puzzle are written without its puzzle or narrative in the prompt, so they
+# may repeat its type or answer.  Only worth raising when the LLM is slower
+# than players answer.
+LOOKAHEAD = max(1, int(os.environ.get("PUZZLE_LOOKAHEAD", "1")))
+
+# Generator threads per session, so sibling branches are generated side by side
+BRANCH_WORKERS = 3
+
+# Unused branches kept per (theme, difficulty) for other sessions
+POOL_PER_CELL = 20
+
+# Branch = (puzzle_idx, difficulty); a cached branch is
+# {"puzzle": dict, "narrative_text": str, "difficulty": int}
+Branch = tuple[int, int]
+
+# Session entry: {
+#     "theme": str, "state": GameState dict the window was planned from,
+#     "puzzles": {idx: {difficulty: cached}}, "queue": {branch, ...} not started yet,
+#     "pending": {branch: Future} in flight or queued, "promoted": {branch, ...} a player waits on,
+#     "generating": running generator threads, "alive": False once dropped,
+#     "state_bytes": int, "branch_bytes": {branch: int}, "created_at": float }
+
+# Recycled branches: (theme, difficulty) -> cached entries, oldest first
+_pool: dict[tuple[str, int], deque] = {}
+_pool_lock = threading.Lock()
+_pool_stats = {"recycled": 0}
+
+# Lookup counters for benchmarks, per shard: served from cache, served after
+# waiting on an in-flight generation, served from the shared pool, or missed
+# (caller generated on-demand) — plus how many prefetches were filled from
+# the pool instead of the LLM.  Recycled branches are counted in _pool_stats.
+_STAT_KEYS = ("hits", "waits", "pooled", "misses", "reused")
+
+# Created on first use (benchmarks may assign their own)
+engine: Optional[GameEngine] = None
+
+
+def _engine() -> GameEngine:
+    global engine
+    if engine is None:
+        engine = GameEngine()
+    return engine
+
+
+def _release(session_id: str, entry: dict, reason: str) -> None:
+    """Eviction callback: retire an entry, recycle its unplayed branches, release waiters.
+
+    Runs under the entry's shard lock.
+    """
+    entry["alive"] = False
+    for branches in entry["puzzles"].values():
+        for cached in branches.values():
+            _recycle(entry["theme"], cached)
+    entry["promoted"].clear()
+    entry["queue"].clear()
+    for future in entry["pending"].values():
+        if not future.done():
+            future.set_result(None)
+    entry["pending"].clear()
+    if reason in ("expired", "budget"):
+        logger.info("🧹 [Cache] Evicted session %s (%s)", session_id, reason)
+
+
+_sessions = ShardedCache(CACHE_MAX_BYTES, CACHE_TTL_SECONDS, CACHE_SHARDS, on_evict=_release)
+_stats = [dict.fromkeys(_STAT_KEYS, 0) for _ in _sessions.shards]
+
+
+def _reset_after_fork() -> None:
+    """Start a forked child (e.g. a gunicorn worker under ``--preload``) with an empty cache.
+
+    The parent's entries point at generator threads and futures that do not
+    exist in the child, and its locks may have been held mid-fork.
+    """
+    global _sessions, _stats, _pool, _pool_lock
+    _sessions = ShardedCache(CACHE_MAX_BYTES, CACHE_TTL_SECONDS, CACHE_SHARDS, on_evict=_release)
+    _stats = [dict.fromkeys(_STAT_KEYS, 0) for _ in _sessions.shards]
+    _pool = {}
+    _pool_lock = threading.Lock()
+    _pool_stats["recycled"] = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _count(shard: CacheShard, key: str) -> None:
+    """Bump a lookup counter.  Caller must hold the shard lock."""
+    _stats[shard.index][key] += 1
+
+
+def _branches(difficulty: int) -> list[int]:
+    """Difficulties to prefetch around *difficulty*, most likely first."""
+    return [d for d in (difficulty, difficulty - 1, difficulty + 1) if 1 <= d <= 5]
+
+
+def _window(state: GameState) -> list[Branch]:
+    """Branches the player may need next, in generation order."""
+    first = state.current_puzzle_index + 1
+    return [
+        (idx, d)
+        for idx in range(first, min(first + LOOKAHEAD, TOTAL_PUZZLES))
+        for d in _branches(state.difficulty_level)
+    ]
+
+
+def _recycle(theme: str, cached: dict) -> None:
+    """Offer an unplayed branch to other sessions."""
+    if theme == "custom" or cached["puzzle"].get("is_easter_egg"):
+        return
+    with _pool_lock:
+        _pool.setdefault((theme, cached["difficulty"]), deque(maxlen=POOL_PER_CELL)).append(cached)
+        _pool_stats["recycled"] += 1
+
+
+def _take_from_pool(theme: str, difficulty: int, seen: list[dict]) -> Optional[dict]:
+    """Pop a pooled branch with an answer the player hasn't seen, preferring a new type."""
+    seen_keys = {GameEngine._normalize(p.get("answer", "")) for p in seen}
+    seen_types = {p.get("puzzle_type") for p in seen}
+    with _pool_lock:
+        cell = _pool.get((theme, difficulty))
+        if not cell:
+            return None
+        chosen = None
+        for cached in cell:
+            if GameEngine._normalize(cached["puzzle"].get("answer", "")) in seen_keys:
+                continue
+            if cached["puzzle"].get("puzzle_type") not in seen_types:
+                chosen = cached
+                break
+            chosen = chosen or cached
+        if chosen is not None:
+            cell.remove(chosen)
+        return chosen
 
-# In-memory cache: session_id -> { "puzzles": {idx: dict}, "created_at": float }
-_cache: dict[str, dict] = {}
-_cache_lock = threading.Lock()
 
-# Track which sessions have background generation running
-_generating: dict[str, bool] = {}
+def _resolve_pending(entry: dict, branch: Branch, cached: Optional[dict] = None,
+                     error: Optional[BaseException] = None) -> None:
+    """Complete the future for a branch.  Caller must hold the shard lock."""
+    future = entry["pending"].pop(branch, None)
+    entry["promoted"].discard(branch)
+    if future is None or future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(cached)
 
-engine = GameEngine()
 
+def _entry_size(entry: dict) -> int:
+    """Accounted bytes for a session: its state snapshot plus cached branches."""
+    return entry["state_bytes"] + sum(entry["branch_bytes"].values()) + 1024
 
-def _generate_puzzles_background(session_id: str, state: GameState):
-    """Generate puzzles 2..N in the background and cache them."""
-    logger.info("🚀 [Cache] Starting background generation for session %s (puzzles 2-%d)", session_id, TOTAL_PUZZLES)
 
-    # We need a copy of the state to avoid race conditions
-    bg_state = GameState.from_dict(state.to_dict())
+def _plan(shard: CacheShard, session_id: str, entry: dict, state: GameState) -> int:
+    """Slide the session's window to *state*.  Returns how many generators to start.
 
-    for puzzle_idx in range(1, TOTAL_PUZZLES):
-        # Check if session was invalidated (player left)
-        with _cache_lock:
-            if session_id not in _cache:
+    Branches behind the player or outside the new window are recycled (if
+    cached) or cancelled (if pending and nobody is waiting on them); missing
+    branches get a future and join the queue.  Caller must hold the shard lock.
+    """
+    entry["state"] = state.to_dict()
+    entry["state_bytes"] = deep_sizeof(entry["state"])
+    wanted = _window(state)
+
+    for idx in list(entry["puzzles"]):
+        branches = entry["puzzles"][idx]
+        for d in [d for d in branches if (idx, d) not in wanted]:
+            entry["branch_bytes"].pop((idx, d), None)
+            _recycle(entry["theme"], branches.pop(d))
+        if not branches:
+            del entry["puzzles"][idx]
+
+    for branch in [b for b in entry["pending"] if b not in wanted and b not in entry["promoted"]]:
+        # Queued ones are dropped; running ones are recycled when they land
+        entry["queue"].discard(branch)
+        _resolve_pending(entry, branch)
+
+    for idx, d in wanted:
+        if d in entry["puzzles"].get(idx, {}) or (idx, d) in entry["pending"]:
+            continue
+        entry["pending"][(idx, d)] = Future()
+        entry["queue"].add((idx, d))
+
+    shard.resize(session_id, _entry_size(entry))
+    extra = max(0, min(BRANCH_WORKERS, len(entry["queue"])) - entry["generating"])
+    entry["generating"] += extra
+    return extra
+
+
+def _next_branch(entry: dict) -> Branch:
+    """Pick the next branch to generate: promoted first, then nearest puzzle and level.
+
+    Caller must hold the shard lock.
+    """
+    promoted = [b for b in entry["queue"] if b in entry["promoted"]]
+    level = entry["state"]["difficulty_level"]
+    return min(promoted or entry["queue"], key=lambda b: (b[0], abs(b[1] - level), b[1]))
+
+
+def _generate_puzzles_background(session_id: str, entry: dict, payers: tuple = ()):
+    """Generate the session's queued branches and cache them, until the queue is empty.
+
+    LLM calls are charged to *payers*, the request that started the worker.
+    """
+    logger.info("🚀 [Cache] Starting background generation for session %s", session_id)
+    shard = _sessions.shard(session_id)
+    sheds: dict[Branch, int] = {}
+
+    while True:
+        # Check if session was invalidated (player left) or replaced by a new game
+        with shard.lock:
+            if not entry["alive"]:
                 logger.info("🛑 [Cache] Session %s invalidated, stopping background gen", session_id)
                 return
+            if not entry["queue"]:
+                entry["generating"] -= 1
+                break
+            branch = _next_branch(entry)
+            entry["queue"].discard(branch)
+            puzzle_idx, difficulty = branch
+            snapshot = entry["state"]
+        cached = _take_from_pool(entry["theme"], difficulty, snapshot["puzzles"])
+        if cached:
+            with shard.lock:
+                _count(shard, "reused")
 
-        try:
-            # Set the puzzle index we want to generate
-            bg_state.current_puzzle_index = puzzle_idx
-
-            t0 = time.time()
-            bg_state = engine.generate_puzzle(bg_state)
-            elapsed = time.time() - t0
-
-            puzzle = bg_state.current_puzzle
-            if puzzle:
-                with _cache_lock:
-                    if session_id in _cache:
-                        _cache[session_id]["puzzles"][puzzle_idx] = {
-                            "puzzle": puzzle.to_dict(),
-                            "narrative_text": puzzle.narrative_text,
-                        }
-                        logger.info(
-                            "✅ [Cache] Puzzle %d/%d cached for session %s (%.1fs) — %s",
-                            puzzle_idx + 1, TOTAL_PUZZLES, session_id, elapsed,
-                            puzzle.question[:60]
-                        )
-                    else:
-                        logger.info("🛑 [Cache] Session %s gone, discarding puzzle %d", session_id, puzzle_idx + 1)
-                        return
-        except Exception as e:
-            logger.error("❌ [Cache] Failed to generate puzzle %d for session %s: %s", puzzle_idx + 1, session_id, e)
-            # Don't stop — try the next one, the game can fall back to on-demand generation
-
-    with _cache_lock:
-        _generating.pop(session_id, None)
+        def lane(branch=branch) -> int:
+            # Speculative until a player is actually waiting on this branch
+            with shard.lock:
+                promoted = branch in entry["promoted"]
+            return llm_governor.LANE_ON_DEMAND if promoted else llm_governor.LANE_PREFETCH
 
-    logger.info("🏁 [Cache] Background generation complete for session %s", session_id)
+        elapsed = 0.0
+        if cached is None:
+            try:
+                # Generate from the player's real progress at the branch's level
+                # (a private copy — sibling workers share the snapshot)
+                bg_state = GameState.from_dict(copy.deepcopy(snapshot))
+                bg_state.current_puzzle_index = puzzle_idx
+                bg_state.difficulty_level = difficulty
 
+                t0 = time.time()
+                with ai_client.priority(lane), llm_quota.paying(payers):
+                    bg_state = _engine().generate_puzzle(bg_state)
+                elapsed = time.time() - t0
+
+                puzzle = bg_state.puzzles[-1]
+                cached = {
+                    "puzzle": puzzle,
+                    "narrative_text": puzzle.get("narrative_text", ""),
+                    "difficulty": difficulty,
+                }
+            except llm_quota.QuotaExceeded as e:
+                # Over budget for minutes, not congested for seconds: retrying
+                # would only hold a worker.  The game generates on demand.
+                logger.info("🪙 [Cache] Puzzle %d (d%d) for session %s not prefetched: %s",
+                            puzzle_idx + 1, difficulty, session_id, e)
+                with shard.lock:
+                    if entry["alive"] and branch in entry["pending"]:
+                        _resolve_pending(entry, branch, error=e)
+                continue
+            except llm_governor.LoadShed as e:
+                # Provider is busy with players who are waiting — back off and
+                # retry later.  The branch stays pending, so a player who
+                # reaches it first promotes it out of the prefetch lane.
+                sheds[branch] = sheds.get(branch, 0) + 1
+                logger.info("🪶 [Cache] Puzzle %d (d%d) for session %s shed (%d/%d): %s",
+                            puzzle_idx + 1, difficulty, session_id, sheds[branch], MAX_SHEDS, e)
+                requeued = False
+                with shard.lock:
+                    if entry["alive"] and branch in entry["pending"]:
+                        if sheds[branch] >= MAX_SHEDS:
+                            _resolve_pending(entry, branch, error=e)
+                        else:
+                            entry["queue"].add(branch)
+                            requeued = True
+                if requeued:
+                    # Nothing to wait for if the branch is settled or the session gone
+                    time.sleep(SHED_BACKOFF_SECONDS * sheds[branch])
+                continue
+            except Exception as e:
+                logger.error("❌ [Cache] Failed to generate puzzle %d (d%d) for session %s: %s",
+                             puzzle_idx + 1, difficulty, session_id, e)
+                # Don't stop — try the next one, the game can fall back to on-demand generation
+                with shard.lock:
+                    if entry["alive"]:
+                        _resolve_pending(entry, branch, error=e)
+                continue
+
+        size = deep_sizeof(cached)
+        with shard.lock:
+            stored = entry["alive"] and branch in entry["pending"]
+            if stored:
+                entry["puzzles"].setdefault(puzzle_idx, {})[difficulty] = cached
+                entry["branch_bytes"][branch] = size
+                _resolve_pending(entry, branch, cached)
+                shard.resize(session_id, _entry_size(entry))
+        if stored:
+            logger.info(
+                "✅ [Cache] Puzzle %d/%d (d%d) cached for session %s (%.1fs) — %s",
+                puzzle_idx + 1, TOTAL_PUZZLES, difficulty, session_id, elapsed,
+                cached["puzzle"].get("question", "")[:60]
+            )
+        else:
+            # The player moved past this branch (or left) while it was generating
+            _recycle(entry["theme"], cached)
+
+    logger.info("🏁 [Cache] Background generation complete for session %s", session_id)
 
-def _evict_expired() -> None:
-    """Remove expired sessions and enforce MAX_SESSIONS cap.  Caller must hold _cache_lock."""
-    now = time.time()
-    expired = [sid for sid, entry in _cache.items()
-               if now - entry.get("created_at", 0) > CACHE_TTL_SECONDS]
-    for sid in expired:
-        del _cache[sid]
-        _generating.pop(sid, None)
-    if expired:
-        logger.info("🧹 [Cache] Evicted %d expired session(s)", len(expired))
 
-    # LRU-style cap: remove oldest sessions if over limit
-    if len(_cache) > MAX_SESSIONS:
-        sorted_sids = sorted(_cache, key=lambda s: _cache[s].get("created_at", 0))
-        to_remove = sorted_sids[:len(_cache) - MAX_SESSIONS]
-        for sid in to_remove:
-            del _cache[sid]
-            _generating.pop(sid, None)
-        logger.info("🧹 [Cache] Evicted %d session(s) over cap", len(to_remove))
+def _start_generators(session_id: str, entry: dict, count: int) -> None:
+    # Context variables don't cross into new threads: hand over who pays
+    payers = llm_quota.current()
+    for _ in range(count):
+        thread = threading.Thread(
+            target=_generate_puzzles_background,
+            args=(session_id, entry, payers),
+            daemon=True,
+        )
+        thread.start()
 
 
 def start_precaching(session_id: str, state: GameState):
@@ -105,50 +395,163 @@ def start_precaching(session_id: str, state: GameState):
 
     Call this right after the first puzzle is generated and the game starts.
     """
-    with _cache_lock:
-        _evict_expired()
-        _cache[session_id] = {"puzzles": {}, "created_at": time.time()}
-        _generating[session_id] = True
-
-    thread = threading.Thread(
-        target=_generate_puzzles_background,
-        args=(session_id, state),
-        daemon=True,
-    )
-    thread.start()
-
-
-def get_cached_puzzle(session_id: str, puzzle_index: int) -> Optional[dict]:
-    """Get a pre-generated puzzle from cache, or None if not ready yet."""
-    with _cache_lock:
-        entry = _cache.get(session_id)
+    entry = {
+        "theme": state.theme, "puzzles": {}, "queue": set(), "pending": {}, "promoted": set(),
+        "generating": 0, "alive": True, "state_bytes": 0, "branch_bytes": {}, "created_at": time.time(),
+    }
+    shard = _sessions.shard(session_id)
+    with shard.lock:
+        # A new game on the same session supersedes whatever was running
+        shard.put(session_id, entry, _entry_size(entry))
+        start = _plan(shard, session_id, entry, state)
+    _start_generators(session_id, entry, start)
+
+
+def advance(session_id: str, state: GameState) -> None:
+    """Report the player's progress so the prefetch window follows them.
+
+    Call after a puzzle has been served (the state's current puzzle is the
+    one being played).  Unplayed branches behind the player are recycled.
+    """
+    shard = _sessions.shard(session_id)
+    with shard.lock:
+        entry = shard.get(session_id)
+        if entry is None or entry["theme"] != state.theme:
+            return
+        start = _plan(shard, session_id, entry, state)
+    _start_generators(session_id, entry, start)
+
+
+def get_cached_puzzle(session_id: str, puzzle_index: int, difficulty: int) -> Optional[dict]:
+    """Get a pre-generated branch from cache without consuming it, or None if not ready yet."""
+    shard = _sessions.shard(session_id)
+    with shard.lock:
+        entry = shard.get(session_id)
         if not entry:
             return None
-        # Check TTL
-        if time.time() - entry.get("created_at", 0) > CACHE_TTL_SECONDS:
-            _cache.pop(session_id, None)
-            _generating.pop(session_id, None)
-            return None
-        return entry["puzzles"].get(puzzle_index)
+        return entry["puzzles"].get(puzzle_index, {}).get(difficulty)
+
+
+def wait_for_puzzle(session_id: str, state: GameState,
+                    timeout: float = PENDING_WAIT_SECONDS) -> Optional[dict]:
+    """Take the prefetched puzzle for the state's current index and difficulty.
+
+    Waits for an in-flight generation of that branch if there is one (and
+    promotes it so the background thread generates it next); otherwise
+    tries the shared pool of recycled branches.  Returns None if nothing
+    fits, the generation failed, or *timeout* elapsed — the caller should
+    then generate on-demand.
+    """
+    branch = (state.current_puzzle_index, state.difficulty_level)
+    shard = _sessions.shard(session_id)
+    # Cache and pending lookups share one critical section: a puzzle that
+    # lands between them would otherwise be counted (and served) as a miss.
+    with request_timing.acquire(shard.lock, "cache_lock"):
+        entry = shard.get(session_id)
+        if entry and entry["theme"] != state.theme:
+            entry = None  # the session has moved on to another game
+        cached = _take_branch(entry, branch) if entry else None
+        if cached:
+            _count(shard, "hits")
+            shard.resize(session_id, _entry_size(entry))
+            return cached
+        future = entry["pending"].get(branch) if entry else None
+        if future is not None:
+            entry["promoted"].add(branch)
+    if future is None:
+        cached = _take_from_pool(state.theme, state.difficulty_level, state.puzzles)
+        with shard.lock:
+            _count(shard, "pooled" if cached else "misses")
+        return cached
+
+    logger.info("⏳ [Cache] Waiting on in-flight puzzle %d (d%d) for session %s",
+                branch[0] + 1, branch[1], session_id)
+    result = None
+    try:
+        with request_timing.phase("cache_wait"):
+            result = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        logger.warning("⌛ [Cache] Gave up waiting for puzzle %d for session %s after %.0fs",
+                       branch[0] + 1, session_id, timeout)
+    except Exception as e:
+        logger.warning("⚠️ [Cache] In-flight puzzle %d for session %s failed: %s",
+                       branch[0] + 1, session_id, e)
+    with shard.lock:
+        if result and entry["alive"]:
+            _take_branch(entry, branch)
+            shard.resize(session_id, _entry_size(entry))
+        _count(shard, "waits" if result else "misses")
+    return result
+
+
+def _take_branch(entry: dict, branch: Branch) -> Optional[dict]:
+    """Remove and return a cached branch — O(1).  Caller must hold the shard lock."""
+    idx, difficulty = branch
+    branches = entry["puzzles"].get(idx)
+    if not branches:
+        return None
+    cached = branches.pop(difficulty, None)
+    entry["branch_bytes"].pop(branch, None)
+    if not branches:
+        del entry["puzzles"][idx]
+    return cached
 
 
 def invalidate_session(session_id: str):
     """Remove all cached puzzles for a session (player left or game ended)."""
-    with _cache_lock:
-        _cache.pop(session_id, None)
-        _generating.pop(session_id, None)
+    _sessions.remove(session_id)
 
 
 def get_cache_status(session_id: str) -> dict:
     """Get cache status for debugging."""
-    with _cache_lock:
-        entry = _cache.get(session_id)
+    shard = _sessions.shard(session_id)
+    with shard.lock:
+        entry = shard.get(session_id, touch=False)
         if not entry:
-            return {"cached_puzzles": [], "count": 0, "generating": False}
-        puzzles = entry.get("puzzles", {})
+            return {"cached_puzzles": {}, "count": 0, "generating": 0}
+        puzzles = {idx: sorted(branches) for idx, branches in entry["puzzles"].items()}
         return {
-            "cached_puzzles": list(puzzles.keys()),
-            "count": len(puzzles),
-            "generating": _generating.get(session_id, False),
+            "cached_puzzles": puzzles,
+            "count": sum(len(branches) for branches in puzzles.values()),
+            "generating": entry["generating"],
+            "pending_puzzles": sorted(list(b) for b in entry["pending"]),
+            "promoted_puzzles": sorted(list(b) for b in entry["promoted"]),
+            "bytes": _entry_size(entry),
             "age_seconds": round(time.time() - entry.get("created_at", 0), 1),
         }
+
+
+def get_stats() -> dict:
+    """Process-wide lookup counters plus current cache occupancy."""
+    totals = dict.fromkeys(_STAT_KEYS, 0)
+    generating = pending = 0
+    for shard in _sessions.shards:
+        with shard.lock:
+            for key, value in _stats[shard.index].items():
+                totals[key] += value
+            for entry in shard.values():
+                generating += entry["generating"] > 0
+                pending += len(entry["pending"])
+    core = _sessions.stats()
+    with _pool_lock:
+        totals["recycled"] = _pool_stats["recycled"]
+        pool = sum(len(cell) for cell in _pool.values())
+    return {
+        **totals,
+        "sessions": core["entries"],
+        "bytes": core["bytes"],
+        "max_bytes": core["max_bytes"],
+        "evictions": core["evictions"],
+        "generating": generating,
+        "pending": pending,
+        "pool": pool,
+    }
+
+
+def reset_stats() -> None:
+    """Zero the lookup counters (benchmarks call this between runs)."""
+    for shard in _sessions.shards:
+        with shard.lock:
+            _stats[shard.index] = dict.fromkeys(_STAT_KEYS, 0)
+    with _pool_lock:
+        _pool_stats["recycled"] = 0
@@ -0,0 +1,305 @@
+"""Per-request phase timing, ``Server-Timing`` headers and a slow-request profiler.
+
+Code marks the phases it wants measured::
+
+    with request_timing.phase("state"):
+        state = GameState.from_dict(data)
+
+    @request_timing.timed("engine.check_answer")
+    def check_answer(...): ...
+
+    with request_timing.acquire(shard.lock, "cache_lock"):
+        ...
+
+Durations accumulate per phase name in a context variable that is only set
+while a request is being served, so the same code running on a background
+prefetch thread records nothing and costs one ``ContextVar.get``.  Phases
+nest — ``engine.check_answer`` includes the ``llm`` time inside it — and
+``total`` is the whole WSGI call, session load and save included.
+
+``init_app(app)`` wraps the WSGI app and the session interface, times JSON
+encoding and template rendering, and at the end of every request:
+
+- adds ``Server-Timing: session;dur=0.4, state;dur=0.1, llm;dur=812.0, ...``
+  (``REQUEST_TIMING_HEADER=0`` to omit it);
+- logs one JSON record on the ``request_timing`` logger
+  (``REQUEST_TIMING_LOG``: ``all``, ``slow`` or ``off``; slow means at least
+  ``REQUEST_SLOW_MS``).
+
+``REQUEST_PROFILE=1`` starts a sampling profiler. A single daemon thread
+samples the stacks of threads serving a request every
+``REQUEST_PROFILE_INTERVAL_MS``. Requests that take at least
+``REQUEST_PROFILE_THRESHOLD_MS`` are written to ``REQUEST_PROFILE_DIR`` in
+collapsed-stack format, which flamegraph.pl and speedscope read. Faster
+requests are discarded. Only OS threads are sampled, so gevent greenlets
+are not seen.
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("REQUEST_TIMING", "1") != "0"
+HEADER = os.environ.get("REQUEST_TIMING_HEADER", "1") != "0"
+LOG_MODE = os.environ.get("REQUEST_TIMING_LOG", "all").lower()
+SLOW_MS = float(os.environ.get("REQUEST_SLOW_MS", "1000"))
+
+PROFILE = os.environ.get("REQUEST_PROFILE", "0") == "1"
+PROFILE_THRESHOLD_MS = float(os.environ.get("REQUEST_PROFILE_THRESHOLD_MS", "1000"))
+PROFILE_INTERVAL_MS = float(os.environ.get("REQUEST_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("REQUEST_PROFILE_DIR", "profiles")
+
+# Phase name -> seconds for the request being served in this context
+_phases: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("request_phases", default=None)
+
+
+# ---------------------------------------------------------------------------
+# Marking phases
+# ---------------------------------------------------------------------------
+def add(name: str, seconds: float) -> None:
+    """Add *seconds* to phase *name* of the current request (no-op outside one)."""
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+@contextmanager
+def phase(name: str):
+    """Time the block as phase *name*."""
+    if _phases.get() is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - t0)
+
+
+def timed(name: str) -> Callable:
+    """Decorator: time every call of the function as phase *name*."""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def acquire(lock, name: str):
+    """``with lock:`` that records how long acquiring it took as phase *name*."""
+    t0 = time.perf_counter()
+    with lock:
+        add(name, time.perf_counter() - t0)
+        yield
+
+
+def current() -> dict:
+    """Phases recorded so far in this request, in milliseconds."""
+    return {name: round(seconds * 1000, 2) for name, seconds in (_phases.get() or {}).items()}
+
+
+def server_timing(phases: dict) -> str:
+    """Format ``{name: ms}`` as a ``Server-Timing`` header value."""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in phases.items())
+
+
+def parse_server_timing(value: str) -> dict:
+    """``{name: ms}`` from a ``Server-Timing`` header (for benchmarks)."""
+    phases = {}
+    for item in value.split(","):
+        name, _, params = item.strip().partition(";")
+        for param in params.split(";"):
+            key, _, ms = param.strip().partition("=")
+            if key == "dur" and name:
+                phases[name] = float(ms)
+    return phases
+
+
+# ---------------------------------------------------------------------------
+# Sampling profiler
+# ---------------------------------------------------------------------------
+class SamplingProfiler:
+    """One daemon thread sampling the stacks of threads that are serving a request."""
+
+    def __init__(self, interval: float, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._active: dict[int, Counter] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_running(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+            self._thread.start()
+
+    def begin(self) -> None:
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            self._ensure_running()
+
+    def end(self) -> Counter:
+        with self._lock:
+            return self._active.pop(threading.get_ident(), Counter())
+
+    def _stack(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[self._stack(frame)] += 1
+
+
+_profiler: Optional[SamplingProfiler] = None
+
+
+def _reset_after_fork() -> None:
+    # The sampler thread does not survive fork; the next request restarts it
+    global _profiler
+    if _profiler is not None:
+        _profiler = SamplingProfiler(_profiler.interval, _profiler.max_depth)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _write_profile(record: dict, samples: Counter) -> Optional[str]:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = record["path"].strip("/").replace("/", "_") or "index"
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{route}-"
+                                      f"{record['total_ms']:.0f}ms.folded")
+    with open(path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Flask integration
+# ---------------------------------------------------------------------------
+class _TimingMiddleware:
+    """Outermost WSGI layer: owns the per-request phase dict, header and log record."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        phases: dict = {}
+        token = _phases.set(phases)
+        if _profiler:
+            _profiler.begin()
+        t0 = time.perf_counter()
+        status_holder = []
+
+        def timed_start_response(status, headers, exc_info=None):
+            total = time.perf_counter() - t0
+            status_holder.append(status)
+            if HEADER:
+                ms = {name: seconds * 1000 for name, seconds in phases.items()}
+                ms["total"] = total * 1000
+                headers = list(headers) + [("Server-Timing", server_timing(ms))]
+            return start_response(status, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, timed_start_response)
+        finally:
+            total_ms = (time.perf_counter() - t0) * 1000
+            _phases.reset(token)
+            samples = _profiler.end() if _profiler else None
+            self._finish(environ, status_holder, phases, total_ms, samples)
+
+    @staticmethod
+    def _finish(environ, status_holder: list, phases: dict, total_ms: float,
+                samples: Optional[Counter]) -> None:
+        profiled = bool(samples) and total_ms >= PROFILE_THRESHOLD_MS
+        if not (LOG_MODE == "all" or (LOG_MODE == "slow" and total_ms >= SLOW_MS) or profiled):
+            return
+        record = {
+            "method": environ.get("REQUEST_METHOD"),
+            "path": environ.get("PATH_INFO", ""),
+            "status": int(status_holder[0].split()[0]) if status_holder else None,
+            "total_ms": round(total_ms, 2),
+            "phases": {name: round(seconds * 1000, 2) for name, seconds in phases.items()},
+        }
+        if profiled:
+            record["profile"] = _write_profile(record, samples)
+        logger.info("⏱️ %s", json.dumps(record, separators=(",", ":")))
+
+
+def init_app(app) -> None:
+    """Instrument a Flask app: WSGI total, session load/save, JSON encoding, template rendering."""
+    global _profiler
+    if not ENABLED:
+        return
+    from flask import before_render_template, template_rendered
+    from flask.json.provider import DefaultJSONProvider
+
+    base_session = app.session_interface
+
+    class TimedSessionInterface(type(base_session)):
+        def open_session(self, app, request):
+            with phase("session"):
+                return super().open_session(app, request)
+
+        def save_session(self, app, session, response):
+            with phase("session"):
+                return super().save_session(app, session, response)
+
+    timed_session = TimedSessionInterface.__new__(TimedSessionInterface)
+    timed_session.__dict__.update(base_session.__dict__)
+    app.session_interface = timed_session
+
+    class TimedJSONProvider(type(app.json) if isinstance(app.json, DefaultJSONProvider) else DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            with phase("json"):
+                return super().dumps(obj, **kwargs)
+
+    provider = TimedJSONProvider(app)
+    provider.__dict__.update(app.json.__dict__)
+    app.json = provider
+
+    render_started: contextvars.ContextVar[float] = contextvars.ContextVar("render_started", default=0.0)
+
+    def _render_start(sender, **extra):
+        render_started.set(time.perf_counter())
+
+    def _render_done(sender, **extra):
+        started = render_started.get()
+        if started:
+            add("render", time.perf_counter() - started)
+
+    before_render_template.connect(_render_start, app, weak=False)
+    template_rendered.connect(_render_done, app, weak=False)
+
+    app.wsgi_app = _TimingMiddleware(app.wsgi_app)
+    if PROFILE:
+        _profiler = SamplingProfiler(PROFILE_INTERVAL_MS / 1000)
+        logger.info("🔬 Profiling requests slower than %.0fms every %.0fms into %s",
+                    PROFILE_THRESHOLD_MS, PROFILE_INTERVAL_MS, PROFILE_DIR)
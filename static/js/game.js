@@ -150,9 +150,13 @@ const THEME_DATA = {
 // ---------------------------------------------------------------------------
 // CSRF token helper (Fix #3)
 // ---------------------------------------------------------------------------
+// Pages rendered per session carry the token in a <meta> tag; the lobby is
+// rendered once for everyone and gets it from the csrf_token cookie instead.
 function getCSRFToken() {
     const meta = document.querySelector('meta[name="csrf-token"]');
-    return meta ? meta.getAttribute('content') : '';
+    if (meta && meta.getAttribute('content')) return meta.getAttribute('content');
+    const match = document.cookie.match(/(?:^|;\s*)csrf_token=([^;]*)/);
+    return match ? decodeURIComponent(match[1]) : '';
 }
 
 function csrfHeaders(extra) {
@@ -162,6 +166,37 @@ function csrfHeaders(extra) {
     }, extra || {});
 }
 
+// ---------------------------------------------------------------------------
+// Idempotency keys: one per player action, reused if the same action fires
+// again while it is in flight or is retried after a network error, so the
+// server answers the duplicate from the first request instead of redoing it
+// ---------------------------------------------------------------------------
+const pendingActionKeys = {};
+
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
+async function postAction(action, url, options) {
+    const key = pendingActionKeys[action] || (pendingActionKeys[action] = newIdempotencyKey());
+    const headers = Object.assign({}, (options && options.headers) || {}, { 'Idempotency-Key': key });
+    const init = Object.assign({}, options, { method: 'POST', headers });
+    try {
+        for (let attempt = 0; ; attempt++) {
+            try {
+                return await fetch(url, init);
+            } catch (err) {
+                // The server may have done the work before the connection dropped
+                if (attempt >= 2) throw err;
+                await new Promise(resolve => setTimeout(resolve, 500 * (attempt + 1)));
+            }
+        }
+    } finally {
+        delete pendingActionKeys[action];
+    }
+}
+
 // ---------------------------------------------------------------------------
 // Reveal-blocks-submit state (Fix #2)
 // ---------------------------------------------------------------------------
@@ -516,7 +551,10 @@ async function retryNextPuzzle(attempts) {
     const maxAttempts = attempts || 3;
     for (let i = 0; i < maxAttempts; i++) {
         try {
-            const resp = await fetch('/next-puzzle', { method: 'POST', headers: csrfHeaders() });
+            const resp = await postAction('next-puzzle', '/next-puzzle', {
+                headers: csrfHeaders(),
+                body: JSON.stringify({ narrative_since: narrativeIndex }),
+            });
             const data = await resp.json();
             if (data.time_up) { window.location.href = data.redirect; return; }
             if (data.success && data.puzzle) {
@@ -579,10 +617,9 @@ async function submitAnswer() {
     btn.innerHTML = '<span class="inline-block w-4 h-4 border-2 border-gray-800 border-t-transparent rounded-full animate-spin"></span>';
 
     try {
-        const resp = await fetch('/answer', {
-            method: 'POST',
+        const resp = await postAction('answer:' + answer, '/answer', {
             headers: csrfHeaders(),
-            body: JSON.stringify({ answer }),
+            body: JSON.stringify({ answer, narrative_since: narrativeIndex }),
         });
         const data = await resp.json();
 
@@ -657,7 +694,7 @@ async function requestHint() {
     const btn = document.getElementById('hint-btn');
     btn.disabled = true;
     try {
-        const resp = await fetch('/hint', { method: 'POST', headers: csrfHeaders() });
+        const resp = await postAction('hint', '/hint', { headers: csrfHeaders() });
         const data = await resp.json();
         if (data.time_up) { window.location.href = data.redirect; return; }
         document.getElementById('hint-text').textContent = data.hint;
@@ -689,7 +726,7 @@ async function revealAnswer() {
 
     btn.disabled = true;
     try {
-        const resp = await fetch('/reveal', { method: 'POST', headers: csrfHeaders() });
+        const resp = await postAction('reveal', '/reveal', { headers: csrfHeaders() });
         const data = await resp.json();
         if (data.time_up) { window.location.href = data.redirect; return; }
         document.getElementById('reveal-answer-text').textContent = data.answer;
@@ -712,7 +749,10 @@ async function skipPuzzle() {
     const btn = document.getElementById('skip-btn');
     btn.disabled = true;
     try {
-        const resp = await fetch('/skip', { method: 'POST', headers: csrfHeaders() });
+        const resp = await postAction('skip', '/skip', {
+            headers: csrfHeaders(),
+            body: JSON.stringify({ narrative_since: narrativeIndex }),
+        });
         const data = await resp.json();
         if (data.time_up) { window.location.href = data.redirect; return; }
         if (data.redirect) {
@@ -773,9 +813,12 @@ function transitionToPuzzle(data) {
         const pct = Math.round(((currentPuzzleNumber - 1) / TOTAL_PUZZLES) * 100);
         document.getElementById('progress-bar').style.width = pct + '%';
         document.getElementById('progress-pct').textContent = pct + '%';
-        if (data.narrative_log?.length) {
-            document.getElementById('narrative-text').textContent = data.narrative_log[data.narrative_log.length - 1];
+        // The server sends only narrative entries after narrativeIndex
+        const entries = data.narrative_delta || data.narrative_log;
+        if (entries?.length) {
+            document.getElementById('narrative-text').textContent = entries[entries.length - 1];
         }
+        if (data.narrative_index !== undefined) narrativeIndex = data.narrative_index;
         if (data.remaining_seconds !== undefined) {
             remainingSeconds = data.remaining_seconds;
             updateTimerDisplay();
@@ -957,6 +1000,49 @@ function fireConfetti() {
     }
 }
 
+// ---------------------------------------------------------------------------
+// Party standings: poll the shared progress feed. The browser revalidates
+// with the ETag, so an unchanged party costs a 304 and no re-render.
+// ---------------------------------------------------------------------------
+const PARTY_POLL_MS = 3000;
+let partyVersion = -1;
+
+function renderPartyMembers(data, me) {
+    const list = document.getElementById('party-members');
+    list.replaceChildren(...data.members.map((m, i) => {
+        const li = document.createElement('li');
+        li.className = 'flex items-center justify-between gap-3' + (m.id === me ? ' text-white' : ' text-gray-400');
+        const name = document.createElement('span');
+        name.textContent = `${i + 1}. ${m.name}${m.id === me ? ' (you)' : ''}`;
+        const progress = document.createElement('span');
+        progress.className = 'tabular-nums text-xs';
+        const where = m.status === 'playing' ? `puzzle ${m.puzzle_number}/${data.total_puzzles}`
+            : (m.status === 'victory' ? 'escaped' : 'out of time');
+        progress.textContent = `${where} · ${m.score}`;
+        li.append(name, progress);
+        return li;
+    }));
+}
+
+function startPartyProgress() {
+    const panel = document.getElementById('party-panel');
+    if (!panel) return;
+    const url = `/party/${encodeURIComponent(panel.dataset.partyCode)}/progress`;
+    const poll = async () => {
+        try {
+            const resp = await fetch(url, { cache: 'no-cache' });
+            if (!resp.ok) return;
+            const data = await resp.json();
+            if (data.version !== partyVersion) {
+                partyVersion = data.version;
+                renderPartyMembers(data, panel.dataset.partyMember);
+            }
+        } catch (e) {}
+    };
+    poll();
+    setInterval(() => { if (!document.hidden) poll(); }, PARTY_POLL_MS);
+}
+
 // ---------------------------------------------------------------------------
 // Result page celebration on load
 // ---------------------------------------------------------------------------
@@ -976,6 +1062,7 @@ document.addEventListener('DOMContentLoaded', () => {
     initCardTilt();
     startTimer();
     startTimeCheck();
+    startPartyProgress();
     initResultPage();
 
     // Type the initial puzzle question on first load
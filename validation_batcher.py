@@ -0,0 +1,245 @@
+"""Micro-batched answer validation across concurrent players.
+
+An ambiguous answer (one the local matcher can't decide) used to cost one
+chat completion each, system prompt and all.  Under load those are many
+tiny, latency-bound calls competing for the same rate limit.  Here they are
+collected from every session in this process for up to
+``VALIDATION_BATCH_WINDOW_MS`` (default 50 ms) or ``VALIDATION_BATCH_MAX``
+answers (default 16), whichever comes first, and checked in one structured
+call that returns an array of verdicts.
+
+An answer that arrives while no other validation is in flight in this
+process is sent at once as the ordinary single-answer prompt: at low load
+there is nothing to batch with, and waiting out the window would only add
+latency.  Batches form when answers overlap.
+
+There is no dispatcher thread.  The first request into an empty window
+becomes the batch's leader: it waits out the window, makes the call on its
+own thread (so it keeps the request's timing and priority lane) and hands
+each waiting request its verdict.  A batch of one is sent as the ordinary
+single-answer prompt.  If the batch call fails, or a verdict is missing or
+unusable, each affected request falls back to its own single-answer call.
+So does a waiting request whose leader hasn't answered within
+``VALIDATION_BATCH_WAIT_SECONDS`` (default ``LLM_REQUEST_TIMEOUT``).
+
+Each answer is checked against its player's LLM quota before it joins a
+batch, and a batch call is charged to its players in equal shares
+(see llm_quota.py).
+
+Batching is opt-in (``VALIDATION_BATCH=1``) because of what it trades away.
+One completion now holds several players' free-text answers next to their
+puzzles' expected answers.  Per-batch nonce delimiters stop a player from
+closing their block early.  They can't stop prose inside the block from
+arguing about a neighbour's verdict.  Without batching, a player can only
+sway their own.  Leaks are caught: a verdict whose feedback names another
+item's expected answer is discarded, and that answer is validated on its
+own.  Steering another player's verdict isn't caught.  Turn batching on
+where the cost saving is worth that.
+"""
+
+import logging
+import os
+import re
+import secrets
+import threading
+from typing import Optional
+
+import llm_output
+import llm_quota
+import request_timing
+from llm_governor import LANE_INTERACTIVE
+from ai_client import REQUEST_TIMEOUT, validate_answer, validate_answers
+from prompts import (
+    ANSWER_VALIDATION_SYSTEM,
+    BATCH_VALIDATION_SYSTEM,
+    answer_validation_prompt,
+    batch_validation_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("VALIDATION_BATCH", "0") == "1"
+WINDOW_SECONDS = float(os.environ.get("VALIDATION_BATCH_WINDOW_MS", "50")) / 1000
+MAX_ITEMS = int(os.environ.get("VALIDATION_BATCH_MAX", "16"))
+# A follower stops waiting for its leader after this and validates on its own
+WAIT_SECONDS = float(os.environ.get("VALIDATION_BATCH_WAIT_SECONDS", str(REQUEST_TIMEOUT)))
+
+
+class _Item:
+    __slots__ = ("question", "expected", "answer", "payers", "verdict", "done")
+
+    def __init__(self, question: str, expected: str, answer: str):
+        self.question = question
+        self.expected = expected
+        self.answer = answer
+        self.payers = llm_quota.current()
+        self.verdict: Optional[dict] = None
+        self.done = threading.Event()
+
+
+class _Batch:
+    __slots__ = ("items",)
+
+    def __init__(self):
+        self.items: list[_Item] = []
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.closed = threading.Condition(self.lock)
+        self.open: Optional[_Batch] = None
+        self.outstanding = 0     # validate() calls in progress
+        self.stats = {"answers": 0, "immediate": 0, "batches": 0, "batched_answers": 0, "singles": 0,
+                      "batch_failures": 0, "fallbacks": 0, "wait_timeouts": 0, "leaks": 0, "max_batch": 0}
+
+
+_state = _State()
+
+
+def _single(item: _Item) -> dict:
+    prompt = answer_validation_prompt(question=item.question, expected_answer=item.expected,
+                                      player_answer=item.answer)
+    return validate_answer(ANSWER_VALIDATION_SYSTEM, prompt)
+
+
+def _names_other_answer(feedback: str, item: _Item, items: list[_Item]) -> bool:
+    """Whether *feedback* for *item* mentions another item's expected answer."""
+    text = feedback.lower()
+    own = item.expected.strip().lower()
+    for other in items:
+        answer = other.expected.strip().lower()
+        if other is not item and answer and answer != own and re.search(rf"\b{re.escape(answer)}\b", text):
+            return True
+    return False
+
+
+def _send(items: list[_Item]) -> None:
+    """Validate *items* in one call and attach each usable verdict.  Never raises."""
+    nonce = secrets.token_hex(4)
+    prompt = batch_validation_prompt([(i.question, i.expected, i.answer) for i in items], nonce)
+    try:
+        with llm_quota.paying(tuple(payer for item in items for payer in item.payers)):
+            reply = validate_answers(BATCH_VALIDATION_SYSTEM, prompt)
+    except Exception as e:
+        logger.warning("⚠️ Batched validation of %d answers failed, validating one by one: %s", len(items), e)
+        with _state.lock:
+            _state.stats["batch_failures"] += 1
+        return
+    for position, raw in enumerate(reply["verdicts"]):
+        if not isinstance(raw, dict):
+            continue
+        try:
+            number = int(raw.get("id", position + 1))
+        except (TypeError, ValueError):
+            continue
+        verdict, missing = llm_output.conform("validation", raw)
+        if missing or not 1 <= number <= len(items) or items[number - 1].verdict is not None:
+            continue
+        item = items[number - 1]
+        if _names_other_answer(str(verdict["feedback"]), item, items):
+            # Another player's answer must never reach this one: ask again on its own
+            with _state.lock:
+                _state.stats["leaks"] += 1
+            continue
+        item.verdict = {"correct": verdict["correct"], "feedback": verdict["feedback"]}
+
+
+def _lead(batch: _Batch) -> None:
+    """Close *batch* after the window (or once full) and validate it."""
+    with request_timing.phase("llm_batch"), _state.lock:
+        _state.closed.wait_for(lambda: _state.open is not batch, timeout=WINDOW_SECONDS)
+        if _state.open is batch:
+            _state.open = None
+        items = list(batch.items)
+        _state.stats["batches"] += 1
+        _state.stats["batched_answers"] += len(items)
+        _state.stats["max_batch"] = max(_state.stats["max_batch"], len(items))
+    try:
+        if len(items) > 1:
+            _send(items)
+    finally:
+        for item in items:
+            item.done.set()
+
+
+def _batched(item: _Item, batch: _Batch, leader: bool) -> dict:
+    """Lead or wait for *batch*, then return *item*'s verdict (its own call if it got none)."""
+    if leader:
+        _lead(batch)
+    else:
+        # The leader's call is this request's LLM time
+        with request_timing.phase("llm_batch"):
+            finished = item.done.wait(WAIT_SECONDS)
+        if not finished:
+            # The leader is stuck (or gone without setting done): don't hang with it
+            logger.warning("⚠️ No batch verdict after %.0fs, validating on its own", WAIT_SECONDS)
+            with _state.lock:
+                _state.stats["wait_timeouts"] += 1
+            return _single(item)
+
+    if item.verdict is not None:
+        return item.verdict
+    with _state.lock:
+        _state.stats["singles" if len(batch.items) == 1 else "fallbacks"] += 1
+    return _single(item)
+
+
+def validate(question: str, expected_answer: str, player_answer: str) -> dict:
+    """``{"correct", "feedback"}`` for one ambiguous answer, batched with concurrent ones.
+
+    Raises like ``ai_client.validate_answer`` when even the single-answer
+    call fails, or ``QuotaExceeded`` when the player is over its LLM quota,
+    so callers keep their own local fallback.
+    """
+    item = _Item(question, expected_answer, player_answer)
+    # An over-quota answer never joins a batch (the caller matches it locally)
+    llm_quota.check(LANE_INTERACTIVE)
+    if not ENABLED:
+        return _single(item)
+
+    with _state.lock:
+        _state.stats["answers"] += 1
+        _state.outstanding += 1
+        alone = _state.outstanding == 1
+        if alone:
+            _state.stats["immediate"] += 1
+        else:
+            batch = _state.open
+            leader = batch is None
+            if leader:
+                batch = _state.open = _Batch()
+            batch.items.append(item)
+            if len(batch.items) >= MAX_ITEMS:
+                # Full: send it now and start a fresh window for later answers
+                _state.open = None
+                _state.closed.notify_all()
+    try:
+        # Nothing else in flight to batch with: no window to wait out
+        return _single(item) if alone else _batched(item, batch, leader)
+    finally:
+        with _state.lock:
+            _state.outstanding -= 1
+
+
+def get_stats() -> dict:
+    with _state.lock:
+        stats = dict(_state.stats)
+    stats["mean_batch"] = round(stats["batched_answers"] / stats["batches"], 2) if stats["batches"] else 0.0
+    return stats
+
+
+def reset_stats() -> None:
+    with _state.lock:
+        for key in _state.stats:
+            _state.stats[key] = 0
+
+
+def _reset_after_fork() -> None:
+    # A batch open in the parent belongs to the parent's threads
+    global _state
+    _state = _State()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)